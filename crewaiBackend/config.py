@@ -25,12 +25,42 @@ class Config:
     # OPENAI_API_KEY = "your_openai_api_key_here"
     # ANTHROPIC_API_KEY = "your_anthropic_api_key_here"
     
+    # 数据库配置
+    DB_BACKEND = os.getenv("DB_BACKEND", "mysql")  # 会话存储后端：mysql 或 sqlite
+    DB_FALLBACK_SQLITE = os.getenv("DB_FALLBACK_SQLITE", "false").lower() in ("1", "true", "yes")  # 启动时MySQL不可用则回退为SQLite（默认关闭）
+    SQLITE_PATH = os.getenv("SQLITE_PATH", ":memory:")  # SQLite数据库文件，:memory:表示只保存在进程内存中
+    ID_SCHEME = os.getenv("ID_SCHEME", "uuid4")  # 新会话/消息ID的生成方式：uuid4（随机）或 uuid7（按时间递增）
+    
     # MySQL数据库配置
     MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
     MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3307"))
     MYSQL_USER = os.getenv("MYSQL_USER", "root")
     MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
     MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "aiagent_chat")
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))  # 连接池最少保持的连接数
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))  # 连接池最多创建的连接数
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # 借用连接的最长等待时间（秒）
+    DB_POOL_HEALTH_CHECK_IDLE = float(os.getenv("DB_POOL_HEALTH_CHECK_IDLE", "30"))  # 空闲超过该秒数的连接借出前先ping
+    MYSQL_REPLICA_HOSTS = os.getenv("MYSQL_REPLICA_HOSTS", "")  # 只读副本，逗号分隔的host[:port]，与主库使用相同账号；为空时全部读写走主库
+    DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))  # 副本连接失败后暂停使用的秒数，期间读请求回到主库
+    DB_REPLICA_PIN_SECONDS = float(os.getenv("DB_REPLICA_PIN_SECONDS", "5"))  # 会话/用户写入后该秒数内的读取固定走主库，应大于副本的复制延迟
+    DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))  # 慢查询日志阈值（毫秒），0表示不记录
+    DB_QUERY_STATS_MAX = int(os.getenv("DB_QUERY_STATS_MAX", "500"))  # 语句耗时统计最多单独统计的语句指纹数
+    MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))  # 会话消息分页的默认每页条数
+    MESSAGE_PAGE_MAX = int(os.getenv("MESSAGE_PAGE_MAX", "500"))  # 会话消息分页的每页条数上限
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")  # 消息异步批量写入
+    MESSAGE_QUEUE_SIZE = int(os.getenv("MESSAGE_QUEUE_SIZE", "10000"))  # 异步写入队列上限，满时改为同步写入
+    MESSAGE_FLUSH_BATCH = int(os.getenv("MESSAGE_FLUSH_BATCH", "200"))  # 异步写入每批最多的消息数
+    MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.2"))  # 异步写入凑批的最长等待时间（秒）
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))  # 进程内缓存的会话数（含消息），0表示禁用
+    SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))  # 会话缓存有效期（秒），多进程部署时其他进程的写入在此之后可见
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))  # 批量导入消息时每个事务写入的条数
+    EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))  # 流式导出时每次从服务端游标读取的行数
+    PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))  # 清理旧会话时每批最多删除的行数（会话+消息）
+    PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", "0.2"))  # 清理旧会话时批与批之间的暂停（秒）
+    SESSION_RETENTION_DAYS = int(os.getenv("SESSION_RETENTION_DAYS", "0"))  # 会话保留天数，大于0时每天自动清理，0表示不自动清理
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # 会话多少天无更新后把消息移入归档表（压缩保存），0表示不归档
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))  # 归档时每个事务移动的消息数
     
     # 服务配置
     FLASK_ENV = "development"
@@ -47,7 +77,25 @@ class Config:
     # 请求配置
     REQUEST_TIMEOUT = 30
     MAX_RETRIES = 3
-    
+
+    # 任务执行器配置（/api/crew 后台任务）
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))  # 固定工作线程数
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))  # 等待队列上限
+    MAX_INFLIGHT_JOBS = int(os.getenv("MAX_INFLIGHT_JOBS", str(JOB_WORKERS * 3)))  # 每个进程同时处理中的任务上限
+    MAX_INFLIGHT_JOBS_PER_USER = int(os.getenv("MAX_INFLIGHT_JOBS_PER_USER", "3"))  # 每个用户同时处理中的任务上限
+    # 每个用户同时处理中的批量任务上限（与交互任务分开计数），默认最多占用一半工作线程
+    MAX_INFLIGHT_BATCH_JOBS_PER_USER = int(os.getenv("MAX_INFLIGHT_BATCH_JOBS_PER_USER", str(max(1, JOB_WORKERS // 2))))
+    MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))  # 批量提交/批量查询接口单次最多的条目数
+    JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))  # 已结束任务的保留时间
+    JOB_MAX_COUNT = int(os.getenv("JOB_MAX_COUNT", "10000"))  # 内存中最多保留的任务数
+    JOB_SWEEP_INTERVAL = int(os.getenv("JOB_SWEEP_INTERVAL", "60"))  # 过期任务清理间隔（秒）
+    JOB_STORE_SHARDS = int(os.getenv("JOB_STORE_SHARDS", "16"))  # 任务表分片数（锁分段）
+    JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "memory")  # 任务存储后端：memory 或 mysql（多进程共享）
+    JOB_STORE_POLL_INTERVAL = float(os.getenv("JOB_STORE_POLL_INTERVAL", "0.5"))  # mysql后端等待新事件的轮询间隔（秒）
+    SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))  # SSE无新事件时的心跳间隔
+    LONG_POLL_MAX_WAIT = int(os.getenv("LONG_POLL_MAX_WAIT", "30"))  # 任务状态长轮询最长等待时间（秒）
+    MAX_EVENT_DATA_LENGTH = int(os.getenv("MAX_EVENT_DATA_LENGTH", "2000"))  # 单条任务事件的最大字符数
+
     # 日志配置
     LOG_LEVEL = "INFO"
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
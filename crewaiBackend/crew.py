@@ -4,8 +4,10 @@
 
 from crewai import Agent, Crew, Process
 from .utils.jobManager import append_event
+from .utils.cancellation import JobCancelledError, check_cancelled
 from .utils.ragflow_client import create_ragflow_client, DEFAULT_CHAT_ID
 import json
+import logging
 import os
 import requests
 from datetime import datetime
@@ -16,6 +18,11 @@ try:
 except ImportError:
     config = None
 
+logger = logging.getLogger(__name__)
+
+# 提示词中带入的最近对话消息数
+CONTEXT_MESSAGES = 5
+
 
 class CrewtestprojectCrew:
     """客服机器人CrewAI类 - 使用RAGFlow替换CrewAI RagTool"""
@@ -27,10 +34,17 @@ class CrewtestprojectCrew:
         self.ragflow_client = create_ragflow_client()
         self.session_id = None  # 存储会话ID
 
+    def _log_event(self, event_data, level='info'):
+        """记录到当前作业的事件中；没有关联作业时（如SessionAgent创建Agent期间）只写日志"""
+        if self.job_id is None:
+            logger.debug(str(event_data))
+            return
+        append_event(self.job_id, event_data, level)
+
     def append_event_callback(self, task_output):
         """任务完成回调函数"""
         print("Callback called:", task_output)
-        append_event(self.job_id, task_output.raw if hasattr(task_output, "raw") else str(task_output))
+        self._log_event(task_output.raw if hasattr(task_output, "raw") else str(task_output))
 
     def create_agents(self):
         """创建客服机器人相关的Agent"""
@@ -64,13 +78,13 @@ class CrewtestprojectCrew:
     def call_ragflow(self, customer_input, route_decision="PRODUCT_QUERY", ragflow_session_id=None):
         """调用RAGFlow进行知识检索并返回摘要"""
         try:
-            append_event(self.job_id, f"开始调用RAGFlow进行知识检索...")
+            self._log_event(f"开始调用RAGFlow进行知识检索...")
             
             # 使用传入的RAGFlow会话ID
             session_id_to_use = ragflow_session_id
             
             if not session_id_to_use:
-                append_event(self.job_id, "警告: 没有RAGFlow会话ID，将创建新会话")
+                self._log_event("警告: 没有RAGFlow会话ID，将创建新会话", level='warning')
                 # 只有在没有会话ID时才创建新会话
                 session_data = self.ragflow_client.create_session(
                     chat_id=DEFAULT_CHAT_ID,
@@ -78,12 +92,12 @@ class CrewtestprojectCrew:
                     user_id=f"user_{self.job_id}"
                 )
                 session_id_to_use = session_data.get('id')
-                append_event(self.job_id, f"RAGFlow会话创建成功: {session_id_to_use}")
+                self._log_event(f"RAGFlow会话创建成功: {session_id_to_use}")
             else:
-                append_event(self.job_id, f"使用现有RAGFlow会话: {session_id_to_use}")
+                self._log_event(f"使用现有RAGFlow会话: {session_id_to_use}")
             
             # 使用RAGFlow进行对话
-            append_event(self.job_id, f"向RAGFlow发送问题: {customer_input}")
+            self._log_event(f"向RAGFlow发送问题: {customer_input}")
             answer_data = self.ragflow_client.converse(
                 chat_id=DEFAULT_CHAT_ID,
                 question=customer_input,
@@ -108,13 +122,18 @@ class CrewtestprojectCrew:
             
             summary = "\n".join(summary_parts) if summary_parts else "未找到相关信息"
             
-            append_event(self.job_id, f"RAGFlow检索完成，获得{len(answer)}字符的回答")
+            self._log_event(f"RAGFlow检索完成，获得{len(answer)}字符的回答")
             return summary
             
+        except JobCancelledError:
+            # 任务取消不走降级逻辑，直接结束任务
+            raise
         except Exception as e:
-            append_event(self.job_id, f"调用RAGFlow失败: {str(e)}")
+            self._log_event(f"调用RAGFlow失败: {str(e)}", level='error')
             import traceback
-            append_event(self.job_id, f"错误详情: {traceback.format_exc()}")
+            # 完整堆栈写入服务日志，事件中只保留截断后的调试信息
+            logger.exception(f"任务 {self.job_id} 调用RAGFlow失败")
+            self._log_event(f"错误详情: {traceback.format_exc()}", level='debug')
             # 出错时返回空摘要
             return ""
 
@@ -132,22 +151,24 @@ class CrewtestprojectCrew:
         context_info = ""
         if session_id:
             try:
-                from utils.sessionManager import SessionManager
+                from .utils.sessionManager import SessionManager, format_context
                 session_manager = SessionManager()
-                session = session_manager.get_session(session_id)
-                if session:
-                    context_info = session.get_context_summary(max_messages=5)
-                    append_event(self.job_id, f"获取到会话上下文，包含{len(session.messages)}条消息")
-                    
-                    # 如果 inputs 中没有 ragflow_session_id，则从数据库获取（兜底）
-                    if not ragflow_session_id and session.ragflow_session_id:
+                # 只读取最近几条消息，不加载整个会话
+                recent_messages = session_manager.get_recent_messages(session_id, CONTEXT_MESSAGES)
+                context_info = format_context(recent_messages)
+                self._log_event(f"获取到会话上下文，包含{len(recent_messages)}条消息")
+                
+                # 如果 inputs 中没有 ragflow_session_id，则从数据库获取（兜底）
+                if not ragflow_session_id:
+                    session = session_manager.get_session(session_id, include_messages=False)
+                    if session and session.ragflow_session_id:
                         ragflow_session_id = session.ragflow_session_id
-                        append_event(self.job_id, f"从数据库获取RAGFlow会话ID: {ragflow_session_id}")
+                        self._log_event(f"从数据库获取RAGFlow会话ID: {ragflow_session_id}")
             except Exception as e:
-                append_event(self.job_id, f"获取上下文失败: {str(e)}")
+                self._log_event(f"获取上下文失败: {str(e)}", level='warning')
         
         if ragflow_session_id:
-            append_event(self.job_id, f"使用RAGFlow会话ID: {ragflow_session_id}")
+            self._log_event(f"使用RAGFlow会话ID: {ragflow_session_id}")
 
         # 直接调用RAGFlow，传递会话ID
         retrieved_summary = self.call_ragflow(customer_input, route_decision, ragflow_session_id)
@@ -193,26 +214,31 @@ class CrewtestprojectCrew:
     def kickoff(self, inputs):
         """启动客服机器人分析流程"""
         try:
-            append_event(self.job_id, "正在初始化智能客服机器人...")
+            self._log_event("正在初始化智能客服机器人...")
             agents = self.create_agents()
-            append_event(self.job_id, "智能客服机器人初始化完成")
+            self._log_event("智能客服机器人初始化完成")
             
-            append_event(self.job_id, "开始执行客服机器人任务流程...")
+            self._log_event("开始执行客服机器人任务流程...")
             tasks = self.create_tasks(agents, inputs)
             crew = self.create_crew(agents, tasks)
             
             try:
+                check_cancelled()
                 results = crew.kickoff()
-                append_event(self.job_id, "客服机器人任务流程完成")
+                self._log_event("客服机器人任务流程完成")
+            except JobCancelledError:
+                raise
             except (StopIteration, Exception) as e:
-                append_event(self.job_id, f"客服机器人任务执行异常: {str(e)}")
+                self._log_event(f"客服机器人任务执行异常: {str(e)}", level='error')
                 results = "抱歉，系统暂时无法处理您的请求，请稍后重试或联系人工客服。"
-                append_event(self.job_id, "使用备用回复")
+                self._log_event("使用备用回复", level='warning')
             
             final_result = self.format_final_result(results, inputs)
             return final_result
+        except JobCancelledError:
+            raise
         except Exception as e:
-            append_event(self.job_id, f"启动客服机器人分析流程失败: {str(e)}")
+            self._log_event(f"启动客服机器人分析流程失败: {str(e)}", level='error')
             return f"启动客服机器人分析流程失败: {str(e)}"
 
     def format_final_result(self, results, inputs):
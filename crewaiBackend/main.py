@@ -11,10 +11,9 @@ import json
 import logging
 import sys
 from datetime import datetime
-from threading import Thread
 from uuid import uuid4
 
-from flask import Flask, jsonify, request, abort
+from flask import Flask, Response, jsonify, request, abort, stream_with_context
 from flask_cors import CORS
 import base64
 
@@ -57,11 +56,18 @@ except ImportError:
     LLM_TYPE = "google"
     PORT = 8012
 
+from .config import Config
 from .crew import CrewtestprojectCrew
-from .utils.jobManager import append_event, jobs, jobs_lock, Event
+from .utils.jobManager import (
+    append_event, finish_job, get_job_summaries, job_store, wait_for_job_update, FINISHED_STATUSES, EVENT_LEVELS
+)
+from .utils.jobExecutor import job_executor, JobQueueFullError
+from .utils.admission import admission_controller, AdmissionRejected
+from .utils.cancellation import JobCancelledError, bind_token, job_cancellation
 from .utils.myLLM import my_llm
-from .utils.sessionManager import SessionManager
+from .utils.sessionManager import MessageImportError, SessionManager, session_cache
 from .utils.session_agent_manager import session_agent_manager
+from .utils.sessionPurge import PurgeAlreadyRunning, message_archiver, session_purge
 
 
 # 创建Flask应用实例
@@ -83,6 +89,10 @@ def periodic_cleanup():
             time.sleep(300)  # 每5分钟清理一次
             session_agent_manager.cleanup_inactive_sessions(max_age_seconds=1800)  # 30分钟超时
             print(f"[清理] 会话清理完成，当前状态: {session_agent_manager.get_session_status()}")
+            # 配置了保留天数时每天启动一次旧会话清理任务
+            session_purge.start_retention_purge()
+            # 配置了归档天数时每小时在后台启动一次空闲会话的消息归档任务
+            message_archiver.start_scheduled_archive()
         except Exception as e:
             print(f"[清理] 会话清理失败: {e}")
 
@@ -90,6 +100,9 @@ def periodic_cleanup():
 cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
 cleanup_thread.start()
 
+# 启动作业存储的过期清理线程
+job_store.start_sweeper()
+
 
 def handle_api_error(error_msg: str, status_code: int = 500):
     """统一处理API错误"""
@@ -97,6 +110,69 @@ def handle_api_error(error_msg: str, status_code: int = 500):
     return jsonify({"error": error_msg}), status_code
 
 
+def parse_job_result(result):
+    """尝试将任务结果解析为JSON，失败则保持字符串"""
+    try:
+        return json.loads(str(result))
+    except json.JSONDecodeError:
+        return str(result)
+
+
+def event_to_dict(event):
+    """将任务事件转换为可序列化的字典"""
+    return {"timestamp": event.timestamp.isoformat(), "data": event.data, "level": event.level}
+
+
+def serialize_job_status(job_id, job, since=0, min_level='debug'):
+    """
+    序列化任务状态响应体
+    
+    完整状态（since=0且不过滤级别）最常被重复轮询，按作业版本缓存序列化结果，
+    作业追加事件或状态变化后缓存失效
+    
+    Returns:
+        (作业版本号, JSON响应体)
+    """
+    cacheable = since == 0 and min_level == 'debug'
+    with job.lock:
+        version = job.version
+        if cacheable and job.status_cache is not None and job.status_cache[0] == version:
+            return job.status_cache
+        events = job.events[since:]
+        status, result = job.status, job.result
+    
+    body = app.json.dumps({
+        "job_id": job_id,
+        "status": status,
+        "result": parse_job_result(result),
+        "events": [event_to_dict(event) for event in events if level_at_least(event.level, min_level)],
+        "next_since": since + len(events)
+    }).encode('utf-8')
+    
+    if cacheable:
+        with job.lock:
+            # 序列化期间作业可能又有变化，只缓存仍与当前版本一致的结果
+            if job.version == version:
+                job.status_cache = (version, body)
+    return version, body
+
+
+def level_at_least(level, min_level):
+    """判断事件级别是否不低于指定级别"""
+    return EVENT_LEVELS.index(level) >= EVENT_LEVELS.index(min_level)
+
+
+def format_sse(payload, event=None, event_id=None):
+    """将数据格式化为一条Server-Sent Events消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
 def process_file_upload(request):
     """处理文件上传请求"""
     customer_input = request.form.get('customer_input', '')
@@ -105,6 +181,7 @@ def process_file_upload(request):
     customer_domain = request.form.get('customer_domain', '')
     project_description = request.form.get('project_description', '')
     session_id = request.form.get('session_id')
+    user_id = request.form.get('user_id')
     
     image_data = None
     audio_data = None
@@ -129,7 +206,8 @@ def process_file_upload(request):
         "project_description": project_description,
         "image_data": image_data,
         "audio_data": audio_data,
-        "session_id": session_id
+        "session_id": session_id,
+        "user_id": user_id
     }
 
 
@@ -139,6 +217,11 @@ def process_json_request(request):
     if not data or 'customer_input' not in data:
         abort(400, description="Invalid input data provided. Required: customer_input")
     
+    return build_json_inputs(data)
+
+
+def build_json_inputs(data):
+    """将JSON请求体（或批量请求中的一项）转换为任务输入"""
     return {
         "customer_input": data['customer_input'],
         "input_type": data.get('input_type', 'text'),
@@ -147,44 +230,117 @@ def process_json_request(request):
         "project_description": data.get('project_description', ''),
         "image_data": None,
         "audio_data": None,
-        "session_id": data.get('session_id')
+        "session_id": data.get('session_id'),
+        "user_id": data.get('user_id')
     }
 
 
 def kickoff_crew(job_id, inputs):
     """异步执行客服机器人分析"""
-    session_id = inputs.get('session_id', 'unknown')
+    session_id = inputs.get('session_id') or 'unknown'
     session_prefix = f"[会话:{session_id[:8]}]" if session_id != 'unknown' else "[会话:unknown]"
     
     logger.info(f"{session_prefix} 开始处理任务 {job_id}")
     
+    token = job_cancellation.get(job_id) or job_cancellation.register(job_id, inputs.get('session_id'))
     try:
-        # 验证输入数据
-        if not inputs.get("customer_input", "").strip():
-            raise ValueError("客户输入不能为空")
-        
-        # 使用会话Agent管理器（复用Agent）
-        session_agent = session_agent_manager.get_or_create_agent(session_id)
-        
-        # 执行分析
-        results = session_agent.kickoff(inputs)
-        logger.info(f"{session_prefix} 任务 {job_id} 分析完成")
-        
-        # 更新任务状态为完成
-        with jobs_lock:
-            jobs[job_id].status = 'COMPLETE'
-            jobs[job_id].result = results
-            jobs[job_id].events.append(
-                Event(timestamp=datetime.now(), data="客服机器人分析完成"))
+        with bind_token(token):
+            # 任务在排队期间可能已被取消
+            token.raise_if_cancelled()
+            
+            # 验证输入数据
+            if not inputs.get("customer_input", "").strip():
+                raise ValueError("客户输入不能为空")
+            
+            # 使用会话Agent管理器（复用Agent）
+            session_agent = session_agent_manager.get_or_create_agent(session_id)
+            
+            # 执行分析
+            results = session_agent.kickoff(inputs, job_id=job_id)
+            token.raise_if_cancelled()
+            logger.info(f"{session_prefix} 任务 {job_id} 分析完成")
+            
+            # 更新任务状态为完成
+            finish_job(job_id, 'COMPLETE', results, "客服机器人分析完成")
+    
+    except JobCancelledError as e:
+        logger.info(f"{session_prefix} 任务 {job_id} 已取消: {e}")
+        finish_job(job_id, 'CANCELLED', str(e), f"任务已取消: {e}", level='warning')
                 
     except Exception as e:
         error_msg = f"{session_prefix} 任务 {job_id} 分析错误: {e}"
         print(error_msg)
         
-        append_event(job_id, f"客服机器人分析过程中出现错误: {e}")
-        with jobs_lock:
-            jobs[job_id].status = 'ERROR'
-            jobs[job_id].result = str(e)
+        finish_job(job_id, 'ERROR', str(e), f"客服机器人分析过程中出现错误: {e}", level='error')
+    
+    finally:
+        job_cancellation.unregister(job_id)
+
+
+def admission_key(inputs):
+    """准入控制使用的用户标识：优先用户ID，其次会话ID，最后客户端地址"""
+    return inputs.get('user_id') or inputs.get('session_id') or request.remote_addr or 'anonymous'
+
+
+def run_admitted_job(user_key, job_id, inputs, batch=False):
+    """执行已通过准入控制的任务，结束后归还名额"""
+    started = time.monotonic()
+    try:
+        kickoff_crew(job_id, inputs)
+    finally:
+        admission_controller.release(user_key, time.monotonic() - started, batch=batch)
+
+
+def too_many_requests(message, retry_after, **extra):
+    """返回带Retry-After头的429响应，extra中的字段附加到响应体"""
+    response = jsonify({"error": message, "retry_after": retry_after, **extra})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def submit_job(inputs, user_key, batch=False):
+    """
+    通过准入控制后创建任务并提交到任务执行器
+    
+    Args:
+        inputs: 任务输入
+        user_key: 准入控制使用的用户标识
+        batch: 是否为批量接口提交的任务（占用用户的批量任务名额）
+        
+    Returns:
+        新任务的job_id
+        
+    Raises:
+        AdmissionRejected: 超过处理中任务上限或执行器队列已满
+    """
+    session_id = inputs.get('session_id')
+    session_prefix = f"[会话:{session_id[:8]}]" if session_id else "[会话:unknown]"
+    
+    # 准入控制：超过进程或用户的处理中任务上限时直接拒绝，不创建任务
+    try:
+        admission_controller.acquire(user_key, batch=batch)
+    except AdmissionRejected as e:
+        logger.warning(f"{session_prefix} 请求被准入控制拒绝: {e}")
+        raise
+    
+    # 创建任务并异步执行
+    job_id = str(uuid4())
+    append_event(job_id, "客服机器人开始分析客户需求...")
+    job_cancellation.register(job_id, session_id)
+    
+    try:
+        job_executor.submit(run_admitted_job, user_key, job_id, inputs, batch)
+    except JobQueueFullError as e:
+        # 队列已满，撤销刚创建的任务记录并归还名额
+        job_store.delete_job(job_id)
+        job_cancellation.unregister(job_id)
+        admission_controller.release(user_key, batch=batch)
+        logger.warning(f"{session_prefix} 任务 {job_id} 被拒绝: {e}")
+        raise AdmissionRejected(str(e), admission_controller.estimate_retry_after())
+    
+    logger.info(f"{session_prefix} 任务 {job_id} 已提交到任务执行器")
+    return job_id
 
 
 @app.route('/api/crew', methods=['POST'])
@@ -202,14 +358,11 @@ def run_crew():
         
         print(f"{session_prefix} 收到客服机器人请求")
         
-        # 创建任务并异步执行
-        job_id = str(uuid4())
-        append_event(job_id, "客服机器人开始分析客户需求...")
-        
-        thread = Thread(target=kickoff_crew, args=(job_id, inputs))
-        thread.start()
+        try:
+            job_id = submit_job(inputs, admission_key(inputs))
+        except AdmissionRejected as e:
+            return too_many_requests(str(e), e.retry_after)
         
-        logger.info(f"{session_prefix} 任务 {job_id} 已启动异步处理")
         return jsonify({"job_id": job_id}), 202
         
     except ValueError as e:
@@ -218,30 +371,232 @@ def run_crew():
         return handle_api_error(f"处理请求失败: {str(e)}", 500)
 
 
+@app.route('/api/crew/batch', methods=['POST'])
+def run_crew_batch():
+    """
+    批量提交客服机器人请求
+    
+    请求体:
+        inputs: 任务输入列表，每一项与 POST /api/crew 的JSON请求体相同
+        其他字段（如user_id、session_id）作为每一项的默认值
+    
+    每一项作为独立任务经过准入控制并提交到任务执行器，可以并行执行。批量任务按用户单独计数
+    （MAX_INFLIGHT_BATCH_JOBS_PER_USER，默认为工作线程数的一半），不会占满执行器影响交互请求，
+    也不占用该用户交互请求的名额。超出名额或执行器队列已满的项被拒绝，带retry_after，可稍后重新提交。
+    每一项有自己的job_id，可以单独查询和取消；响应按顺序给出每一项的job_id或错误。
+    至少接收一项时返回202；全部因准入控制被拒绝时返回429；全部输入无效时返回400
+    """
+    data = request.json
+    if not data or not isinstance(data.get('inputs'), list):
+        abort(400, description="Invalid input data provided. Required: inputs (list)")
+    items = data['inputs']
+    if len(items) > Config.MAX_BATCH_SIZE:
+        abort(400, description=f"Too many inputs, at most {Config.MAX_BATCH_SIZE} per batch")
+    
+    defaults = {key: value for key, value in data.items() if key != 'inputs'}
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or 'customer_input' not in item:
+            results.append({"index": index, "error": "Required: customer_input"})
+            continue
+        valid.append((index, build_json_inputs({**defaults, **item})))
+    
+    if not valid:
+        return jsonify({"jobs": results, "accepted": 0, "rejected": len(items)}), 400
+    
+    accepted = 0
+    last_rejection = None
+    for index, inputs in valid:
+        try:
+            job_id = submit_job(inputs, admission_key(inputs), batch=True)
+        except AdmissionRejected as e:
+            last_rejection = e
+            results.append({"index": index, "error": str(e), "retry_after": e.retry_after})
+            continue
+        accepted += 1
+        results.append({"index": index, "job_id": job_id})
+    
+    results.sort(key=lambda result: result["index"])
+    rejected = len(items) - accepted
+    logger.info(f"批量请求: 共 {len(items)} 项，接收 {accepted} 项，拒绝 {rejected} 项")
+    if not accepted:
+        return too_many_requests(str(last_rejection), last_rejection.retry_after,
+                                 jobs=results, accepted=0, rejected=rejected)
+    return jsonify({"jobs": results, "accepted": accepted, "rejected": rejected}), 202
+
+
+@app.route('/api/crew/status', methods=['POST'])
+def get_status_batch():
+    """
+    批量获取任务状态
+    
+    请求体:
+        job_ids: 任务ID列表
+    
+    返回每个任务的状态、结果和next_since（事件数，可作为 GET /api/crew/<job_id> 的since参数）；
+    不存在的任务对应null
+    """
+    data = request.json
+    job_ids = data.get('job_ids') if data else None
+    if not isinstance(job_ids, list) or not all(isinstance(job_id, str) for job_id in job_ids):
+        abort(400, description="Invalid input data provided. Required: job_ids (list of strings)")
+    if len(job_ids) > Config.MAX_BATCH_SIZE:
+        abort(400, description=f"Too many job_ids, at most {Config.MAX_BATCH_SIZE} per request")
+    
+    jobs = {}
+    for job_id, summary in get_job_summaries(job_ids).items():
+        if summary is None:
+            jobs[job_id] = None
+            continue
+        status, result, event_count = summary
+        jobs[job_id] = {"status": status, "result": parse_job_result(result), "next_since": event_count}
+    return jsonify({"jobs": jobs}), 200
 
 
 @app.route('/api/crew/<job_id>', methods=['GET'])
 def get_status(job_id):
-    """获取任务状态"""
-    with jobs_lock:
-        job = jobs.get(job_id)
-        if job is None:
-            abort(404, description="Job not found")
+    """
+    获取任务状态
+    
+    查询参数:
+        since: 只返回该序号之后的事件（默认0，即全部事件）
+        wait: 没有新事件且任务未结束时最多等待的秒数（长轮询，默认0）
+        level: 只返回不低于该级别的事件（debug/info/warning/error）
+    
+    响应带ETag（作业版本号），请求带If-None-Match且作业没有变化时返回304
+    """
+    since = max(0, request.args.get('since', default=0, type=int))
+    wait = min(max(0.0, request.args.get('wait', default=0, type=float)), Config.LONG_POLL_MAX_WAIT)
+    min_level = request.args.get('level', 'debug')
+    if min_level not in EVENT_LEVELS:
+        abort(400, description=f"Invalid level, expected one of: {', '.join(EVENT_LEVELS)}")
+    
+    if wait > 0 and wait_for_job_update(job_id, since, timeout=wait) is None:
+        abort(404, description="Job not found")
+    job = job_store.get(job_id)
+    if job is None:
+        abort(404, description="Job not found")
+    
+    version, body = serialize_job_status(job_id, job, since, min_level)
+    
+    # 响应内容只由作业版本和查询参数决定，客户端带If-None-Match重复轮询时直接返回304
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(str(version))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/api/crew/<job_id>', methods=['DELETE'])
+def cancel_crew(job_id):
+    """
+    取消排队中或执行中的任务
     
-    # 尝试解析结果为JSON，失败则保持字符串
+    取消是协作式的：执行线程在下一次RAGFlow请求或LLM调用前后发现取消并结束任务，
+    任务最终状态为CANCELLED，可通过状态接口或事件流获取
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        abort(404, description="Job not found")
+    if job.status in FINISHED_STATUSES:
+        return jsonify({"error": "任务已结束，无法取消", "job_id": job_id, "status": job.status}), 409
+    
+    if not job_cancellation.cancel(job_id):
+        # 使用共享作业存储时，任务可能由其他后端进程执行
+        return jsonify({"error": "任务不在当前进程中执行，无法取消", "job_id": job_id, "status": job.status}), 409
+    
+    append_event(job_id, "收到取消请求，正在停止任务...", level='warning')
+    return jsonify({"job_id": job_id, "status": "CANCELLING"}), 202
+
+
+@app.route('/api/crew/<job_id>/stream', methods=['GET'])
+def stream_status(job_id):
+    """以Server-Sent Events推送任务事件和最终结果"""
+    if job_id not in job_store:
+        abort(404, description="Job not found")
+    
+    # 断线重连时浏览器会带上最后收到的事件序号
     try:
-        result_json = json.loads(str(job.result))
-    except json.JSONDecodeError:
-        result_json = str(job.result)
+        since = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        since = 0
+    min_level = request.args.get('level', 'debug')
+    if min_level not in EVENT_LEVELS:
+        abort(400, description=f"Invalid level, expected one of: {', '.join(EVENT_LEVELS)}")
+    
+    def generate():
+        cursor = since
+        while True:
+            update = wait_for_job_update(job_id, cursor, timeout=Config.SSE_HEARTBEAT_SECONDS)
+            if update is None:
+                yield format_sse({"error": "Job not found"}, event="error")
+                return
+            
+            events, status, result = update
+            for event in events:
+                if level_at_least(event.level, min_level):
+                    yield format_sse(event_to_dict(event), event_id=cursor)
+                cursor += 1
+            
+            if status in FINISHED_STATUSES:
+                yield format_sse(
+                    {"job_id": job_id, "status": status, "result": parse_job_result(result)},
+                    event="result"
+                )
+                return
+            
+            if not events:
+                # 心跳注释行，防止代理或浏览器断开空闲连接
+                yield ": keepalive\n\n"
     
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/jobs/status', methods=['GET'])
+def get_jobs_status():
+    """获取任务执行器、准入控制和作业存储状态（队列深度、活跃线程数、拒绝和淘汰计数等）"""
+    try:
+        return jsonify({
+            "executor": job_executor.get_stats(),
+            "admission": admission_controller.get_stats(),
+            "cancellation": job_cancellation.get_stats(),
+            "store": job_store.get_stats()
+        }), 200
+    except Exception as e:
+        return handle_api_error(f"获取任务执行器状态失败: {str(e)}", 500)
+
+
+@app.route('/api/db/stats', methods=['GET'])
+def get_db_stats():
+    """
+    数据库语句耗时统计（按语句指纹汇总）和连接池状态
+
+    查询参数:
+        top: 只返回前top条语句，默认20
+        sort: 排序字段：total_ms（默认）、calls、avg_ms、max_ms、rows、errors、slow
+    """
+    from .utils.database import db_manager
+    from .utils.queryStats import query_stats
+    top = request.args.get('top', 20, type=int)
+    sort = request.args.get('sort', 'total_ms')
     return jsonify({
-        "job_id": job_id,
-        "status": job.status,
-        "result": result_json,
-        "events": [{"timestamp": event.timestamp.isoformat(), "data": event.data} for event in job.events]
+        "pool": db_manager.get_pool_stats(),
+        "statements": query_stats.get_stats(top=top, sort=sort),
     })
 
 
+@app.route('/api/db/stats', methods=['DELETE'])
+def reset_db_stats():
+    """清空数据库语句耗时统计"""
+    from .utils.queryStats import query_stats
+    query_stats.reset()
+    return jsonify({"message": "Database statistics reset"})
+
+
 @app.route('/api/sessions/status', methods=['GET'])
 def get_sessions_status():
     """获取所有会话状态"""
@@ -268,6 +623,35 @@ def cleanup_sessions():
     except Exception as e:
         return handle_api_error(f"清理会话失败: {str(e)}", 500)
 
+@app.route('/api/sessions/purge', methods=['POST'])
+def purge_sessions():
+    """
+    启动旧会话清理任务
+    
+    分批删除updated_at早于days天前的会话和消息，并批量删除对应的RAGFlow会话。
+    进度通过GET /api/crew/<job_id>查询，DELETE /api/crew/<job_id>中止
+    
+    请求体: {"days": 30, "batch_size": 500, "pause_seconds": 0.2, "delete_ragflow": true}
+    """
+    try:
+        data = request.json or {}
+        try:
+            days = int(data.get('days', 30))
+            batch_size = int(data['batch_size']) if data.get('batch_size') is not None else None
+            pause_seconds = float(data['pause_seconds']) if data.get('pause_seconds') is not None else None
+        except (TypeError, ValueError):
+            return handle_api_error("days、batch_size、pause_seconds必须是数字", 400)
+        if days < 1 or (batch_size is not None and batch_size < 1) or (pause_seconds is not None and pause_seconds < 0):
+            return handle_api_error("days和batch_size必须大于0，pause_seconds不能为负数", 400)
+        
+        job_id = session_purge.start(days, batch_size, pause_seconds, bool(data.get('delete_ragflow', True)))
+        return jsonify({"job_id": job_id, "status": "STARTED"}), 202
+        
+    except PurgeAlreadyRunning as e:
+        return jsonify({"error": str(e), "job_id": e.job_id}), 409
+    except Exception as e:
+        return handle_api_error(f"启动清理任务失败: {str(e)}", 500)
+
 @app.route('/api/sessions', methods=['POST'])
 def create_session():
     """创建新的聊天会话"""
@@ -295,12 +679,35 @@ def create_session():
 
 @app.route('/api/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
-    """获取会话详情"""
-    session = session_manager.get_session(session_id)
+    """
+    获取会话详情
+    
+    查询参数（都不传时返回全部消息）:
+        limit: 每页消息数，只传limit时返回最新的一页
+        before: 向前翻页，返回seq小于该值的消息
+        after: 增量同步，只返回seq大于该值的新消息
+    
+    分页时响应额外包含has_more（该方向上是否还有更多消息）以及
+    before_cursor/after_cursor（本页第一条/最后一条消息的seq，可作为下一次请求的游标）
+    """
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    limit = request.args.get('limit', type=int)
+    paginated = after is not None or before is not None or limit is not None
+    
+    session = session_manager.get_session(session_id, include_messages=not paginated)
     if not session:
         abort(404, description="Session not found")
+    if not paginated:
+        return jsonify(session.to_dict())
     
-    return jsonify(session.to_dict())
+    limit = min(max(1, limit or Config.MESSAGE_PAGE_SIZE), Config.MESSAGE_PAGE_MAX)
+    session.messages, has_more = session_manager.get_messages(session_id, after=after, before=before, limit=limit)
+    data = session.to_dict()
+    data['has_more'] = has_more
+    data['before_cursor'] = session.messages[0].seq if session.messages else before
+    data['after_cursor'] = session.messages[-1].seq if session.messages else after
+    return jsonify(data)
 
 
 @app.route('/api/sessions/<session_id>/messages', methods=['POST'])
@@ -346,9 +753,73 @@ def delete_session(session_id):
         return handle_api_error(f"删除会话失败: {str(e)}", 500)
 
 
+@app.route('/api/messages/import', methods=['POST'])
+def import_messages():
+    """
+    批量导入消息
+
+    请求体为NDJSON（每行一条消息记录，格式与导出相同），边读边分批写入，不把整个请求体读入内存
+
+    查询参数:
+        batch_size: 每个事务写入的条数，默认IMPORT_BATCH_SIZE
+    """
+    batch_size = request.args.get('batch_size', type=int)
+    
+    def records():
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    
+    try:
+        imported = session_manager.import_messages(records(), batch_size=batch_size)
+    except MessageImportError as e:
+        return jsonify({"error": f"导入失败: {e}", "imported": e.imported}), 400
+    return jsonify({"imported": imported}), 201
+
+
+@app.route('/api/messages/export', methods=['GET'])
+def export_messages():
+    """
+    按seq顺序流式导出消息（NDJSON，每行一条）
+
+    查询参数:
+        session_id: 只导出该会话的消息
+        user_id: 只导出该用户的消息
+    """
+    records = session_manager.export_messages(
+        session_id=request.args.get('session_id'),
+        user_id=request.args.get('user_id')
+    )
+    try:
+        # 先取第一行，数据库不可用时还能返回错误状态码
+        first = next(records, None)
+    except ValueError:
+        # BINARY(16)存储时不是UUID格式的会话ID，不可能存在
+        return handle_api_error("Session not found", 404)
+    except RuntimeError as e:
+        return handle_api_error(f"导出失败: {e}", 503)
+    
+    def generate():
+        if first is None:
+            return
+        yield json.dumps(first, ensure_ascii=False) + "\n"
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/users/<user_id>/sessions', methods=['GET'])
 def get_user_sessions(user_id):
-    """获取用户的所有会话"""
+    """
+    获取用户的所有会话
+    
+    查询参数:
+        summary: 为1/true时只返回摘要（标题、更新时间、消息数、最后一条消息预览），不含消息正文
+    """
+    if request.args.get('summary', '').lower() in ('1', 'true'):
+        return jsonify(session_manager.get_session_summaries(user_id))
     sessions = session_manager.get_user_sessions(user_id)
     return jsonify([session.to_dict() for session in sessions])
 
@@ -358,13 +829,18 @@ def health_check():
     """健康检查端点"""
     try:
         # 检查数据库连接
-        from utils.database import db_manager
+        from .utils.database import db_manager
+        from .utils.messageWriter import get_message_writer_stats
         db_status = db_manager._check_connection()
         
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "database": "connected" if db_status else "disconnected",
+            "database_pool": db_manager.get_pool_stats(),
+            "schema_version": db_manager.schema_version,
+            "message_writer": get_message_writer_stats(),
+            "session_cache": session_cache.get_stats(),
             "service": "aiagent-backend"
         }), 200
     except Exception as e:
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+主键格式插入吞吐基准测试
+
+对比三种消息表主键在持续插入下的表现：
+- uuid4-varchar: 原实现，随机UUID4字符串作为VARCHAR(36)主键
+- uuid7-varchar: 按时间递增的UUIDv7字符串，仍以VARCHAR(36)存储
+- uuid7-binary: UUIDv7以BINARY(16)存储（ID_SCHEME=uuid7 + convert_ids_to_binary.py）
+
+每种格式在独立的临时表中插入相同数量的行（主键 + 会话ID二级索引 + 正文），
+报告插入吞吐以及表和索引占用的空间。默认使用.env中配置的MySQL（InnoDB聚簇主键）；
+--backend sqlite 使用临时文件中的WITHOUT ROWID表（同样按主键聚簇存储），不需要MySQL服务
+
+用法:
+    python crewaiBackend/scripts/benchmark_ids.py --rows 200000 --batch 1000
+    python crewaiBackend/scripts/benchmark_ids.py --backend sqlite
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root.parent))
+
+from crewaiBackend.utils.ids import id_to_bytes, uuid7
+
+FORMATS = ("uuid4-varchar", "uuid7-varchar", "uuid7-binary")
+TABLE_PREFIX = "bench_ids_"
+
+
+def make_id(fmt: str):
+    """按格式生成一个写入数据库的ID"""
+    if fmt == "uuid4-varchar":
+        return str(uuid.uuid4())
+    if fmt == "uuid7-varchar":
+        return uuid7()
+    return id_to_bytes(uuid7())
+
+
+class MySQLTarget:
+    """InnoDB临时表"""
+
+    placeholder = "%s"
+
+    def __init__(self):
+        from crewaiBackend.utils.database import DatabaseManager
+        self.connection = DatabaseManager._open_connection()
+
+    def create_table(self, table: str, binary: bool):
+        id_type = "BINARY(16)" if binary else "VARCHAR(36)"
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"""
+                CREATE TABLE {table} (
+                    id {id_type} PRIMARY KEY,
+                    session_id {id_type} NOT NULL,
+                    content TEXT NOT NULL,
+                    INDEX idx_session_id (session_id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+
+    def insert_batch(self, table: str, rows):
+        with self.connection.cursor() as cursor:
+            cursor.execute("BEGIN")
+            cursor.executemany(f"INSERT INTO {table} (id, session_id, content) VALUES (%s, %s, %s)", rows)
+            cursor.execute("COMMIT")
+
+    def table_size(self, table: str):
+        """返回(数据字节数, 索引字节数)"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+            cursor.execute("""
+                SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            """, (table,))
+            return cursor.fetchone()
+
+    def drop_table(self, table: str):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLiteTarget:
+    """临时文件中的SQLite WITHOUT ROWID表"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+    def create_table(self, table: str, binary: bool):
+        id_type = "BLOB" if binary else "TEXT"
+        self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.execute(f"""
+            CREATE TABLE {table} (
+                id {id_type} PRIMARY KEY,
+                session_id {id_type} NOT NULL,
+                content TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.connection.execute(f"CREATE INDEX {table}_session_id ON {table} (session_id)")
+
+    def insert_batch(self, table: str, rows):
+        self.connection.execute("BEGIN")
+        self.connection.executemany(f"INSERT INTO {table} (id, session_id, content) VALUES (?, ?, ?)", rows)
+        self.connection.execute("COMMIT")
+
+    def table_size(self, table: str):
+        """返回(数据字节数, 索引字节数)，需要SQLite编译时启用dbstat虚拟表，否则返回(None, None)"""
+        try:
+            rows = self.connection.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN (?, ?) GROUP BY name",
+                (table, f"{table}_session_id")
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return None, None
+        sizes = dict(rows)
+        return sizes.get(table), sizes.get(f"{table}_session_id")
+
+    def drop_table(self, table: str):
+        self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def close(self):
+        self.connection.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+def run(target, fmt: str, rows: int, batch: int, sessions: int, content: str):
+    """插入rows行，返回(耗时秒数, 数据字节数, 索引字节数)"""
+    table = TABLE_PREFIX + fmt.replace("-", "_")
+    target.create_table(table, binary=fmt.endswith("binary"))
+    # 会话ID同样按格式生成，消息随机分布到各会话
+    session_ids = [make_id(fmt) for _ in range(sessions)]
+    rng = random.Random(42)
+
+    started = time.perf_counter()
+    inserted = 0
+    while inserted < rows:
+        count = min(batch, rows - inserted)
+        target.insert_batch(table, [(make_id(fmt), rng.choice(session_ids), content) for _ in range(count)])
+        inserted += count
+    elapsed = time.perf_counter() - started
+
+    data_bytes, index_bytes = target.table_size(table)
+    target.drop_table(table)
+    return elapsed, data_bytes, index_bytes
+
+
+def format_bytes(value) -> str:
+    return "-" if value is None else f"{value / 1024 / 1024:8.1f}MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="主键格式插入吞吐基准测试")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default="mysql", help="测试使用的数据库")
+    parser.add_argument("--rows", type=int, default=200000, help="每种格式插入的行数")
+    parser.add_argument("--batch", type=int, default=1000, help="每个事务插入的行数")
+    parser.add_argument("--sessions", type=int, default=5000, help="消息分布的会话数")
+    parser.add_argument("--content-length", type=int, default=200, help="每条消息正文的字符数")
+    args = parser.parse_args()
+
+    target = MySQLTarget() if args.backend == "mysql" else SQLiteTarget()
+    content = "x" * args.content_length
+    print(f"后端 {args.backend}，每种格式插入 {args.rows} 行，每批 {args.batch} 行，{args.sessions} 个会话")
+    try:
+        results = {}
+        for fmt in FORMATS:
+            elapsed, data_bytes, index_bytes = run(target, fmt, args.rows, args.batch, args.sessions, content)
+            results[fmt] = elapsed
+            print(f"{fmt:<14} 耗时 {elapsed:7.2f}s  吞吐 {args.rows / elapsed:9.0f} 行/秒  "
+                  f"数据 {format_bytes(data_bytes)}  二级索引 {format_bytes(index_bytes)}")
+        print(f"uuid7-binary 相对 uuid4-varchar 吞吐提升: {results['uuid4-varchar'] / results['uuid7-binary']:.2f}x")
+    finally:
+        target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务管理器锁竞争基准测试
+
+对比两种实现在大量并发任务下的表现：
+- legacy: 原实现，所有任务共用一把全局锁，并在锁内输出每条事件
+- sharded: 当前实现，作业表分片加锁、每个任务独立的锁，日志在锁外输出
+
+两种实现使用相同的读取方式：每个任务一个读取方，按游标轮询并只序列化新事件，
+差异只来自锁的粒度和输出方式。输出真实写入（默认写入临时文件，--output - 写到标准错误）：
+legacy与原实现一样每条事件print一行；sharded通过jobManager的logger输出，--log-level为
+生产默认的INFO时只输出任务开始，DEBUG时同样每条事件输出一行
+
+用法:
+    python crewaiBackend/scripts/benchmark_job_manager.py --jobs 200 --events 100
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root.parent))
+
+from crewaiBackend.config import Config
+from crewaiBackend.utils.jobManager import Event, Job, MemoryJobStore, FINISHED_STATUSES
+
+
+def serialize(events):
+    return [{"timestamp": e.timestamp.isoformat(), "data": e.data} for e in events]
+
+
+class LegacyJobRegistry:
+    """原实现：全局锁 + 锁内输出"""
+
+    def __init__(self, output):
+        self.output = output
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def append_event(self, job_id, event_data):
+        with self.lock:
+            if job_id not in self.jobs:
+                print(f"Job {job_id} started", file=self.output)
+                self.jobs[job_id] = Job(status='STARTED', events=[], result='')
+            else:
+                print(f"Appending event for job {job_id}: {event_data}", file=self.output)
+            self.jobs[job_id].events.append(Event(timestamp=datetime.now(), data=event_data))
+
+    def finish_job(self, job_id, status, result):
+        with self.lock:
+            self.jobs[job_id].status = status
+            self.jobs[job_id].result = result
+
+    def snapshot(self, job_id, cursor):
+        """返回(第cursor条之后的事件, 状态)"""
+        with self.lock:
+            job = self.jobs[job_id]
+            return job.events[cursor:], job.status
+
+
+class ShardedJobRegistry:
+    """当前实现：分片锁 + 每个任务的锁，日志在锁外输出"""
+
+    def __init__(self, shards):
+        self.store = MemoryJobStore(ttl_seconds=3600, max_jobs=100000, shards=shards)
+
+    def append_event(self, job_id, event_data):
+        self.store.append_event(job_id, event_data)
+
+    def finish_job(self, job_id, status, result):
+        self.store.finish_job(job_id, status, result)
+
+    def snapshot(self, job_id, cursor):
+        """返回(第cursor条之后的事件, 状态)"""
+        job = self.store.get(job_id)
+        with job.lock:
+            return job.events[cursor:], job.status
+
+
+def follow(registry, job_id, poll_interval):
+    """读取方：按游标轮询，只序列化新事件（两种实现相同）"""
+    cursor = 0
+    while True:
+        events, status = registry.snapshot(job_id, cursor)
+        serialize(events)
+        cursor += len(events)
+        if status in FINISHED_STATUSES:
+            return
+        time.sleep(poll_interval)
+
+
+def run(registry, jobs, events_per_job, poll_interval):
+    """运行一轮基准测试，返回(总耗时, 每次append耗时列表)"""
+    latencies = []
+    latencies_lock = threading.Lock()
+    start_barrier = threading.Barrier(jobs * 2 + 1)
+
+    job_ids = [f"bench-{i}" for i in range(jobs)]
+    for job_id in job_ids:
+        registry.append_event(job_id, "任务开始")
+
+    def writer(job_id):
+        local = []
+        start_barrier.wait()
+        for i in range(events_per_job):
+            t0 = time.perf_counter()
+            registry.append_event(job_id, f"事件 {i}")
+            local.append(time.perf_counter() - t0)
+        registry.finish_job(job_id, 'COMPLETE', 'done')
+        with latencies_lock:
+            latencies.extend(local)
+
+    def reader(job_id):
+        start_barrier.wait()
+        follow(registry, job_id, poll_interval)
+
+    threads = [threading.Thread(target=writer, args=(job_id,)) for job_id in job_ids]
+    threads += [threading.Thread(target=reader, args=(job_id,)) for job_id in job_ids]
+    for t in threads:
+        t.start()
+
+    start_barrier.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, latencies
+
+
+def report(name, elapsed, latencies, total_events):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1e6
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e6
+    print(f"{name:<10} 总耗时 {elapsed:7.3f}s  吞吐 {total_events / elapsed:10.0f} 事件/秒  "
+          f"append p50 {p50:8.1f}us  p99 {p99:9.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务管理器锁竞争基准测试")
+    parser.add_argument("--jobs", type=int, default=200, help="并发任务数")
+    parser.add_argument("--events", type=int, default=100, help="每个任务追加的事件数")
+    parser.add_argument("--poll-interval", type=float, default=0.01, help="读取方的轮询间隔（秒）")
+    parser.add_argument("--shards", type=int, default=16, help="sharded实现的分片数")
+    parser.add_argument("--log-level", default=Config.LOG_LEVEL, help="sharded实现的日志级别，默认与服务配置相同")
+    parser.add_argument("--output", default=None, help="事件输出写入的文件，- 表示标准错误，默认写入临时文件")
+    args = parser.parse_args()
+
+    total_events = args.jobs * args.events
+    print(f"并发任务 {args.jobs} 个，每个任务 {args.events} 条事件，每个任务一个读取方，"
+          f"sharded日志级别 {args.log_level.upper()}")
+
+    if args.output == "-":
+        output, path = sys.stderr, None
+    else:
+        path = args.output or tempfile.mkstemp(suffix=".log")[1]
+        output = open(path, "w", encoding="utf-8")
+
+    # sharded实现的事件通过jobManager的logger输出，与legacy写到同一目标
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    job_logger = logging.getLogger("crewaiBackend.utils.jobManager")
+    job_logger.addHandler(handler)
+    job_logger.setLevel(args.log_level.upper())
+    job_logger.propagate = False
+    try:
+        legacy_elapsed, legacy_latencies = run(LegacyJobRegistry(output), args.jobs, args.events, args.poll_interval)
+        sharded_elapsed, sharded_latencies = run(ShardedJobRegistry(args.shards), args.jobs, args.events,
+                                                 args.poll_interval)
+    finally:
+        job_logger.removeHandler(handler)
+        if output is not sys.stderr:
+            output.close()
+            if args.output is None:
+                os.remove(path)
+
+    report("legacy", legacy_elapsed, legacy_latencies, total_events)
+    report("sharded", sharded_elapsed, sharded_latencies, total_events)
+    print(f"总耗时提升: {legacy_elapsed / sharded_elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
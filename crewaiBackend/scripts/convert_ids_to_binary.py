@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话和消息ID转换为BINARY(16)存储
+
+把chat_sessions、chat_messages、chat_messages_archive中的VARCHAR(36) UUID列转换为BINARY(16)，
+重建主键、索引和外键。转换期间表被锁定，请先停止所有后端进程并备份数据库。
+转换中途失败（如连接中断）后可以直接重新执行，已转换的表会跳过，其余表从失败的步骤继续。
+转换后后端启动时自动检测并按16字节读写ID，API中的ID仍是字符串形式；
+建议同时设置ID_SCHEME=uuid7，使新ID按时间递增写入主键索引末尾。
+
+用法:
+    python crewaiBackend/scripts/convert_ids_to_binary.py --yes
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root.parent))
+
+from crewaiBackend.config import Config
+from crewaiBackend.utils.database import DatabaseManager
+from crewaiBackend.utils.migrations import convert_ids_to_binary, run_migrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话和消息ID转换为BINARY(16)存储")
+    parser.add_argument("--yes", action="store_true", help="确认已停止后端进程并备份数据库")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    if not args.yes:
+        print("转换会重建主键和外键，期间表被锁定。请停止所有后端进程、备份数据库后加 --yes 执行")
+        sys.exit(1)
+
+    connection = DatabaseManager._open_connection()
+    try:
+        # 先迁移到最新结构，确保归档表等已存在
+        version = run_migrations(connection)
+        print(f"数据库结构版本: {version}")
+        if convert_ids_to_binary(connection):
+            print("转换完成，会话和消息ID已改为BINARY(16)存储")
+        else:
+            print("ID已经是BINARY(16)存储，无需转换")
+    except ValueError as e:
+        print(f"无法转换: {e}")
+        sys.exit(1)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
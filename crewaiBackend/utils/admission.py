@@ -0,0 +1,147 @@
+"""
+任务准入控制
+限制每个进程和每个用户同时处理中的任务数，超出时快速拒绝并给出建议的重试时间
+"""
+
+import logging
+import math
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from ..config import Config
+from .jobExecutor import job_executor
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """任务被准入控制拒绝"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """按进程和用户限制处理中的任务数"""
+
+    # 估算任务耗时的指数滑动平均系数
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, max_in_flight: int = None, max_per_user: int = None, concurrency: int = None,
+                 initial_job_seconds: float = 10.0, queue_depth: Optional[Callable[[], int]] = None,
+                 max_batch_per_user: int = None):
+        """
+        初始化准入控制器
+
+        Args:
+            max_in_flight: 进程内处理中（排队+执行）的任务上限，默认从配置获取
+            max_per_user: 单个用户处理中的任务上限，默认从配置获取
+            concurrency: 实际并行执行的任务数，用于估算重试时间，默认为工作线程数
+            initial_job_seconds: 还没有完成的任务时假定的任务耗时（秒）
+            queue_depth: 返回执行器中排队等待的任务数，用于估算进程繁忙时的重试时间；为None时按没有排队估算
+            max_batch_per_user: 单个用户通过批量接口提交、处理中的任务上限（与交互任务分开计数），默认从配置获取
+        """
+        self.max_in_flight = max(1, max_in_flight or Config.MAX_INFLIGHT_JOBS)
+        self.max_per_user = max(1, max_per_user or Config.MAX_INFLIGHT_JOBS_PER_USER)
+        self.max_batch_per_user = max(1, max_batch_per_user or Config.MAX_INFLIGHT_BATCH_JOBS_PER_USER)
+        self.concurrency = max(1, concurrency or Config.JOB_WORKERS)
+        self._queue_depth = queue_depth
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._per_user: Dict[str, int] = {}
+        self._per_user_batch: Dict[str, int] = {}  # 批量任务单独计数，不占用交互任务的名额
+        self._avg_job_seconds = initial_job_seconds
+        self._accepted = 0
+        self._rejected_global = 0
+        self._rejected_user = 0
+
+    def acquire(self, user_key: str, batch: bool = False):
+        """
+        申请一个任务名额
+
+        Args:
+            user_key: 用户标识（用户ID、会话ID或客户端地址）
+            batch: 是否为批量接口提交的任务；批量任务按max_batch_per_user单独计数，
+                同一用户的批量任务不会挤占其交互请求的名额，进程上限两者共用
+
+        Raises:
+            AdmissionRejected: 进程或用户的处理中任务数已达上限
+        """
+        per_user, limit = (self._per_user_batch, self.max_batch_per_user) if batch else \
+            (self._per_user, self.max_per_user)
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                self._rejected_global += 1
+                raise AdmissionRejected(
+                    f"服务繁忙，处理中的任务已达上限（{self.max_in_flight}），请稍后重试",
+                    self._backlog_retry_after())
+
+            user_count = per_user.get(user_key, 0)
+            if user_count >= limit:
+                self._rejected_user += 1
+                raise AdmissionRejected(
+                    f"您有 {user_count} 个{'批量' if batch else ''}任务正在处理，请等待完成后再提交",
+                    self._retry_after(self._avg_job_seconds))
+
+            self._in_flight += 1
+            per_user[user_key] = user_count + 1
+            self._accepted += 1
+
+    def release(self, user_key: str, duration: float = None, batch: bool = False):
+        """
+        归还任务名额
+
+        Args:
+            user_key: 申请时使用的用户标识
+            duration: 任务实际耗时（秒），用于更新耗时估计；任务未执行时传None
+            batch: 申请时是否为批量任务
+        """
+        per_user = self._per_user_batch if batch else self._per_user
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            remaining = per_user.get(user_key, 0) - 1
+            if remaining > 0:
+                per_user[user_key] = remaining
+            else:
+                per_user.pop(user_key, None)
+            if duration is not None:
+                self._avg_job_seconds += self.EWMA_ALPHA * (duration - self._avg_job_seconds)
+
+    def estimate_retry_after(self) -> int:
+        """进程繁忙（处理中任务达到上限或执行器队列已满）时建议的重试等待时间（秒）"""
+        with self._lock:
+            return self._backlog_retry_after()
+
+    def _backlog_retry_after(self) -> int:
+        """
+        按执行器的排队任务数估算重试时间（调用方需持有锁）
+
+        排在前面的任务按并行度一批批执行，现在提交的任务大约要等(排队数 + 1) / 并行度 个任务耗时才能开始执行
+        """
+        queued = self._queue_depth() if self._queue_depth is not None else 0
+        return self._retry_after(self._avg_job_seconds * (queued + 1) / self.concurrency)
+
+    @staticmethod
+    def _retry_after(seconds: float) -> int:
+        return int(min(120, max(1, math.ceil(seconds))))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取准入控制状态"""
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'max_per_user': self.max_per_user,
+                'max_batch_per_user': self.max_batch_per_user,
+                'active_users': len(self._per_user.keys() | self._per_user_batch.keys()),
+                'accepted': self._accepted,
+                'rejected_global': self._rejected_global,
+                'rejected_user': self._rejected_user,
+                'avg_job_seconds': round(self._avg_job_seconds, 3),
+            }
+
+
+# 全局准入控制器实例，按全局任务执行器的队列深度估算重试时间
+admission_controller = AdmissionController(queue_depth=job_executor.queue_depth)
@@ -0,0 +1,71 @@
+"""
+数据库后端接口
+"""
+
+from typing import Any, Dict, Iterator, Optional
+
+from .ids import id_to_bytes
+
+
+class IntegrityError(Exception):
+    """违反约束（外键、唯一键等）；各后端的transaction()把驱动自己的约束错误转换为此异常"""
+
+
+class BaseDatabase:
+    """
+    数据库后端接口
+
+    SessionManager等上层代码只通过这些方法访问数据库，SQL按MySQL语法编写（%s占位符），
+    其他后端负责转换为自己的方言。DatabaseManager是MySQL实现，
+    SQLiteDatabase（sqliteDatabase.py）是嵌入式实现，用于MySQL不可用时降级运行和本地测试
+    """
+
+    backend: str = 'base'
+    schema_version: Optional[int] = None
+    # 会话和消息ID是否以BINARY(16)存储（见migrations.convert_ids_to_binary）
+    binary_ids: bool = False
+
+    def db_id(self, value: str) -> Any:
+        """
+        把字符串ID转换为写入数据库的形式（BINARY(16)存储时为16字节，否则原样返回）
+
+        Raises:
+            ValueError: BINARY(16)存储时不是合法的UUID
+        """
+        return id_to_bytes(value) if self.binary_ids else value
+
+    @property
+    def available(self) -> bool:
+        """数据库当前是否可用（不触发重连）"""
+        raise NotImplementedError
+
+    def execute_query(self, query: str, params: tuple = None, replica: bool = False) -> Any:
+        """
+        执行查询，返回全部行；出错时记录日志并返回[]
+
+        replica=True表示调用方可以接受复制延迟，支持只读副本的后端可以把查询发往副本
+        """
+        raise NotImplementedError
+
+    def execute_update(self, query: str, params: tuple = None) -> int:
+        """执行更新，返回影响的行数；出错时记录日志并返回0"""
+        raise NotImplementedError
+
+    def stream_query(self, query: str, params: tuple = None, fetch_size: int = None) -> Iterator[tuple]:
+        """逐行返回查询结果，不把结果集一次读入内存；数据库不可用时抛出RuntimeError"""
+        raise NotImplementedError
+
+    def transaction(self):
+        """事务上下文管理器，返回游标；出错时回滚并抛出异常，违反约束时抛出IntegrityError"""
+        raise NotImplementedError
+
+    def _check_connection(self) -> bool:
+        """检查数据库是否可用"""
+        raise NotImplementedError
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接状态"""
+        raise NotImplementedError
+
+    def close(self):
+        """关闭连接"""
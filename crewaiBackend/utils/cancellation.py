@@ -0,0 +1,183 @@
+"""
+任务取消
+为每个后台任务登记一个取消令牌，执行线程在各阶段之间（RAGFlow请求、重试退避、LLM调用前后）检查令牌，
+取消后抛出JobCancelledError尽快结束任务，释放工作线程并停止消耗LLM配额
+"""
+
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelledError(Exception):
+    """任务已被取消"""
+
+
+class CancellationToken:
+    """单个任务的取消令牌"""
+
+    def __init__(self, job_id: str, session_id: str = None):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "任务已取消"):
+        """标记任务为已取消"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self):
+        """任务已取消时抛出JobCancelledError"""
+        if self._event.is_set():
+            raise JobCancelledError(self.reason or "任务已取消")
+
+    def sleep(self, seconds: float):
+        """
+        可被取消打断的等待
+
+        Args:
+            seconds: 等待时间（秒）
+
+        Raises:
+            JobCancelledError: 等待期间任务被取消
+        """
+        if self._event.wait(seconds):
+            self.raise_if_cancelled()
+
+
+# 当前线程正在执行的任务的取消令牌，由kickoff_crew绑定
+_current_token: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar(
+    "current_cancellation_token", default=None
+)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """获取当前执行上下文绑定的取消令牌，没有绑定时返回None"""
+    return _current_token.get()
+
+
+def check_cancelled():
+    """当前任务已取消时抛出JobCancelledError；不在任务上下文中时不做任何事"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellable_sleep(seconds: float):
+    """在任务上下文中可被取消打断的sleep，否则等同于time.sleep"""
+    token = _current_token.get()
+    if token is not None:
+        token.sleep(seconds)
+    else:
+        threading.Event().wait(seconds)
+
+
+@contextmanager
+def bind_token(token: CancellationToken):
+    """在with块内把令牌绑定到当前执行上下文"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+class CancellationRegistry:
+    """登记处理中任务的取消令牌，支持按任务或按会话取消"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, CancellationToken] = {}
+        self._session_jobs: Dict[str, Set[str]] = {}
+
+    def register(self, job_id: str, session_id: str = None) -> CancellationToken:
+        """
+        为任务创建并登记取消令牌
+
+        Args:
+            job_id: 任务ID
+            session_id: 任务所属会话ID，用于释放会话时批量取消
+
+        Returns:
+            CancellationToken实例
+        """
+        token = CancellationToken(job_id, session_id)
+        with self._lock:
+            self._tokens[job_id] = token
+            if session_id:
+                self._session_jobs.setdefault(session_id, set()).add(job_id)
+        return token
+
+    def unregister(self, job_id: str):
+        """任务结束后移除令牌"""
+        with self._lock:
+            token = self._tokens.pop(job_id, None)
+            if token is not None and token.session_id:
+                job_ids = self._session_jobs.get(token.session_id)
+                if job_ids is not None:
+                    job_ids.discard(job_id)
+                    if not job_ids:
+                        del self._session_jobs[token.session_id]
+
+    def get(self, job_id: str) -> Optional[CancellationToken]:
+        with self._lock:
+            return self._tokens.get(job_id)
+
+    def cancel(self, job_id: str, reason: str = "任务已被用户取消") -> bool:
+        """
+        取消任务
+
+        Args:
+            job_id: 任务ID
+            reason: 取消原因
+
+        Returns:
+            任务仍在处理中并已标记取消返回True，任务不存在或已结束返回False
+        """
+        token = self.get(job_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        logger.info(f"任务 {job_id} 已标记取消: {reason}")
+        return True
+
+    def cancel_session(self, session_id: str, reason: str = "会话已释放") -> List[str]:
+        """
+        取消会话下所有处理中的任务
+
+        Args:
+            session_id: 会话ID
+            reason: 取消原因
+
+        Returns:
+            被取消的任务ID列表
+        """
+        with self._lock:
+            tokens = [self._tokens[job_id] for job_id in self._session_jobs.get(session_id, ())
+                      if job_id in self._tokens]
+        for token in tokens:
+            token.cancel(reason)
+        if tokens:
+            logger.info(f"会话 {session_id} 的 {len(tokens)} 个任务已标记取消: {reason}")
+        return [token.job_id for token in tokens]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'tracked_jobs': len(self._tokens),
+                'cancelling_jobs': sum(1 for token in self._tokens.values() if token.cancelled),
+            }
+
+
+# 全局取消令牌登记表
+job_cancellation = CancellationRegistry()
@@ -3,138 +3,582 @@ MySQL数据库连接和操作
 用于管理聊天会话和消息的持久化存储
 """
 
+import itertools
 import pymysql
 import logging
-from typing import List, Dict, Optional, Any
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from typing import List, Dict, Iterator, Optional, Any, Tuple
 from datetime import datetime
 from ..config import Config
+from .baseDatabase import BaseDatabase, IntegrityError
+from .migrations import run_migrations, uses_binary_ids
+from .queryStats import TimedCursor, query_stats
 
 logger = logging.getLogger(__name__)
 
 
-class DatabaseManager:
-    """MySQL数据库管理器"""
+class PoolTimeoutError(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    """
+    线程安全的MySQL连接池
+
+    - 启动时预先创建min_size个连接，按需增长到max_size个
+    - 连接用完归还到池中，池满时借用方最多等待timeout秒
+    - 只对空闲超过health_check_idle秒的连接做ping检查，不再每次查询都ping
+    - 执行中出现连接错误的连接直接丢弃，由后续借用方按需重建
+    """
+
+    def __init__(self, connect, min_size: int = None, max_size: int = None, timeout: float = None,
+                 health_check_idle: float = None):
+        """
+        初始化连接池
+
+        Args:
+            connect: 创建新连接的函数
+            min_size: 最少保持的连接数，默认从配置获取
+            max_size: 最多创建的连接数，默认从配置获取
+            timeout: 借用连接的最长等待时间（秒），默认从配置获取
+            health_check_idle: 空闲超过该秒数的连接在借出前做ping检查，默认从配置获取
+        """
+        self._connect = connect
+        self.max_size = max(1, max_size or Config.DB_POOL_MAX_SIZE)
+        self.min_size = min(self.max_size, max(0, min_size if min_size is not None else Config.DB_POOL_MIN_SIZE))
+        self.timeout = timeout if timeout is not None else Config.DB_POOL_TIMEOUT
+        self.health_check_idle = (health_check_idle if health_check_idle is not None
+                                  else Config.DB_POOL_HEALTH_CHECK_IDLE)
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (连接, 归还时间)，后进先出，尽量复用刚用过的连接
+        self._size = 0
+        self._closed = False
+        self._created = 0
+        self._discarded = 0
+        self._waits = 0
+        self._timeouts = 0
+
+        try:
+            for _ in range(self.min_size):
+                self._idle.append((self._connect(), time.monotonic()))
+                self._size += 1
+                self._created += 1
+        except Exception:
+            self.close()
+            raise
+
+    def _healthy(self, connection, idle_seconds: float) -> bool:
+        if idle_seconds < self.health_check_idle:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception as e:
+            logger.info(f"空闲连接已失效，丢弃: {e}")
+            return False
+
+    def acquire(self, timeout: float = None):
+        """
+        借用一个连接
+
+        Args:
+            timeout: 最长等待时间（秒），默认使用连接池配置
+
+        Returns:
+            pymysql连接
+
+        Raises:
+            PoolTimeoutError: 超时仍没有可用连接
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                elif self._size < self.max_size:
+                    # 先占位再在锁外建立连接，避免建连期间阻塞其他借用方
+                    self._size += 1
+                    connection = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(f"等待数据库连接超时（{timeout}秒），连接池已满（{self.max_size}）")
+                    self._waits += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+                return connection
+
+            if self._healthy(connection, time.monotonic() - released_at):
+                return connection
+            self._discard(connection)
+
+    def release(self, connection, discard: bool = False):
+        """
+        归还连接
+
+        Args:
+            connection: acquire借出的连接
+            discard: 连接已损坏时传True，直接关闭而不放回池中
+        """
+        if discard or not connection.open:
+            self._discard(connection)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                connection.close()
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """借用连接的上下文管理器，连接错误时丢弃该连接"""
+        connection = self.acquire(timeout)
+        discard = False
+        try:
+            yield connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(connection, discard=discard)
+
+    def close(self):
+        """关闭所有空闲连接，借出中的连接归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取连接池状态"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'created': self._created,
+                'discarded': self._discarded,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+            }
+
+
+def parse_replica_hosts(value: str) -> List[Tuple[str, int]]:
+    """
+    解析MYSQL_REPLICA_HOSTS配置
+
+    Args:
+        value: 逗号分隔的host[:port]，端口缺省时使用MYSQL_PORT
+
+    Returns:
+        (host, port)列表
+    """
+    hosts = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        hosts.append((host, int(port) if port else Config.MYSQL_PORT))
+    return hosts
+
+
+class Replica:
+    """
+    一个只读副本：连接池按需建立连接（不预先连接，副本不可用不影响启动），
+    连接失败后在retry_seconds内不再使用
+    """
+
+    def __init__(self, host: str, port: int, connect, retry_seconds: float = None):
+        self.host = host
+        self.port = port
+        self.pool = ConnectionPool(connect, min_size=0)
+        self.retry_seconds = retry_seconds if retry_seconds is not None else Config.DB_REPLICA_RETRY_SECONDS
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self.reads = 0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def record_read(self):
+        with self._lock:
+            self.reads += 1
+
+    def mark_failed(self):
+        with self._lock:
+            self.failures += 1
+            self._retry_at = time.monotonic() + self.retry_seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {'host': f"{self.host}:{self.port}", 'healthy': self.healthy, 'reads': self.reads,
+                     'failures': self.failures}
+        return {**stats, **self.pool.get_stats()}
+
+
+class DatabaseManager(BaseDatabase):
+    """
+    MySQL数据库管理器
+
+    配置了MYSQL_REPLICA_HOSTS时，execute_query(replica=True)的读请求分散到各只读副本，
+    副本不可用时回到主库；写入、事务和未标记replica的读取始终走主库。
+    副本有复制延迟，需要读到最新数据的调用方（如刚写入后的读取）不应传replica=True
+    """
+    
+    backend = 'mysql'
     
     def __init__(self):
-        self.connection = None
-        self._connect()
-        self._create_tables()
+        self.pool: Optional[ConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self.schema_version: Optional[int] = None
+        self.replicas: List[Replica] = [
+            Replica(host, port, partial(self._open_connection, host, port))
+            for host, port in parse_replica_hosts(Config.MYSQL_REPLICA_HOSTS)
+        ]
+        self._replica_cursor = itertools.count()
+        self._replica_local = threading.local()
+        self._replica_fallbacks = 0
+        self._replica_stats_lock = threading.Lock()
+        self._connect(initial=True)
+        if self.replicas:
+            logger.info(f"只读副本: {', '.join(f'{r.host}:{r.port}' for r in self.replicas)}")
     
-    def _connect(self):
-        """连接到MySQL数据库"""
-        try:
-            self.connection = pymysql.connect(
-                host=Config.MYSQL_HOST,
-                port=Config.MYSQL_PORT,
-                user=Config.MYSQL_USER,
-                password=Config.MYSQL_PASSWORD,
-                database=Config.MYSQL_DATABASE,
-                charset='utf8mb4',
-                autocommit=True,
-                connect_timeout=10,
-                read_timeout=30,
-                write_timeout=30
-            )
-            logger.info("MySQL数据库连接成功")
-        except Exception as e:
-            logger.error(f"MySQL数据库连接失败: {e}")
-            logger.warning("系统将使用内存模式运行，会话数据不会持久化")
-            self.connection = None
+    @staticmethod
+    def _open_connection(host: str = None, port: int = None):
+        """建立一个新的MySQL连接，默认连接主库"""
+        return pymysql.connect(
+            host=host or Config.MYSQL_HOST,
+            port=port or Config.MYSQL_PORT,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DATABASE,
+            charset='utf8mb4',
+            autocommit=True,
+            connect_timeout=10,
+            read_timeout=30,
+            write_timeout=30
+        )
+    
+    def _connect(self, initial: bool = False):
+        """
+        创建连接池（预先建立最少连接数），执行数据库迁移并检测ID存储方式后才启用连接池
+
+        启动时数据库不可用、之后才首次连上时同样先迁移，保证表结构为最新版本且binary_ids与表结构一致。
+        迁移期间其他线程在_pool_lock上等待
+
+        Args:
+            initial: 是否为启动时的首次连接；首次连接迁移失败时抛出异常，之后的重连只记录日志并保持不可用
+        """
+        with self._pool_lock:
+            if self.pool is not None:
+                return
+            try:
+                pool = ConnectionPool(self._open_connection)
+                logger.info(f"MySQL数据库连接成功，连接池大小 {pool.min_size}-{pool.max_size}")
+            except Exception as e:
+                logger.error(f"MySQL数据库连接失败: {e}")
+                if initial:
+                    logger.warning("数据库迁移将在首次连接成功后执行")
+                return
+            try:
+                self._migrate(pool)
+            except Exception:
+                pool.close()
+                if initial:
+                    raise
+                return
+            self.pool = pool
+    
+    @property
+    def available(self) -> bool:
+        return self.pool is not None
     
     def _check_connection(self):
-        """检查数据库连接是否有效，如果断开则尝试重连"""
-        if not self.connection:
-            logger.info("数据库连接不存在，尝试重新连接...")
+        """检查数据库是否可用：连接池不存在时尝试重新创建，存在时借用一个连接做ping检查"""
+        if self.pool is None:
+            logger.info("数据库连接池不存在，尝试重新连接...")
             self._connect()
-            return self.connection is not None
+            return self.pool is not None
         
         try:
-            self.connection.ping(reconnect=True)
+            with self.pool.connection() as connection:
+                connection.ping(reconnect=False)
             return True
         except Exception as e:
-            logger.warning(f"数据库连接检查失败: {e}，尝试重新连接...")
+            logger.warning(f"数据库连接检查失败: {e}")
+            return False
+    
+    def _ensure_pool(self) -> bool:
+        """连接池不存在（启动时数据库不可用）时尝试重新创建"""
+        if self.pool is None:
             self._connect()
-            return self.connection is not None
+        return self.pool is not None
     
-    def _create_tables(self):
-        """创建数据库表"""
-        if not self.connection:
-            logger.warning("数据库连接不可用，跳过表创建")
-            return
-            
+    def _migrate(self, pool: ConnectionPool):
+        """用新建的连接池执行尚未执行的数据库结构迁移（见migrations.py），并检测ID的存储方式"""
         try:
-            with self.connection.cursor() as cursor:
-                # 创建会话表
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS chat_sessions (
-                        session_id VARCHAR(36) PRIMARY KEY,
-                        user_id VARCHAR(100) NOT NULL DEFAULT 'anonymous',
-                        title VARCHAR(255) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                        context JSON,
-                        ragflow_session_id VARCHAR(100) DEFAULT NULL,
-                        INDEX idx_user_id (user_id),
-                        INDEX idx_updated_at (updated_at),
-                        INDEX idx_ragflow_session_id (ragflow_session_id)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                
-                # 创建消息表
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS chat_messages (
-                        id VARCHAR(36) PRIMARY KEY,
-                        session_id VARCHAR(36) NOT NULL,
-                        role ENUM('user', 'assistant') NOT NULL,
-                        content TEXT NOT NULL,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (session_id) REFERENCES chat_sessions(session_id) ON DELETE CASCADE,
-                        INDEX idx_session_id (session_id),
-                        INDEX idx_timestamp (timestamp)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                
-                logger.info("数据库表创建成功")
+            with pool.connection() as connection:
+                self.schema_version = run_migrations(connection)
+                with connection.cursor() as cursor:
+                    self.binary_ids = uses_binary_ids(cursor)
+            logger.info(f"数据库结构版本: {self.schema_version}，ID存储: {'BINARY(16)' if self.binary_ids else 'VARCHAR(36)'}")
         except Exception as e:
-            logger.error(f"创建数据库表失败: {e}")
+            logger.error(f"数据库迁移失败: {e}")
             raise
     
-    def execute_query(self, query: str, params: tuple = None) -> Any:
-        """执行SQL查询"""
-        if not self._check_connection():
+    @staticmethod
+    def _cursor(connection, cursor_class=None) -> TimedCursor:
+        """创建记录语句耗时的游标（见queryStats.py）"""
+        return TimedCursor(connection.cursor(cursor_class), query_stats)
+    
+    def _next_replica(self) -> Optional[Replica]:
+        """
+        选择本线程使用的副本，全部不可用时返回None
+
+        每个线程轮询分到一个副本并一直使用到它不可用，同一请求内的多次读取
+        （如会话和消息分两次查询）落在同一个副本上，看到一致的复制进度
+        """
+        replica = getattr(self._replica_local, 'replica', None)
+        if replica is not None and replica.healthy:
+            return replica
+        count = len(self.replicas)
+        start = next(self._replica_cursor)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if replica.healthy:
+                self._replica_local.replica = replica
+                return replica
+        return None
+
+    def _count_replica_fallback(self):
+        with self._replica_stats_lock:
+            self._replica_fallbacks += 1
+
+    def _query_replica(self, query: str, params: tuple) -> Optional[Any]:
+        """
+        在副本上执行查询，没有可用副本或执行失败时返回None，由调用方回到主库
+
+        只有连接错误和等待连接超时才把副本标记为不可用；语句本身的错误（语法、参数等）
+        只让本次读取回到主库，不影响该副本上的其他读取
+        """
+        replica = self._next_replica()
+        if replica is None:
+            self._count_replica_fallback()
+            return None
+        try:
+            with replica.pool.connection() as connection, self._cursor(connection) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            replica.record_read()
+            return rows
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError, PoolTimeoutError) as e:
+            replica.mark_failed()
+            self._count_replica_fallback()
+            logger.warning(f"只读副本 {replica.host}:{replica.port} 查询失败，"
+                           f"{replica.retry_seconds:g}秒内改用主库: {e}")
+            return None
+        except Exception as e:
+            self._count_replica_fallback()
+            logger.warning(f"只读副本 {replica.host}:{replica.port} 执行语句出错，本次改用主库: {e}")
+            return None
+
+    def execute_query(self, query: str, params: tuple = None, replica: bool = False) -> Any:
+        """
+        执行SQL查询
+
+        Args:
+            query: SQL查询
+            params: 查询参数
+            replica: 允许读取只读副本（可能有复制延迟），没有配置或没有可用副本时走主库
+        """
+        if replica and self.replicas:
+            rows = self._query_replica(query, params)
+            if rows is not None:
+                return rows
+        if not self._ensure_pool():
             logger.warning("数据库连接不可用，无法执行查询")
             return []
         try:
-            with self.connection.cursor() as cursor:
+            with self.pool.connection() as connection, self._cursor(connection) as cursor:
                 cursor.execute(query, params)
                 return cursor.fetchall()
         except Exception as e:
+            # 出错的连接已由连接池丢弃，下次借用时会重建
             logger.error(f"执行查询失败: {e}")
-            # 尝试重连
-            self._connect()
             return []
     
     def execute_update(self, query: str, params: tuple = None) -> int:
         """执行SQL更新操作"""
-        if not self._check_connection():
+        if not self._ensure_pool():
             logger.warning("数据库连接不可用，无法执行更新")
             return 0
         try:
-            with self.connection.cursor() as cursor:
+            with self.pool.connection() as connection, self._cursor(connection) as cursor:
                 affected_rows = cursor.execute(query, params)
                 return affected_rows
         except Exception as e:
             logger.error(f"执行更新失败: {e}")
-            # 尝试重连
-            self._connect()
             return 0
     
+    def stream_query(self, query: str, params: tuple = None, fetch_size: int = None) -> Iterator[tuple]:
+        """
+        以服务端游标（SSCursor，不缓冲结果集）逐行返回查询结果，内存占用与结果集大小无关
+
+        迭代期间一直占用一个连接，且该连接上不能执行其他语句；调用方应尽快消费，
+        长时间不读取会触发服务端的net_write_timeout。中途停止迭代时该连接直接丢弃，
+        不去读完剩余的行
+
+        Args:
+            query: SQL查询
+            params: 查询参数
+            fetch_size: 每次从连接读取的行数，默认从配置获取
+
+        Raises:
+            RuntimeError: 数据库不可用
+        """
+        if not self._ensure_pool():
+            raise RuntimeError("数据库连接不可用")
+        fetch_size = max(1, fetch_size or Config.EXPORT_FETCH_SIZE)
+        connection = self.pool.acquire()
+        finished = False
+        try:
+            cursor = self._cursor(connection, pymysql.cursors.SSCursor)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+            cursor.close()
+            finished = True
+        finally:
+            self.pool.release(connection, discard=not finished)
+
+    @contextmanager
+    def transaction(self):
+        """
+        在同一个连接上以事务执行一组语句
+
+        用法:
+            with db_manager.transaction() as cursor:
+                cursor.execute(...)
+                cursor.execute(...)
+
+        全部语句成功后提交，出错时回滚并向上抛出异常（与execute_*不同，不会吞掉错误）
+
+        Raises:
+            RuntimeError: 数据库不可用
+            IntegrityError: 违反外键、唯一键等约束
+        """
+        if not self._ensure_pool():
+            raise RuntimeError("数据库连接不可用")
+        with self.pool.connection() as connection:
+            connection.begin()
+            try:
+                with self._cursor(connection) as cursor:
+                    yield cursor
+                connection.commit()
+            except Exception as e:
+                try:
+                    connection.rollback()
+                except Exception as rollback_error:
+                    logger.warning(f"事务回滚失败: {rollback_error}")
+                if isinstance(e, pymysql.err.IntegrityError):
+                    raise IntegrityError(str(e)) from e
+                raise
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池状态"""
+        stats = {'available': False} if self.pool is None else {'available': True, **self.pool.get_stats()}
+        if self.replicas:
+            stats['replicas'] = [replica.get_stats() for replica in self.replicas]
+            with self._replica_stats_lock:
+                stats['replica_fallbacks'] = self._replica_fallbacks
+        return stats
+    
     def close(self):
-        """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
-            logger.info("MySQL数据库连接已关闭")
+        """关闭连接池"""
+        for replica in self.replicas:
+            replica.pool.close()
+        if self.pool is not None:
+            self.pool.close()
+            logger.info("MySQL连接池已关闭")
+
+
+def create_database(backend: str = None) -> BaseDatabase:
+    """
+    根据配置创建数据库后端
+
+    Args:
+        backend: mysql 或 sqlite，默认从配置获取
+
+    Returns:
+        数据库实例；MySQL启动时不可用且开启DB_FALLBACK_SQLITE时回退为SQLite
+    """
+    backend = (backend or Config.DB_BACKEND).lower()
+    if backend == 'sqlite':
+        from .sqliteDatabase import SQLiteDatabase
+        return SQLiteDatabase()
+    if backend != 'mysql':
+        logger.warning(f"未知的数据库后端: {backend}，使用MySQL")
+    
+    manager = DatabaseManager()
+    if manager.available or not Config.DB_FALLBACK_SQLITE:
+        if not manager.available:
+            logger.warning("MySQL不可用且未开启SQLite回退，会话数据不会保存")
+        return manager
+    
+    from .sqliteDatabase import SQLiteDatabase
+    logger.error(f"MySQL不可用，回退为SQLite存储（{Config.SQLITE_PATH}），"
+                 f"期间写入的数据不会同步到MySQL，MySQL恢复后需重启服务才会切回")
+    if Config.SQLITE_PATH == ':memory:':
+        logger.error("SQLITE_PATH为:memory:，回退期间的会话数据只保存在进程内存中，重启或多进程部署时会丢失")
+    return SQLiteDatabase()
 
 
-# 全局数据库管理器实例
-db_manager = DatabaseManager()
+# 全局数据库实例
+db_manager = create_database()
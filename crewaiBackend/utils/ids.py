@@ -0,0 +1,69 @@
+"""
+会话和消息ID
+- 生成：默认随机的UUID4；ID_SCHEME=uuid7时生成按时间递增的UUIDv7（RFC 9562），
+  新记录总是追加在主键索引末尾，避免随机插入造成的页分裂
+- 存储：表结构转换为BINARY(16)后（见migrations.convert_ids_to_binary），ID以16字节写入数据库，
+  由SessionManager等存储层在读写时转换，对外（API、缓存、日志）始终是带连字符的字符串形式
+"""
+
+import secrets
+import threading
+import time
+import uuid
+from typing import Any
+
+from ..config import Config
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> str:
+    """
+    生成UUIDv7字符串：48位毫秒时间戳 + 12位序号 + 62位随机数
+
+    同一毫秒内序号递增（RFC 9562 6.2节方法1），保证同一进程生成的ID严格递增；
+    序号用尽时借用下一毫秒的时间戳
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # 序号从随机值开始，最高位置0留出递增空间
+            _counter = secrets.randbits(11)
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        timestamp_ms, counter = _last_ms, _counter
+
+    value = ((timestamp_ms & 0xFFFFFFFFFFFF) << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) \
+        | secrets.randbits(62)
+    return str(uuid.UUID(int=value))
+
+
+def new_id() -> str:
+    """按ID_SCHEME配置生成新的会话/消息ID"""
+    if Config.ID_SCHEME == 'uuid7':
+        return uuid7()
+    return str(uuid.uuid4())
+
+
+def id_to_bytes(value: str) -> bytes:
+    """
+    把字符串ID转换为BINARY(16)存储的字节
+
+    Raises:
+        ValueError: 不是合法的UUID
+    """
+    return uuid.UUID(value).bytes
+
+
+def api_id(value: Any) -> Any:
+    """把数据库读出的ID转换为字符串形式，BINARY(16)的值转换为UUID字符串，其他值原样返回"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return str(uuid.UUID(bytes=bytes(value)))
+    return value
@@ -0,0 +1,146 @@
+"""
+任务执行器
+用固定数量的工作线程和有界队列执行后台任务，替代每个请求新建一个线程的做法
+"""
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """任务队列已满，无法再接收新任务"""
+
+
+class JobExecutor:
+    """固定线程数 + 有界队列的任务执行器"""
+
+    # 空闲的工作线程每隔该秒数检查一次是否已关闭
+    STOP_POLL_SECONDS = 0.5
+
+    def __init__(self, max_workers: int = None, max_queue_size: int = None, name: str = "crew-worker"):
+        """
+        初始化执行器并启动工作线程
+
+        Args:
+            max_workers: 工作线程数，默认从配置获取
+            max_queue_size: 等待队列上限，默认从配置获取
+            name: 工作线程名称前缀
+        """
+        self.max_workers = max(1, max_workers or Config.JOB_WORKERS)
+        self.max_queue_size = max(1, max_queue_size or Config.JOB_QUEUE_SIZE)
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_queue_size)
+        self._lock = threading.Lock()
+        self._active_workers = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._shutdown = False
+
+        self._workers = []
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"{name}-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"任务执行器启动: 工作线程 {self.max_workers} 个，队列上限 {self.max_queue_size}")
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """
+        提交任务，队列已满时立即拒绝而不是阻塞请求线程
+
+        Args:
+            fn: 要执行的函数
+            *args, **kwargs: 传给函数的参数
+
+        Raises:
+            JobQueueFullError: 队列已满
+            RuntimeError: 执行器已关闭
+        """
+        if self._shutdown:
+            raise RuntimeError("任务执行器已关闭")
+
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise JobQueueFullError(f"任务队列已满（上限 {self.max_queue_size}），请稍后重试")
+
+        with self._lock:
+            self._submitted += 1
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.STOP_POLL_SECONDS)
+            except queue.Empty:
+                # 关闭后队列已取空才退出，已入队的任务都会执行
+                if self._shutdown:
+                    return
+                continue
+
+            fn, args, kwargs = item
+            with self._lock:
+                self._active_workers += 1
+            try:
+                fn(*args, **kwargs)
+                with self._lock:
+                    self._completed += 1
+            except Exception as e:
+                # 任务本身应自行处理异常，这里只兜底记录，避免工作线程退出
+                logger.error(f"后台任务执行异常: {e}")
+                with self._lock:
+                    self._failed += 1
+            finally:
+                with self._lock:
+                    self._active_workers -= 1
+                self._queue.task_done()
+
+    def queue_depth(self) -> int:
+        """排队等待执行的任务数"""
+        return self._queue.qsize()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取执行器状态"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'active_workers': self._active_workers,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self.max_queue_size,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        关闭执行器，已入队的任务会先执行完
+
+        不向队列放入结束标记（队列已满时会阻塞），工作线程在队列取空后自行退出
+
+        Args:
+            wait: 是否等待工作线程退出
+        """
+        if self._shutdown:
+            return
+        self._shutdown = True
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        logger.info("任务执行器已关闭")
+
+
+# 全局任务执行器实例
+job_executor = JobExecutor()
@@ -1,58 +1,419 @@
 # 核心功能：
 # (1)管理多个作业及其状态，通过锁机制确保线程安全。
 # (2)定义作业和事件的结构，并提供一个函数来追加事件，同时在作业开始时初始化新的作业实例。
+# (3)对已结束的作业按TTL过期清理，并限制内存中的作业总数（LRU淘汰），避免内存无限增长。
+# (4)每个作业带有条件变量，追加事件或作业结束时通知等待者（用于SSE推送和长轮询）。
+# (5)事件带有级别，超长的事件内容会被截断，避免错误堆栈等大段文本撑大作业。
+# (6)作业表按job_id分片（锁分段），每个作业有自己的锁，不同作业之间互不阻塞；控制台输出不在锁内进行。
+# (7)作业存储可插拔：默认使用进程内存储，也可配置为MySQL存储，使多个后端进程共享作业状态。
 
 
 # 导入python标准库
-from dataclasses import dataclass
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict
-from threading import Lock
+from typing import List, Dict, Optional, Tuple
+from threading import Lock, Condition
 
+from ..config import Config
 
-# 创建一个锁，用于保护jobs字典，确保在多线程操作时的安全性
-jobs_lock = Lock()
-# 一个字典，用于存储以job_id为键的Job实例
-jobs: Dict[str, "Job"] = {}
+logger = logging.getLogger(__name__)
 
+# 作业的终止状态，进入这些状态后才会参与TTL过期清理
+FINISHED_STATUSES = ('COMPLETE', 'ERROR', 'CANCELLED')
+# 事件级别，按严重程度从低到高排列
+EVENT_LEVELS = ('debug', 'info', 'warning', 'error')
+# 保护各存储后台清理线程的启动
+_sweeper_lock = Lock()
 
 
 # 使用@dataclass定义一个Event类，表示事件的结
 # timestamp：事件发生的时间
 # data：与事件相关的数据
+# level：事件级别，取值见EVENT_LEVELS
 @dataclass
 class Event:
     timestamp: datetime
     data: str
+    level: str = 'info'
 
 
 # 使用@dataclass定义一个Job类，表示一个作业的结构
 # status：表示作业的状态（如"STARTED"、"COMPLETE"等）
 # events：一个列表，包含与该作业相关的事件
 # result：作业完成后的结果
+# created_at：作业创建时间
+# finished_at：作业进入终止状态的时间，用于TTL过期判断
+# lock：作业自身的锁，修改status/events/result时需持有
+# changed：与lock绑定的条件变量，作业有新事件或结束时通知等待者
+# status_cache：(版本号, 序列化后的完整状态响应)，由上层在查询时填充，作业变化后失效
 @dataclass
 class Job:
     status: str
     events: List[Event]
     result: str
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+    changed: Condition = field(default=None, repr=False, compare=False)
+    status_cache: Optional[Tuple[int, bytes]] = field(default=None, repr=False, compare=False)
 
+    def __post_init__(self):
+        if self.changed is None:
+            self.changed = Condition(self.lock)
 
-# 定义函数append_event，接受job_id和事件数据event_data作为参数
-def append_event(job_id: str, event_data: str):
-    # 使用上下文管理器with来确保在锁定期间执行代码，避免多线程冲突
-    with jobs_lock:
-        # 检查jobs字典中是否存在job_id
-        # 如果不存在，创建一个新的Job实例，将其状态设置为STARTED，事件列表初始化为空，结果初始化为空字符串
-        if job_id not in jobs:
-            print("Job %s started", job_id)
-            jobs[job_id] = Job(
-                status='STARTED',
-                events=[],
-                result='')
+    @property
+    def version(self) -> int:
+        """
+        作业版本号，每追加一条事件或进入终止状态加一
+
+        事件只追加不修改，状态只会从运行中变为终止状态一次，因此版本号相同即作业内容相同
+        """
+        return len(self.events) + (1 if self.status in FINISHED_STATUSES else 0)
+
+
+# 定义函数truncate_event_data，超过上限的事件内容只保留开头部分并注明原长度
+def truncate_event_data(event_data, max_length: int = None) -> str:
+    event_data = str(event_data)
+    max_length = max_length or Config.MAX_EVENT_DATA_LENGTH
+    if len(event_data) <= max_length:
+        return event_data
+    return f"{event_data[:max_length]}...（已截断，原长度{len(event_data)}字符）"
+
+
+class _JobShard:
+    """作业表的一个分片：独立的锁、LRU顺序和淘汰计数"""
+
+    def __init__(self, max_jobs: int):
+        self.lock = Lock()
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.max_jobs = max_jobs
+        self.evicted_expired = 0
+        self.evicted_lru = 0
+
+    def enforce_max_jobs(self):
+        """超过数量上限时按LRU淘汰，优先淘汰已结束的作业（调用方需持有分片锁）"""
+        while len(self.jobs) > self.max_jobs:
+            victim = next(
+                (job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATUSES),
+                None
+            )
+            if victim is None:
+                # 全部都在运行中，只能淘汰最久未访问的作业
+                victim = next(iter(self.jobs))
+            del self.jobs[victim]
+            self.evicted_lru += 1
+
+
+class BaseJobStore:
+    """
+    作业存储接口
+
+    所有后端都需要实现作业的追加事件、结束、等待更新、查询、删除和过期清理，
+    上层代码只通过这些方法访问作业，不关心作业保存在哪里
+    """
+
+    sweep_interval: int = 60
+
+    def append_event(self, job_id: str, event_data: str, level: str = 'info'):
+        """追加事件，作业不存在时自动创建"""
+        raise NotImplementedError
+
+    def finish_job(self, job_id: str, status: str, result, event_data: str = None, level: str = 'info') -> bool:
+        """将作业标记为终止状态并记录结果；作业不存在时返回False"""
+        raise NotImplementedError
+
+    def wait_for_update(self, job_id: str, since: int = 0,
+                        timeout: float = None) -> Optional[Tuple[List[Event], str, str]]:
+        """
+        等待作业出现第since条之后的新事件或进入终止状态
+
+        Returns:
+            (新事件列表, 状态, 结果)；作业不存在时返回None；超时返回当前快照（新事件可能为空）
+        """
+        raise NotImplementedError
+
+    def get(self, job_id: str, default: Optional[Job] = None) -> Optional[Job]:
+        """获取作业"""
+        raise NotImplementedError
+
+    def delete_job(self, job_id: str) -> bool:
+        """删除作业，返回是否存在"""
+        raise NotImplementedError
+
+    def get_summaries(self, job_ids: List[str]) -> Dict[str, Optional[Tuple[str, str, int]]]:
+        """
+        批量获取作业概要
+
+        Returns:
+            job_id -> (状态, 结果, 事件数)；不存在的作业对应None
+        """
+        summaries = {}
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job is None:
+                summaries[job_id] = None
+                continue
+            with job.lock:
+                summaries[job_id] = (job.status, job.result, len(job.events))
+        return summaries
+
+    def evict_expired(self) -> int:
+        """清理过期作业，返回清理数量"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取存储状态"""
+        raise NotImplementedError
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def __getitem__(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def _sweep_loop(self):
+        """后台定期清理过期作业"""
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.evict_expired()
+            except Exception as e:
+                logger.error(f"清理过期作业失败: {e}")
+
+    def start_sweeper(self):
+        """启动后台清理线程（重复调用无副作用）"""
+        with _sweeper_lock:
+            if getattr(self, '_sweeper', None) is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="job-sweeper", daemon=True)
+            self._sweeper.start()
+
+
+class MemoryJobStore(BaseJobStore):
+    """进程内作业存储：按job_id分片保存作业，支持TTL过期和数量上限（LRU淘汰）"""
+
+    def __init__(self, ttl_seconds: int = None, max_jobs: int = None, sweep_interval: int = None,
+                 shards: int = None):
+        """
+        初始化作业存储
+
+        Args:
+            ttl_seconds: 已结束作业的保留时间（秒），默认从配置获取
+            max_jobs: 最多保留的作业数，默认从配置获取（平均分配到各分片）
+            sweep_interval: 后台清理间隔（秒），默认从配置获取
+            shards: 分片数（锁分段数），默认从配置获取
+        """
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.JOB_TTL_SECONDS
+        self.max_jobs = max(1, max_jobs or Config.JOB_MAX_COUNT)
+        self.sweep_interval = sweep_interval or Config.JOB_SWEEP_INTERVAL
+
+        shard_count = max(1, min(shards or Config.JOB_STORE_SHARDS, self.max_jobs))
+        per_shard = -(-self.max_jobs // shard_count)  # 向上取整
+        self._shards = [_JobShard(per_shard) for _ in range(shard_count)]
+
+    def _shard(self, job_id: str) -> _JobShard:
+        return self._shards[hash(job_id) % len(self._shards)]
+
+    # ---- 字典风格接口，兼容原来直接操作jobs字典的代码 ----
+
+    def __contains__(self, job_id: str) -> bool:
+        shard = self._shard(job_id)
+        with shard.lock:
+            return job_id in shard.jobs
+
+    def __setitem__(self, job_id: str, job: Job):
+        shard = self._shard(job_id)
+        with shard.lock:
+            shard.jobs[job_id] = job
+            shard.jobs.move_to_end(job_id)
+            shard.enforce_max_jobs()
+
+    def __len__(self) -> int:
+        return sum(len(shard.jobs) for shard in self._shards)
+
+    def get(self, job_id: str, default: Optional[Job] = None) -> Optional[Job]:
+        """获取作业，同时刷新其LRU位置"""
+        shard = self._shard(job_id)
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            if job is None:
+                return default
+            shard.jobs.move_to_end(job_id)
+            return job
+
+    def delete_job(self, job_id: str) -> bool:
+        shard = self._shard(job_id)
+        with shard.lock:
+            return shard.jobs.pop(job_id, None) is not None
+
+    def _get_or_create(self, job_id: str) -> Tuple[Job, bool]:
+        """获取作业，不存在时创建一个STARTED状态的新作业；返回(作业, 是否新建)"""
+        shard = self._shard(job_id)
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            if job is not None:
+                shard.jobs.move_to_end(job_id)
+                return job, False
+            job = Job(status='STARTED', events=[], result='')
+            shard.jobs[job_id] = job
+            shard.enforce_max_jobs()
+            return job, True
+
+    # ---- 作业操作 ----
+
+    def append_event(self, job_id: str, event_data: str, level: str = 'info'):
+        """追加事件，作业不存在时自动创建"""
+        event = Event(timestamp=datetime.now(), data=truncate_event_data(event_data), level=level)
+        job, created = self._get_or_create(job_id)
+        with job.lock:
+            job.events.append(event)
+            job.status_cache = None
+            job.changed.notify_all()
+
+        # 控制台输出放在锁外，避免I/O拖慢其他线程
+        if created:
+            logger.info(f"Job {job_id} started")
         else:
-            # 如果job_id已存在，打印信息表示正在为该作业附加事件
-            print("Appending event for job %s: %s", job_id, event_data)
+            logger.debug(f"Appending event for job {job_id}: {event.data}")
+
+    def finish_job(self, job_id: str, status: str, result, event_data: str = None, level: str = 'info') -> bool:
+        """将作业标记为终止状态并记录结果；作业已被淘汰时返回False"""
+        job = self.get(job_id)
+        if job is None:
+            logger.warning(f"作业 {job_id} 已被淘汰，丢弃其结果")
+            return False
+        with job.lock:
+            job.status = status
+            job.result = result
+            job.finished_at = datetime.now()
+            if event_data:
+                job.events.append(Event(timestamp=datetime.now(), data=truncate_event_data(event_data), level=level))
+            job.status_cache = None
+            job.changed.notify_all()
+        return True
+
+    def wait_for_update(self, job_id: str, since: int = 0,
+                        timeout: float = None) -> Optional[Tuple[List[Event], str, str]]:
+        """
+        等待作业出现第since条之后的新事件或进入终止状态
+
+        Returns:
+            (新事件列表, 状态, 结果)；作业不存在时返回None；超时返回当前快照（新事件可能为空）
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job.changed:
+            job.changed.wait_for(
+                lambda: len(job.events) > since or job.status in FINISHED_STATUSES,
+                timeout=timeout
+            )
+            return job.events[since:], job.status, job.result
+
+    # ---- 淘汰逻辑 ----
+
+    def evict_expired(self) -> int:
+        """
+        清理超过TTL的已结束作业
+
+        Returns:
+            本次清理的作业数
+        """
+        now = datetime.now()
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                expired = [
+                    job_id for job_id, job in shard.jobs.items()
+                    if job.finished_at is not None
+                    and (now - job.finished_at).total_seconds() > self.ttl_seconds
+                ]
+                for job_id in expired:
+                    del shard.jobs[job_id]
+                shard.evicted_expired += len(expired)
+            total += len(expired)
+        if total:
+            logger.info(f"清理了 {total} 个过期作业")
+        return total
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取作业存储状态及淘汰计数"""
+        stats = {
+            'backend': 'memory',
+            'total_jobs': 0,
+            'running_jobs': 0,
+            'max_jobs': self.max_jobs,
+            'ttl_seconds': self.ttl_seconds,
+            'shards': len(self._shards),
+            'evicted_expired': 0,
+            'evicted_lru': 0,
+        }
+        for shard in self._shards:
+            with shard.lock:
+                stats['total_jobs'] += len(shard.jobs)
+                stats['running_jobs'] += sum(
+                    1 for job in shard.jobs.values() if job.status not in FINISHED_STATUSES
+                )
+                stats['evicted_expired'] += shard.evicted_expired
+                stats['evicted_lru'] += shard.evicted_lru
+        return stats
+
+
+def create_job_store(backend: str = None) -> BaseJobStore:
+    """
+    根据配置创建作业存储
+
+    Args:
+        backend: 存储后端，memory 或 mysql，默认从配置获取
+
+    Returns:
+        作业存储实例；MySQL不可用时回退为进程内存储
+    """
+    backend = (backend or Config.JOB_STORE_BACKEND).lower()
+    if backend == 'mysql':
+        # 延迟导入，只有启用MySQL存储时才建立数据库连接
+        from .database import db_manager
+        from .mysqlJobStore import MySQLJobStore
+        if db_manager.backend == 'mysql' and db_manager.available:
+            return MySQLJobStore(db_manager)
+        logger.warning("MySQL不可用，作业存储回退为进程内存储，多进程部署时任务状态将无法共享")
+    elif backend != 'memory':
+        logger.warning(f"未知的作业存储后端: {backend}，使用进程内存储")
+    return MemoryJobStore()
+
+
+# 全局作业存储，保存以job_id为键的Job实例
+job_store = create_job_store()
+# 兼容原有接口：jobs即作业存储本身
+jobs = job_store
+
+
+# 定义函数append_event，接受job_id、事件数据event_data和事件级别level作为参数
+# 如果作业不存在，会创建一个状态为STARTED的新作业
+def append_event(job_id: str, event_data: str, level: str = 'info'):
+    job_store.append_event(job_id, event_data, level)
+
+
+# 定义函数finish_job，将作业标记为终止状态并记录结果
+# 作业可能已被淘汰，此时直接忽略
+def finish_job(job_id: str, status: str, result, event_data: str = None, level: str = 'info'):
+    job_store.finish_job(job_id, status, result, event_data, level)
+
+
+def get_job_summaries(job_ids: List[str]) -> Dict[str, Optional[Tuple[str, str, int]]]:
+    """批量获取作业的(状态, 结果, 事件数)，不存在的作业对应None"""
+    return job_store.get_summaries(job_ids)
+
 
-        # 创建一个新的Event实例，记录当前时间和事件数据，然后将其追加到相应Job实例的事件列表中
-        jobs[job_id].events.append(
-            Event(timestamp=datetime.now(), data=event_data))
+# 定义函数wait_for_job_update，等待作业出现第since条之后的新事件或进入终止状态
+# 返回(新事件列表, 状态, 结果)；作业不存在时返回None；超时返回当前快照（新事件可能为空）
+def wait_for_job_update(job_id: str, since: int = 0, timeout: float = None) -> Optional[Tuple[List[Event], str, str]]:
+    """等待作业的新事件或终止状态，timeout为None时一直等待"""
+    return job_store.wait_for_update(job_id, since, timeout)
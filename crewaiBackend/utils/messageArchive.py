@@ -0,0 +1,59 @@
+"""
+消息冷热分层
+长时间没有新消息的会话，其消息从chat_messages（热表）移到chat_messages_archive（归档表），
+正文以zlib压缩保存。热表只保留活跃会话的消息，能常驻InnoDB缓冲池；
+读取会话时SessionManager合并两张表的消息，调用方无感知。
+
+归档按seq从小到大进行，同一会话归档表中的seq总是小于热表中的seq
+"""
+
+import zlib
+from typing import Iterable, List, Tuple
+
+# zlib压缩级别：6是速度与压缩率的常用折中
+COMPRESS_LEVEL = 6
+
+ARCHIVE_INSERT = """
+    INSERT IGNORE INTO chat_messages_archive (seq, id, session_id, role, content, timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# 归档表查询列，解压后与MESSAGE_COLUMNS的顺序一致
+ARCHIVE_COLUMNS = "id, role, content, timestamp, seq"
+
+
+def compress_content(content: str) -> bytes:
+    """压缩消息正文"""
+    return zlib.compress(content.encode('utf-8'), COMPRESS_LEVEL)
+
+
+def decompress_content(data) -> str:
+    """解压消息正文"""
+    return zlib.decompress(bytes(data)).decode('utf-8')
+
+
+def decompress_rows(rows: Iterable[tuple], content_index: int = 2) -> List[tuple]:
+    """把归档表查询结果中第content_index列的压缩正文解压为字符串"""
+    return [row[:content_index] + (decompress_content(row[content_index]),) + row[content_index + 1:]
+            for row in rows]
+
+
+def archive_rows(session_id: str, rows: Iterable[tuple]) -> Tuple[List[tuple], int, int]:
+    """
+    把热表中的消息行转换为ARCHIVE_INSERT的参数
+
+    Args:
+        session_id: 会话ID
+        rows: MESSAGE_COLUMNS顺序的热表查询结果（id, role, content, timestamp, seq）
+
+    Returns:
+        (插入参数列表, 压缩前字节数, 压缩后字节数)
+    """
+    params, raw_bytes, stored_bytes = [], 0, 0
+    for message_id, role, content, timestamp, seq in rows:
+        compressed = compress_content(content)
+        raw_bytes += len(content.encode('utf-8'))
+        stored_bytes += len(compressed)
+        params.append((seq, message_id, session_id, role, compressed, timestamp))
+    return params, raw_bytes, stored_bytes
+
@@ -0,0 +1,283 @@
+"""
+聊天消息异步写入（write-behind）
+消息先进入进程内有界队列，由后台线程批量写入MySQL（多行INSERT + 每个会话一条计数更新），
+把数据库延迟从聊天请求路径上移走；进程退出时把队列中的消息全部写完
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..config import Config
+from .baseDatabase import IntegrityError
+from .ids import api_id
+
+logger = logging.getLogger(__name__)
+
+# 插入消息（seq由数据库自增分配）
+MESSAGE_INSERT = """
+    INSERT INTO chat_messages (id, session_id, role, content, timestamp)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+# 更新会话的消息计数、首条用户消息生成的标题和更新时间
+# 参数: (新增用户消息数, 标题, 新增消息数, 新增用户消息数, session_id)
+# title的判断放在计数自增之前，使用的是本批消息之前的用户消息数
+SESSION_COUNTER_UPDATE = """
+    UPDATE chat_sessions
+    SET title = IF(%s > 0 AND user_message_count = 0, %s, title),
+        message_count = message_count + %s,
+        user_message_count = user_message_count + %s,
+        updated_at = NOW()
+    WHERE session_id = %s
+"""
+
+
+def title_from_content(content: str) -> str:
+    """用消息内容生成会话标题（截取前30个字符）"""
+    return content[:30] + ('...' if len(content) > 30 else '')
+
+
+def write_message_batch(cursor, messages: List["PendingMessage"]):
+    """
+    用给定事务游标写入一批消息：一条多行INSERT + 每个会话一条计数更新
+
+    Args:
+        cursor: DatabaseManager.transaction()返回的游标
+        messages: 待写入的消息，按列表顺序分配seq
+    """
+    counters: Dict[Any, List[Any]] = {}  # session_id -> [消息数, 用户消息数, 第一条用户消息生成的标题]
+    for message in messages:
+        counter = counters.setdefault(message.session_id, [0, 0, None])
+        counter[0] += 1
+        if message.role == 'user':
+            counter[1] += 1
+            if counter[2] is None:
+                counter[2] = title_from_content(message.content)
+
+    # pymysql会把executemany的INSERT ... VALUES合并为多行INSERT
+    cursor.executemany(MESSAGE_INSERT, [
+        (m.message_id, m.session_id, m.role, m.content, m.timestamp) for m in messages
+    ])
+    cursor.executemany(SESSION_COUNTER_UPDATE, [
+        (user_total, title or '', total, user_total, session_id)
+        for session_id, (total, user_total, title) in counters.items()
+    ])
+
+
+@dataclass
+class PendingMessage:
+    """等待写入的消息，message_id和session_id为写入数据库的形式（见BaseDatabase.db_id）"""
+    message_id: Any
+    session_id: Any
+    role: str
+    content: str
+    timestamp: datetime = field(default_factory=datetime.now)
+
+
+class MessageWriteBehind:
+    """消息异步批量写入器"""
+
+    # 批量写入失败（非外键错误）时的重试次数
+    MAX_RETRIES = 3
+    # 后台线程等待新消息时检查停止标志的间隔（秒）
+    STOP_POLL_SECONDS = 0.5
+
+    def __init__(self, db, max_queue_size: int = None, batch_size: int = None, flush_interval: float = None):
+        """
+        初始化写入器并启动后台线程
+
+        Args:
+            db: DatabaseManager实例
+            max_queue_size: 队列上限，满时enqueue返回False，调用方应改为同步写入，默认从配置获取
+            batch_size: 每批最多写入的消息数，默认从配置获取
+            flush_interval: 凑批的最长等待时间（秒），默认从配置获取
+        """
+        self.db = db
+        self.max_queue_size = max(1, max_queue_size or Config.MESSAGE_QUEUE_SIZE)
+        self.batch_size = max(1, batch_size or Config.MESSAGE_FLUSH_BATCH)
+        self.flush_interval = flush_interval if flush_interval is not None else Config.MESSAGE_FLUSH_INTERVAL
+
+        self._queue: "queue.Queue[PendingMessage]" = queue.Queue(maxsize=self.max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._rejected = 0
+        self._written = 0
+        self._dropped = 0
+        self._batches = 0
+        self._last_batch_ms = 0.0
+        self._stopped = False
+        # 通知后台线程写完队列后退出（不往队列里放哨兵，队列满时shutdown也不会阻塞）
+        self._stop_event = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, message_id: Any, session_id: Any, role: str, content: str,
+                timestamp: datetime = None) -> bool:
+        """
+        将消息放入写入队列
+
+        Args:
+            message_id: 消息ID（写入数据库的形式）
+            session_id: 会话ID（写入数据库的形式）
+            timestamp: 消息时间，默认为入队时间
+
+        Returns:
+            是否已入队；队列已满或写入器已停止时返回False，调用方应同步写入
+        """
+        if self._stopped:
+            return False
+        try:
+            self._queue.put_nowait(PendingMessage(message_id, session_id, role, content,
+                                                   timestamp or datetime.now()))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            return False
+        with self._stats_lock:
+            self._enqueued += 1
+        return True
+
+    def _run(self):
+        """后台线程：凑够一批或等待超时后写入；收到停止通知且队列已空时退出"""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.STOP_POLL_SECONDS)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                continue
+
+            batch = [item]
+            # 停止时不再等待凑批，尽快写完
+            deadline = time.monotonic() + (0 if self._stop_event.is_set() else self.flush_interval)
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_with_retry(self, batch: List[PendingMessage]):
+        started = time.perf_counter()
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                self._write_batch(batch)
+                written = len(batch)
+                break
+            except IntegrityError:
+                # 通常是会话在消息落库前已被删除（外键约束），逐条写入并跳过这些消息
+                written = self._write_individually(batch)
+                break
+            except Exception as e:
+                if attempt < self.MAX_RETRIES - 1:
+                    logger.warning(f"批量写入消息失败，第{attempt + 1}次重试: {e}")
+                    time.sleep(0.5 * 2 ** attempt)
+                    continue
+                logger.error(f"批量写入消息失败，丢弃 {len(batch)} 条消息: {e}")
+                written = 0
+
+        with self._stats_lock:
+            self._written += written
+            self._dropped += len(batch) - written
+            self._batches += 1
+            self._last_batch_ms = (time.perf_counter() - started) * 1000
+
+    def _write_batch(self, batch: List[PendingMessage]):
+        with self.db.transaction() as cursor:
+            write_message_batch(cursor, batch)
+
+    def _write_individually(self, batch: List[PendingMessage]) -> int:
+        """逐条写入，跳过违反约束的消息，返回成功写入的条数"""
+        written = 0
+        for message in batch:
+            try:
+                self._write_batch([message])
+                written += 1
+            except IntegrityError as e:
+                logger.warning(f"会话 {api_id(message.session_id)} 已不存在，丢弃消息 {api_id(message.message_id)}: {e}")
+            except Exception as e:
+                logger.error(f"写入消息 {message.message_id} 失败: {e}")
+        return written
+
+    def flush(self):
+        """阻塞直到当前队列中的消息全部写入"""
+        self._queue.join()
+
+    def shutdown(self):
+        """停止接收新消息，写完队列中剩余的消息后结束后台线程"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._stop_event.set()
+        self._thread.join()
+
+        # 停止标志生效前刚通过检查的enqueue可能在后台线程退出后才入队，在这里补写
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            try:
+                self._write_with_retry(leftover)
+            finally:
+                for _ in leftover:
+                    self._queue.task_done()
+        logger.info("消息写入器已停止，队列中的消息已全部写入")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入器状态"""
+        with self._stats_lock:
+            return {
+                'enabled': True,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self.max_queue_size,
+                'batch_size': self.batch_size,
+                'enqueued': self._enqueued,
+                'rejected': self._rejected,
+                'written': self._written,
+                'dropped': self._dropped,
+                'batches': self._batches,
+                'last_batch_ms': round(self._last_batch_ms, 2),
+            }
+
+
+_writer: Optional[MessageWriteBehind] = None
+_writer_lock = threading.Lock()
+
+
+def get_message_writer() -> Optional[MessageWriteBehind]:
+    """获取全局消息写入器；未开启write-behind模式或数据库不可用时返回None"""
+    global _writer
+    if not Config.MESSAGE_WRITE_BEHIND:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            from .database import db_manager
+            if not db_manager.available:
+                return None
+            _writer = MessageWriteBehind(db_manager)
+            # 进程退出时写完队列中剩余的消息
+            atexit.register(_writer.shutdown)
+            logger.info("消息写入使用write-behind模式")
+        return _writer
+
+
+def get_message_writer_stats() -> Dict[str, Any]:
+    """获取消息写入器状态，未启用时返回{'enabled': False}"""
+    writer = _writer
+    return writer.get_stats() if writer is not None else {'enabled': False}
@@ -0,0 +1,420 @@
+"""
+数据库结构迁移
+按版本号顺序执行迁移，已执行的版本记录在schema_version表中，启动时只执行尚未执行的迁移。
+
+新增迁移时在MIGRATIONS末尾追加，版本号递增，已发布的迁移不要再修改。
+MySQL的DDL会隐式提交，迁移无法整体回滚，因此每个迁移都要能安全地重复执行
+（先检查列/索引是否已存在），中途失败后下次启动会从失败的版本继续。
+"""
+
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# 多个进程同时启动时用MySQL命名锁保证只有一个进程执行迁移
+MIGRATION_LOCK_NAME = "aiagent_schema_migration"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+@dataclass
+class Migration:
+    """一次结构迁移"""
+    version: int
+    description: str
+    apply: Callable  # apply(cursor)
+
+
+def column_exists(cursor, table: str, column: str) -> bool:
+    """检查当前数据库中表是否已有某列"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return bool(cursor.fetchone()[0])
+
+
+def index_exists(cursor, table: str, index: str) -> bool:
+    """检查当前数据库中表是否已有某索引"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return bool(cursor.fetchone()[0])
+
+
+def _create_base_tables(cursor):
+    """创建会话表和消息表（最初版本的结构，后续变化由之后的迁移完成）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            session_id VARCHAR(36) PRIMARY KEY,
+            user_id VARCHAR(100) NOT NULL DEFAULT 'anonymous',
+            title VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            context JSON,
+            ragflow_session_id VARCHAR(100) DEFAULT NULL,
+            INDEX idx_user_id (user_id),
+            INDEX idx_updated_at (updated_at),
+            INDEX idx_ragflow_session_id (ragflow_session_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id VARCHAR(36) PRIMARY KEY,
+            session_id VARCHAR(36) NOT NULL,
+            role ENUM('user', 'assistant') NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_sessions(session_id) ON DELETE CASCADE,
+            INDEX idx_session_id (session_id),
+            INDEX idx_timestamp (timestamp)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _add_message_seq(cursor):
+    """
+    为chat_messages添加seq列
+
+    seq是单调递增的消息序号，用于消息的确定性排序和游标分页（timestamp只有秒级精度，同一秒内的消息顺序不确定）。
+    已有消息按(timestamp, id)顺序回填序号
+    """
+    if column_exists(cursor, 'chat_messages', 'seq'):
+        return
+    cursor.execute("ALTER TABLE chat_messages ADD COLUMN seq BIGINT NULL AFTER id")
+    cursor.execute("""
+        UPDATE chat_messages m
+        JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY timestamp, id) AS rn FROM chat_messages) o
+            ON o.id = m.id
+        SET m.seq = o.rn
+    """)
+    cursor.execute("""
+        ALTER TABLE chat_messages
+            MODIFY seq BIGINT NOT NULL AUTO_INCREMENT,
+            ADD UNIQUE KEY uk_seq (seq),
+            ADD INDEX idx_session_seq (session_id, seq)
+    """)
+
+
+def _add_session_counters(cursor):
+    """为chat_sessions添加消息计数列，并按已有消息回填"""
+    if column_exists(cursor, 'chat_sessions', 'message_count'):
+        return
+    cursor.execute("""
+        ALTER TABLE chat_sessions
+            ADD COLUMN message_count INT NOT NULL DEFAULT 0,
+            ADD COLUMN user_message_count INT NOT NULL DEFAULT 0
+    """)
+    # 显式保留updated_at，避免ON UPDATE CURRENT_TIMESTAMP把所有会话的更新时间改成现在
+    cursor.execute("""
+        UPDATE chat_sessions s
+        JOIN (
+            SELECT session_id, COUNT(*) AS total, SUM(role = 'user') AS user_total
+            FROM chat_messages GROUP BY session_id
+        ) m ON m.session_id = s.session_id
+        SET s.message_count = m.total, s.user_message_count = m.user_total, s.updated_at = s.updated_at
+    """)
+
+
+def _add_query_indexes(cursor):
+    """
+    按实际查询调整索引
+
+    - 会话列表按user_id过滤、updated_at排序：(user_id, updated_at)一次索引扫描完成过滤和排序，
+      替代只能过滤、还要filesort的idx_user_id
+    - 会话消息按session_id过滤、seq排序：由(session_id, seq)提供（旧库在上一迁移中补建），
+      idx_session_id是它的最左前缀，删除以减少写入时的索引维护
+    """
+    if not index_exists(cursor, 'chat_sessions', 'idx_user_updated'):
+        cursor.execute("ALTER TABLE chat_sessions ADD INDEX idx_user_updated (user_id, updated_at)")
+    if index_exists(cursor, 'chat_sessions', 'idx_user_id'):
+        cursor.execute("ALTER TABLE chat_sessions DROP INDEX idx_user_id")
+    if not index_exists(cursor, 'chat_messages', 'idx_session_seq'):
+        cursor.execute("ALTER TABLE chat_messages ADD INDEX idx_session_seq (session_id, seq)")
+    # 外键需要以session_id开头的索引，idx_session_seq已满足
+    if index_exists(cursor, 'chat_messages', 'idx_session_id'):
+        cursor.execute("ALTER TABLE chat_messages DROP INDEX idx_session_id")
+
+
+def _create_message_archive(cursor):
+    """
+    创建消息归档表（见messageArchive.py）
+
+    seq沿用热表中的序号，读取时两张表的消息按seq合并；content保存zlib压缩后的UTF-8正文
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages_archive (
+            seq BIGINT PRIMARY KEY,
+            id VARCHAR(36) NOT NULL,
+            session_id VARCHAR(36) NOT NULL,
+            role ENUM('user', 'assistant') NOT NULL,
+            content MEDIUMBLOB NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_id (id),
+            INDEX idx_session_seq (session_id, seq),
+            FOREIGN KEY (session_id) REFERENCES chat_sessions(session_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _create_job_tables(cursor):
+    """创建MySQL作业存储的作业表和事件表（见mysqlJobStore.py），原先由作业存储启动时自行创建"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crew_jobs (
+            job_id VARCHAR(36) PRIMARY KEY,
+            status VARCHAR(20) NOT NULL,
+            result MEDIUMTEXT,
+            created_at DATETIME(6) NOT NULL,
+            finished_at DATETIME(6) DEFAULT NULL,
+            INDEX idx_finished_at (finished_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crew_job_events (
+            job_id VARCHAR(36) NOT NULL,
+            seq INT NOT NULL,
+            timestamp DATETIME(6) NOT NULL,
+            level VARCHAR(10) NOT NULL DEFAULT 'info',
+            data TEXT NOT NULL,
+            PRIMARY KEY (job_id, seq),
+            FOREIGN KEY (job_id) REFERENCES crew_jobs(job_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "创建会话表和消息表", _create_base_tables),
+    Migration(2, "消息表添加seq序号列", _add_message_seq),
+    Migration(3, "会话表添加消息计数列", _add_session_counters),
+    Migration(4, "会话(user_id, updated_at)与消息(session_id, seq)复合索引", _add_query_indexes),
+    Migration(5, "创建消息归档表", _create_message_archive),
+    Migration(6, "创建作业表和作业事件表", _create_job_tables),
+]
+
+
+def get_schema_version(cursor) -> int:
+    """获取当前已执行到的迁移版本，schema_version表为空时返回0"""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return int(cursor.fetchone()[0])
+
+
+@contextmanager
+def migration_lock(cursor):
+    """
+    持有迁移命名锁执行结构变更
+
+    Raises:
+        RuntimeError: 等待其他进程的迁移锁超时
+    """
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("等待数据库迁移锁超时，可能有其他进程正在执行迁移")
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+
+
+def run_migrations(connection, migrations: List[Migration] = None) -> int:
+    """
+    执行尚未执行的迁移
+
+    Args:
+        connection: 自动提交模式的pymysql连接
+        migrations: 迁移列表，默认MIGRATIONS
+
+    Returns:
+        执行后的结构版本
+
+    Raises:
+        RuntimeError: 等待其他进程的迁移锁超时
+    """
+    migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m.version)
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
+        with migration_lock(cursor):
+            # 拿到锁后再读版本，其他进程可能刚执行完迁移
+            version = get_schema_version(cursor)
+            for migration in migrations:
+                if migration.version <= version:
+                    continue
+                logger.info(f"执行数据库迁移 {migration.version}: {migration.description}")
+                migration.apply(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (migration.version, migration.description)
+                )
+                version = migration.version
+            return version
+
+
+# ---------------------------------------------------------------------------
+# 可选迁移：会话和消息ID改为BINARY(16)存储
+#
+# 不在MIGRATIONS中自动执行：转换会重建主键和外键，大表上耗时较长且期间写入会被阻塞，
+# 需要在停止服务并备份后通过scripts/convert_ids_to_binary.py手动执行。
+# 转换后DatabaseManager启动时检测到BINARY(16)的session_id列，自动按16字节读写ID
+# ---------------------------------------------------------------------------
+
+# 带连字符的UUID字符串
+UUID_PATTERN = '^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+# 需要转换的ID列
+ID_COLUMNS = (
+    ('chat_sessions', 'session_id'),
+    ('chat_messages', 'id'),
+    ('chat_messages', 'session_id'),
+    ('chat_messages_archive', 'id'),
+    ('chat_messages_archive', 'session_id'),
+)
+
+
+# 会话ID所在的表，全部转换完成才算已转换
+ID_TABLES = ('chat_sessions', 'chat_messages', 'chat_messages_archive')
+# 通过外键引用chat_sessions的表
+MESSAGE_TABLES = ('chat_messages', 'chat_messages_archive')
+
+
+def _session_id_type(cursor, table: str):
+    """获取表中session_id列的数据类型（小写），列不存在时返回None"""
+    cursor.execute("""
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'session_id'
+    """, (table,))
+    row = cursor.fetchone()
+    return row[0].lower() if row else None
+
+
+def uses_binary_ids(cursor) -> bool:
+    """检查会话和消息ID是否已全部转换为BINARY(16)存储（转换中途失败时返回False）"""
+    return all(_session_id_type(cursor, table) == 'binary' for table in ID_TABLES)
+
+
+def _session_foreign_keys(cursor, table: str) -> List[str]:
+    """获取表上引用chat_sessions的外键名"""
+    cursor.execute("""
+        SELECT DISTINCT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME = 'chat_sessions'
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _missing_foreign_keys(cursor) -> List[str]:
+    """获取缺少引用chat_sessions外键的消息表"""
+    return [table for table in MESSAGE_TABLES if not _session_foreign_keys(cursor, table)]
+
+
+def _convert_ids_to_binary(cursor):
+    """
+    把ID_COLUMNS中的VARCHAR(36) UUID列转换为BINARY(16)
+
+    每张表先新增BINARY(16)列并用UNHEX回填，再在一条ALTER中删除旧列并重建主键和索引，
+    最后补上消息表的外键。每一步执行前都检查表的当前状态，中途失败后可以重新执行，
+    已转换的表直接跳过，未完成的表从失败的步骤继续
+
+    Raises:
+        ValueError: 存在不是UUID格式的ID，无法转换
+    """
+    pending = [table for table in ID_TABLES if _session_id_type(cursor, table) != 'binary']
+
+    for table, column in ID_COLUMNS:
+        if table not in pending:
+            continue
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} NOT REGEXP %s", (UUID_PATTERN,))
+        invalid = cursor.fetchone()[0]
+        if invalid:
+            raise ValueError(f"{table}.{column} 中有 {invalid} 个ID不是UUID格式，无法转换为BINARY(16)")
+
+    # 未转换的消息表的外键引用VARCHAR的session_id，需在转换chat_sessions前删除
+    for table in MESSAGE_TABLES:
+        if table in pending:
+            for name in _session_foreign_keys(cursor, table):
+                cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {name}")
+
+    if 'chat_sessions' in pending:
+        if not column_exists(cursor, 'chat_sessions', 'session_id_bin'):
+            cursor.execute("ALTER TABLE chat_sessions ADD COLUMN session_id_bin BINARY(16) NULL")
+        # 显式保留updated_at/timestamp，避免ON UPDATE CURRENT_TIMESTAMP改写时间
+        cursor.execute("UPDATE chat_sessions SET session_id_bin = UNHEX(REPLACE(session_id, '-', '')), "
+                       "updated_at = updated_at")
+        cursor.execute("""
+            ALTER TABLE chat_sessions
+                DROP PRIMARY KEY,
+                DROP COLUMN session_id,
+                CHANGE session_id_bin session_id BINARY(16) NOT NULL,
+                ADD PRIMARY KEY (session_id)
+        """)
+
+    for table in MESSAGE_TABLES:
+        if table not in pending:
+            continue
+        for column in ('id_bin', 'session_id_bin'):
+            if not column_exists(cursor, table, column):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} BINARY(16) NULL")
+        cursor.execute(f"UPDATE {table} SET id_bin = UNHEX(REPLACE(id, '-', '')), "
+                       f"session_id_bin = UNHEX(REPLACE(session_id, '-', '')), timestamp = timestamp")
+
+        if table == 'chat_messages':
+            # chat_messages以id为主键（seq由uk_seq保证唯一和自增）
+            cursor.execute("""
+                ALTER TABLE chat_messages
+                    DROP PRIMARY KEY,
+                    DROP INDEX idx_session_seq,
+                    DROP COLUMN id,
+                    DROP COLUMN session_id,
+                    CHANGE id_bin id BINARY(16) NOT NULL,
+                    CHANGE session_id_bin session_id BINARY(16) NOT NULL,
+                    ADD PRIMARY KEY (id),
+                    ADD INDEX idx_session_seq (session_id, seq)
+            """)
+        else:
+            # chat_messages_archive以seq为主键
+            cursor.execute("""
+                ALTER TABLE chat_messages_archive
+                    DROP INDEX uk_id,
+                    DROP INDEX idx_session_seq,
+                    DROP COLUMN id,
+                    DROP COLUMN session_id,
+                    CHANGE id_bin id BINARY(16) NOT NULL,
+                    CHANGE session_id_bin session_id BINARY(16) NOT NULL,
+                    ADD UNIQUE KEY uk_id (id),
+                    ADD INDEX idx_session_seq (session_id, seq)
+            """)
+
+    for table in _missing_foreign_keys(cursor):
+        cursor.execute(f"ALTER TABLE {table} ADD FOREIGN KEY (session_id) "
+                       f"REFERENCES chat_sessions(session_id) ON DELETE CASCADE")
+
+
+def convert_ids_to_binary(connection) -> bool:
+    """
+    把会话和消息ID转换为BINARY(16)存储（持有迁移锁执行，已转换时不做任何事）
+
+    Args:
+        connection: 自动提交模式的pymysql连接，结构需已迁移到最新版本
+
+    Returns:
+        执行了转换返回True，已全部是BINARY(16)且外键完整时返回False
+
+    Raises:
+        ValueError: 存在不是UUID格式的ID
+        RuntimeError: 等待其他进程的迁移锁超时
+    """
+    with connection.cursor() as cursor:
+        with migration_lock(cursor):
+            if uses_binary_ids(cursor) and not _missing_foreign_keys(cursor):
+                return False
+            logger.info("开始把会话和消息ID转换为BINARY(16)")
+            _convert_ids_to_binary(cursor)
+            logger.info("会话和消息ID已转换为BINARY(16)")
+            return True
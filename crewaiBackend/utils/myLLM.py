@@ -1,6 +1,9 @@
 import os
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from .cancellation import check_cancelled
+
 # 导入配置
 try:
     from ..config import config
@@ -16,6 +19,22 @@ except ImportError:
     LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "4000"))
     LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "60"))
 
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """在每次LLM调用前后检查当前任务是否已取消，已取消则中断Agent执行"""
+
+    # 默认情况下回调中的异常会被LangChain吞掉，这里需要让JobCancelledError向上抛出
+    raise_error = True
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        check_cancelled()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        check_cancelled()
+
+    def on_llm_end(self, response, **kwargs):
+        check_cancelled()
+
+
 # 模型初始化函数
 def my_llm(llmType):
     """初始化LLM模型，使用Google Chat API"""
@@ -34,5 +53,6 @@ def my_llm(llmType):
         temperature=LLM_TEMPERATURE,
         max_output_tokens=LLM_MAX_TOKENS,
         timeout=LLM_TIMEOUT,
+        callbacks=[CancellationCallbackHandler()],
     )
     return llm
@@ -0,0 +1,209 @@
+"""
+MySQL作业存储
+将作业和事件保存到MySQL，多个后端进程（如gunicorn多worker、多节点）可共享作业状态
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from threading import Lock, Condition
+from typing import Dict, List, Optional, Tuple
+
+from ..config import Config
+from .jobManager import BaseJobStore, Event, Job, FINISHED_STATUSES, truncate_event_data
+
+logger = logging.getLogger(__name__)
+
+
+class MySQLJobStore(BaseJobStore):
+    """基于MySQL的作业存储，复用DatabaseManager的连接池"""
+
+    def __init__(self, db, ttl_seconds: int = None, max_jobs: int = None, sweep_interval: int = None,
+                 poll_interval: float = None):
+        """
+        初始化MySQL作业存储
+
+        Args:
+            db: DatabaseManager实例
+            ttl_seconds: 已结束作业的保留时间（秒），默认从配置获取
+            max_jobs: 最多保留的作业数，默认从配置获取
+            sweep_interval: 后台清理间隔（秒），默认从配置获取
+            poll_interval: 等待其他进程写入的新事件时的轮询间隔（秒），默认从配置获取
+        """
+        self.db = db
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.JOB_TTL_SECONDS
+        self.max_jobs = max(1, max_jobs or Config.JOB_MAX_COUNT)
+        self.sweep_interval = sweep_interval or Config.JOB_SWEEP_INTERVAL
+        self.poll_interval = poll_interval or Config.JOB_STORE_POLL_INTERVAL
+
+        self._lock = Lock()
+        # 本进程写入时唤醒等待者；其他进程的写入通过轮询发现
+        self._changed = Condition()
+        self._evicted_expired = 0
+        self._evicted_lru = 0
+
+        # 作业表和事件表由数据库迁移创建（见migrations.py）
+        logger.info("作业存储使用MySQL后端")
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    @staticmethod
+    def _write_event(cursor, job_id: str, event_data: str, level: str) -> bool:
+        """
+        在调用方的事务中追加一条事件，作业不存在时创建；返回是否新建了作业
+
+        序号在数据库中分配：先锁住作业行（SELECT ... FOR UPDATE），再取事件表中的最大序号加一，
+        多个进程向同一作业写入时依次排队，不会分配到重复的序号
+        """
+        created = cursor.execute(
+            "INSERT IGNORE INTO crew_jobs (job_id, status, result, created_at) "
+            "VALUES (%s, 'STARTED', '', %s)",
+            (job_id, datetime.now())
+        ) > 0
+        cursor.execute("SELECT 1 FROM crew_jobs WHERE job_id = %s FOR UPDATE", (job_id,))
+        cursor.execute(
+            "SELECT COALESCE(MAX(seq), -1) + 1 FROM crew_job_events WHERE job_id = %s", (job_id,)
+        )
+        seq = int(cursor.fetchone()[0])
+        cursor.execute(
+            "INSERT INTO crew_job_events (job_id, seq, timestamp, level, data) VALUES (%s, %s, %s, %s, %s)",
+            (job_id, seq, datetime.now(), level, truncate_event_data(event_data))
+        )
+        return created
+
+    def _insert_event(self, job_id: str, event_data: str, level: str) -> bool:
+        """追加一条事件，作业不存在时创建；返回是否新建了作业。写入失败时记录日志并丢弃该事件"""
+        try:
+            with self.db.transaction() as cursor:
+                return self._write_event(cursor, job_id, event_data, level)
+        except Exception as e:
+            logger.error(f"写入作业 {job_id} 的事件失败: {e}")
+            return False
+
+    def append_event(self, job_id: str, event_data: str, level: str = 'info'):
+        created = self._insert_event(job_id, event_data, level)
+        self._notify()
+        if created:
+            logger.info(f"Job {job_id} started")
+        else:
+            logger.debug(f"Appending event for job {job_id}: {event_data}")
+
+    def finish_job(self, job_id: str, status: str, result, event_data: str = None, level: str = 'info') -> bool:
+        """
+        结束作业：最后一条事件和状态更新在同一个事务中提交，
+        其他进程不会看到完成事件而状态仍为STARTED，中途失败时两者都不生效
+        """
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute("SELECT 1 FROM crew_jobs WHERE job_id = %s FOR UPDATE", (job_id,))
+                if cursor.fetchone() is None:
+                    logger.warning(f"作业 {job_id} 已被淘汰，丢弃其结果")
+                    return False
+                if event_data:
+                    self._write_event(cursor, job_id, event_data, level)
+                cursor.execute(
+                    "UPDATE crew_jobs SET status = %s, result = %s, finished_at = %s WHERE job_id = %s",
+                    (status, str(result), datetime.now(), job_id)
+                )
+        except Exception as e:
+            logger.error(f"记录作业 {job_id} 的结果失败: {e}")
+            return False
+        self._notify()
+        return True
+
+    def _read(self, job_id: str, since: int = 0) -> Optional[Tuple[List[Event], str, str, datetime, datetime]]:
+        """读取作业状态和第since条之后的事件"""
+        rows = self.db.execute_query(
+            "SELECT status, result, created_at, finished_at FROM crew_jobs WHERE job_id = %s", (job_id,)
+        )
+        if not rows:
+            return None
+        status, result, created_at, finished_at = rows[0]
+        event_rows = self.db.execute_query(
+            "SELECT timestamp, level, data FROM crew_job_events WHERE job_id = %s AND seq >= %s ORDER BY seq",
+            (job_id, since)
+        )
+        events = [Event(timestamp=row[0], data=row[2], level=row[1]) for row in event_rows]
+        return events, status, result or '', created_at, finished_at
+
+    def wait_for_update(self, job_id: str, since: int = 0,
+                        timeout: float = None) -> Optional[Tuple[List[Event], str, str]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._read(job_id, since)
+            if snapshot is None:
+                return None
+            events, status, result = snapshot[:3]
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if events or status in FINISHED_STATUSES or (remaining is not None and remaining <= 0):
+                return events, status, result
+            wait = self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+            with self._changed:
+                self._changed.wait(wait)
+
+    def get(self, job_id: str, default: Optional[Job] = None) -> Optional[Job]:
+        snapshot = self._read(job_id)
+        if snapshot is None:
+            return default
+        events, status, result, created_at, finished_at = snapshot
+        return Job(status=status, events=events, result=result, created_at=created_at, finished_at=finished_at)
+
+    def get_summaries(self, job_ids: List[str]) -> Dict[str, Optional[Tuple[str, str, int]]]:
+        """一次查询获取多个作业的状态、结果和事件数"""
+        summaries: Dict[str, Optional[Tuple[str, str, int]]] = {job_id: None for job_id in job_ids}
+        if not job_ids:
+            return summaries
+        placeholders = ", ".join(["%s"] * len(summaries))
+        rows = self.db.execute_query(f"""
+            SELECT j.job_id, j.status, j.result, COUNT(e.seq)
+            FROM crew_jobs j LEFT JOIN crew_job_events e ON e.job_id = j.job_id
+            WHERE j.job_id IN ({placeholders})
+            GROUP BY j.job_id, j.status, j.result
+        """, tuple(summaries))
+        for job_id, status, result, event_count in rows:
+            summaries[job_id] = (status, result or '', int(event_count))
+        return summaries
+
+    def __contains__(self, job_id: str) -> bool:
+        return bool(self.db.execute_query("SELECT 1 FROM crew_jobs WHERE job_id = %s", (job_id,)))
+
+    def delete_job(self, job_id: str) -> bool:
+        return self.db.execute_update("DELETE FROM crew_jobs WHERE job_id = %s", (job_id,)) > 0
+
+    def evict_expired(self) -> int:
+        """清理超过TTL的已结束作业，并在超过数量上限时删除最早结束的作业（事件随外键级联删除）"""
+        cutoff = datetime.now() - timedelta(seconds=self.ttl_seconds)
+        expired = self.db.execute_update(
+            "DELETE FROM crew_jobs WHERE finished_at IS NOT NULL AND finished_at < %s", (cutoff,)
+        )
+
+        overflow = 0
+        rows = self.db.execute_query("SELECT COUNT(*) FROM crew_jobs")
+        excess = (int(rows[0][0]) if rows else 0) - self.max_jobs
+        if excess > 0:
+            overflow = self.db.execute_update(
+                "DELETE FROM crew_jobs WHERE finished_at IS NOT NULL ORDER BY finished_at LIMIT %s", (excess,)
+            )
+
+        with self._lock:
+            self._evicted_expired += expired
+            self._evicted_lru += overflow
+        if expired or overflow:
+            logger.info(f"清理了 {expired} 个过期作业，{overflow} 个超出上限的作业")
+        return expired + overflow
+
+    def get_stats(self) -> Dict[str, int]:
+        rows = self.db.execute_query("SELECT COUNT(*), COALESCE(SUM(finished_at IS NULL), 0) FROM crew_jobs")
+        total, running = (int(rows[0][0]), int(rows[0][1])) if rows else (0, 0)
+        with self._lock:
+            return {
+                'backend': 'mysql',
+                'total_jobs': total,
+                'running_jobs': running,
+                'max_jobs': self.max_jobs,
+                'ttl_seconds': self.ttl_seconds,
+                'evicted_expired': self._evicted_expired,
+                'evicted_lru': self._evicted_lru,
+            }
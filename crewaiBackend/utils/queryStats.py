@@ -0,0 +1,222 @@
+"""
+SQL语句耗时统计
+按归一化后的语句指纹（字面量替换为?）汇总调用次数、耗时分布、影响行数和错误数，
+超过慢查询阈值的语句连同调用位置写入日志
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from typing import Any, Dict, List
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶上界（毫秒），最后一个桶收集所有更慢的语句
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+# 指纹数超过上限后新出现的语句都计入该指纹，避免动态拼接的SQL撑爆内存
+OVERFLOW_FINGERPRINT = "<其他语句>"
+# 确定调用位置时跳过的文件（数据库封装本身）
+_INTERNAL_FILES = ('database.py', 'sqliteDatabase.py', 'queryStats.py', 'contextlib.py')
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\([^)]*\)s")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """
+    归一化SQL语句：去掉注释，字面量和参数占位符替换为?，IN列表和多行VALUES合并，空白压缩为一个空格
+
+    例如 "SELECT * FROM t WHERE id IN (%s, %s, %s) AND n = 5" -> "SELECT * FROM t WHERE id IN (...) AND n = ?"
+    """
+    sql = _COMMENT_RE.sub(" ", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(...)", sql)
+    sql = re.sub(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", r"\1", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def find_caller() -> str:
+    """返回数据库封装之外最近一层调用的位置（文件:行号 函数名）"""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if os.path.basename(frame.filename) not in _INTERNAL_FILES:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+class _QueryStat:
+    """单个语句指纹的统计"""
+
+    __slots__ = ('calls', 'errors', 'rows', 'total_ms', 'max_ms', 'buckets', 'slow')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.slow = 0
+
+    def percentile(self, fraction: float) -> float:
+        """按直方图估算分位数（返回所在桶的上界，最后一个桶返回观测到的最大值）"""
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.buckets):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+class QueryStats:
+    """SQL语句耗时统计"""
+
+    def __init__(self, slow_query_ms: float = None, max_fingerprints: int = None):
+        """
+        初始化统计
+
+        Args:
+            slow_query_ms: 慢查询阈值（毫秒），超过时记录日志，0表示不记录，默认从配置获取
+            max_fingerprints: 最多单独统计的语句指纹数，默认从配置获取
+        """
+        self.slow_query_ms = slow_query_ms if slow_query_ms is not None else Config.DB_SLOW_QUERY_MS
+        self.max_fingerprints = max(1, max_fingerprints or Config.DB_QUERY_STATS_MAX)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _QueryStat] = {}
+        self._since = time.time()
+
+    def record(self, sql: str, elapsed_ms: float, rows: int = 0, error: bool = False):
+        """
+        记录一次语句执行
+
+        Args:
+            sql: 执行的SQL（带占位符的原始语句）
+            elapsed_ms: 耗时（毫秒）
+            rows: 返回或影响的行数
+            error: 是否执行失败
+        """
+        key = fingerprint(sql)
+        slow = bool(self.slow_query_ms) and elapsed_ms >= self.slow_query_ms
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    key = OVERFLOW_FINGERPRINT
+                    stat = self._stats.get(key)
+                if stat is None:
+                    stat = self._stats[key] = _QueryStat()
+            stat.calls += 1
+            stat.total_ms += elapsed_ms
+            stat.max_ms = max(stat.max_ms, elapsed_ms)
+            stat.rows += max(0, rows or 0)
+            if error:
+                stat.errors += 1
+            if slow:
+                stat.slow += 1
+            for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    stat.buckets[index] += 1
+                    break
+
+        if slow:
+            # 只在慢查询时取调用栈，正常语句不承担这部分开销
+            logger.warning(f"慢查询 {elapsed_ms:.1f}ms（{rows}行）于 {find_caller()}: {_SPACE_RE.sub(' ', sql).strip()[:500]}")
+
+    def get_stats(self, top: int = None, sort: str = 'total_ms') -> Dict[str, Any]:
+        """
+        获取统计
+
+        Args:
+            top: 只返回排序后的前top条
+            sort: 排序字段：total_ms、calls、max_ms、avg_ms、rows、errors
+        """
+        with self._lock:
+            queries: List[Dict[str, Any]] = [{
+                'query': key,
+                'calls': stat.calls,
+                'errors': stat.errors,
+                'slow': stat.slow,
+                'rows': stat.rows,
+                'total_ms': round(stat.total_ms, 2),
+                'avg_ms': round(stat.total_ms / stat.calls, 3) if stat.calls else 0.0,
+                'max_ms': round(stat.max_ms, 2),
+                'p50_ms': round(stat.percentile(0.5), 2),
+                'p95_ms': round(stat.percentile(0.95), 2),
+                'p99_ms': round(stat.percentile(0.99), 2),
+                'histogram': {
+                    ('+Inf' if bound == float('inf') else f"le_{bound}ms"): count
+                    for bound, count in zip(HISTOGRAM_BUCKETS_MS, stat.buckets)
+                },
+            } for key, stat in self._stats.items()]
+            since = self._since
+
+        if queries and sort not in queries[0]:
+            sort = 'total_ms'
+        queries.sort(key=lambda q: q[sort], reverse=True)
+        return {
+            'since': since,
+            'slow_query_ms': self.slow_query_ms,
+            'fingerprints': len(queries),
+            'total_calls': sum(q['calls'] for q in queries),
+            'total_ms': round(sum(q['total_ms'] for q in queries), 2),
+            'queries': queries[:top] if top else queries,
+        }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
+            self._since = time.time()
+
+
+class TimedCursor:
+    """包装pymysql游标，统计每次execute/executemany的耗时和行数，其余属性透传"""
+
+    def __init__(self, cursor, stats: 'QueryStats'):
+        self._cursor = cursor
+        self._stats = stats
+
+    def _timed(self, method, sql: str, args):
+        started = time.perf_counter()
+        try:
+            result = method(sql, args)
+        except Exception:
+            self._stats.record(sql, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        # execute/executemany返回影响或返回的行数（服务端游标返回0，行数未知）
+        self._stats.record(sql, (time.perf_counter() - started) * 1000, rows=result if isinstance(result, int) else 0)
+        return result
+
+    def execute(self, sql: str, args=None):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql: str, args):
+        return self._timed(self._cursor.executemany, sql, args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+        return False
+
+
+# 全局语句统计
+query_stats = QueryStats()
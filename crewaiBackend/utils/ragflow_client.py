@@ -6,10 +6,11 @@ RAGFlow API客户端
 import requests
 import json
 import os
-import time
 import logging
 from typing import Dict, Any, Optional, Generator
 
+from .cancellation import JobCancelledError, check_cancelled, cancellable_sleep
+
 # 导入配置
 try:
     from ..config import config
@@ -68,8 +69,11 @@ class RAGFlowClient:
             
         Raises:
             requests.RequestException: 请求失败时抛出异常
+            JobCancelledError: 所属任务已被取消
         """
         for attempt in range(max_retries):
+            # 每次发起请求前和收到响应后检查任务是否已取消，重试退避也可被取消打断
+            check_cancelled()
             try:
                 if method.upper() == 'GET':
                     response = requests.get(url, headers=self.headers, timeout=30)
@@ -80,6 +84,7 @@ class RAGFlowClient:
                 else:
                     raise ValueError(f"不支持的HTTP方法: {method}")
                 
+                check_cancelled()
                 response.raise_for_status()
                 result = response.json()
                 
@@ -91,7 +96,7 @@ class RAGFlowClient:
             except requests.RequestException as e:
                 if attempt < max_retries - 1:
                     logger.warning(f"API请求失败，第{attempt + 1}次重试: {str(e)}")
-                    time.sleep(2 ** attempt)  # 指数退避
+                    cancellable_sleep(2 ** attempt)  # 指数退避
                     continue
                 else:
                     raise Exception(f"API请求失败，已重试{max_retries}次: {str(e)}")
@@ -184,10 +189,17 @@ class RAGFlowClient:
             data["user_id"] = user_id
         
         try:
+            check_cancelled()
             response = requests.post(url, headers=self.headers, json=data, stream=True)
             response.raise_for_status()
             
             for line in response.iter_lines():
+                # 任务取消后关闭连接，不再读取剩余的流式响应
+                try:
+                    check_cancelled()
+                except JobCancelledError:
+                    response.close()
+                    raise
                 if line:
                     line_str = line.decode('utf-8')
                     
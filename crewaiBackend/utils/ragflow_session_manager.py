@@ -9,7 +9,9 @@ RAGFlow会话管理器
 """
 
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+from .cancellation import JobCancelledError
+from .ids import api_id
 from .ragflow_client import create_ragflow_client, DEFAULT_CHAT_ID
 
 logger = logging.getLogger(__name__)
@@ -69,7 +71,7 @@ class RAGFlowSessionManager:
             
             if results:
                 for row in results:
-                    app_session_id = row[0]
+                    app_session_id = api_id(row[0])
                     ragflow_session_id = row[1]
                     self.session_mapping[app_session_id] = ragflow_session_id
                     logger.info(f"[RAGFlow] 加载映射: {app_session_id[:8]} -> {ragflow_session_id[:8] if ragflow_session_id else 'None'}")
@@ -104,7 +106,7 @@ class RAGFlowSessionManager:
         try:
             from .database import db_manager
             query = "SELECT ragflow_session_id FROM chat_sessions WHERE session_id = %s AND ragflow_session_id IS NOT NULL"
-            results = db_manager.execute_query(query, (app_session_id,))
+            results = db_manager.execute_query(query, (db_manager.db_id(app_session_id),))
             
             if results and len(results) > 0:
                 ragflow_session_id = results[0][0]
@@ -190,7 +192,42 @@ class RAGFlowSessionManager:
             if app_session_id in self.session_mapping:
                 del self.session_mapping[app_session_id]
             return False
-    
+
+    def delete_sessions_bulk(self, sessions: List[Tuple[str, Optional[str]]], chunk_size: int = 100) -> int:
+        """
+        批量删除RAGFlow会话，每chunk_size个会话调用一次删除接口
+
+        Args:
+            sessions: (应用会话ID, RAGFlow会话ID)列表，RAGFlow会话ID为空时从映射中查找
+            chunk_size: 单次删除请求包含的会话数
+
+        Returns:
+            删除成功的RAGFlow会话数量
+        """
+        ragflow_ids = []
+        for app_session_id, ragflow_session_id in sessions:
+            # 无论删除是否成功都移除映射，失败的会话由启动时的无效会话清理兜底
+            mapped_id = self.session_mapping.pop(app_session_id, None)
+            ragflow_session_id = ragflow_session_id or mapped_id
+            if ragflow_session_id:
+                ragflow_ids.append(ragflow_session_id)
+
+        deleted = 0
+        for start in range(0, len(ragflow_ids), chunk_size):
+            chunk = ragflow_ids[start:start + chunk_size]
+            try:
+                self.ragflow_client.delete_sessions(chat_id=DEFAULT_CHAT_ID, session_ids=chunk)
+                deleted += len(chunk)
+            except JobCancelledError:
+                # 所属任务被取消时停止删除，剩余的会话由启动时的无效会话清理兜底
+                raise
+            except Exception as e:
+                logger.error(f"[RAGFlow] 批量删除 {len(chunk)} 个会话失败: {e}")
+
+        if ragflow_ids:
+            logger.info(f"[RAGFlow] 批量删除会话完成: {deleted}/{len(ragflow_ids)}")
+        return deleted
+
     def cleanup_all_sessions(self) -> int:
         """
         清理所有RAGFlow会话
@@ -253,7 +290,7 @@ class RAGFlowSessionManager:
             db_mapping = {}
             if db_results:
                 for row in db_results:
-                    app_session_id = row[0]
+                    app_session_id = api_id(row[0])
                     db_ragflow_session_id = row[1]
                     db_mapping[db_ragflow_session_id] = app_session_id
             
@@ -266,8 +303,8 @@ class RAGFlowSessionManager:
             for db_ragflow_session_id, app_session_id in list(db_mapping.items()):
                 if db_ragflow_session_id not in ragflow_session_ids:
                     # 清空数据库中的ragflow_session_id
-                    update_query = "UPDATE chat_sessions SET ragflow_session_id = NULL WHERE session_id = %s"
-                    db_manager.execute_update(update_query, (app_session_id,))
+                    from .sessionManager import SessionManager
+                    SessionManager().update_ragflow_session_id(app_session_id, None)
                     
                     # 从内存映射中删除
                     if app_session_id in self.session_mapping:
@@ -4,28 +4,58 @@
 使用MySQL数据库进行持久化存储
 """
 
+import copy
 import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from uuid import uuid4
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from ..config import Config
+from .cancellation import cancellable_sleep, check_cancelled
 from .database import db_manager
+from .ids import api_id, new_id
+from .messageArchive import ARCHIVE_COLUMNS, ARCHIVE_INSERT, archive_rows, decompress_content, decompress_rows
+from .messageWriter import (
+    MESSAGE_INSERT, SESSION_COUNTER_UPDATE, PendingMessage, get_message_writer, title_from_content, write_message_batch
+)
 
 logger = logging.getLogger(__name__)
 
+# 会话表（别名s）查询列，显式列出列名，避免依赖SELECT *的列顺序
+SESSION_COLUMNS = ("s.session_id, s.user_id, s.title, s.created_at, s.updated_at, s.context, s.ragflow_session_id, "
+                   "s.message_count")
+# 消息表查询列，与_message_from_row的解析顺序一致
+MESSAGE_COLUMNS = "id, role, content, timestamp, seq"
+# 会话列表摘要中最后一条消息预览的最大字符数
+PREVIEW_LENGTH = 100
+
+
+class MessageImportError(Exception):
+    """批量导入消息失败，imported为失败前已提交的消息数"""
+
+    def __init__(self, message: str, imported: int):
+        super().__init__(message)
+        self.imported = imported
+
 
 class ChatMessage:
     """聊天消息类"""
     
-    def __init__(self, role: str, content: str, timestamp: datetime = None):
+    def __init__(self, role: str, content: str, timestamp: datetime = None, seq: int = None,
+                 message_id: str = None):
         self.role = role  # 'user' 或 'assistant'
         self.content = content
         self.timestamp = timestamp or datetime.now()
-        self.id = str(uuid4())
+        # 从数据库或字典还原时沿用已有ID，只有新消息才生成ID
+        self.id = message_id or new_id()
+        self.seq = seq  # 数据库分配的单调递增序号，用于排序和分页游标
     
     def to_dict(self):
         return {
             'id': self.id,
+            'seq': self.seq,
             'role': self.role,
             'content': self.content,
             'timestamp': self.timestamp.isoformat()
@@ -36,9 +66,10 @@ class ChatMessage:
         message = cls(
             role=data['role'],
             content=data['content'],
-            timestamp=datetime.fromisoformat(data['timestamp'])
+            timestamp=datetime.fromisoformat(data['timestamp']),
+            seq=data.get('seq'),
+            message_id=data['id']
         )
-        message.id = data['id']
         return message
 
 
@@ -46,7 +77,7 @@ class ChatSession:
     """聊天会话类"""
     
     def __init__(self, session_id: str = None, user_id: str = None, title: str = None, ragflow_session_id: str = None):
-        self.session_id = session_id or str(uuid4())
+        self.session_id = session_id or new_id()
         self.user_id = user_id or "anonymous"
         self.title = title or f"聊天会话 {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         self.created_at = datetime.now()
@@ -54,27 +85,36 @@ class ChatSession:
         self.messages: List[ChatMessage] = []
         self.context = {}  # 存储上下文信息
         self.ragflow_session_id = ragflow_session_id  # RAGFlow会话ID
+        self.total_message_count: Optional[int] = None  # 数据库中维护的消息总数（分页加载时messages只是其中一部分）
     
     def add_message(self, role: str, content: str):
         """添加消息到会话"""
         message = ChatMessage(role, content)
         self.messages.append(message)
+        if self.total_message_count is not None:
+            self.total_message_count += 1
         self.updated_at = datetime.now()
         return message
     
+    def apply_stored_message(self, message: ChatMessage):
+        """同步一条已写入数据库的消息（与SESSION_COUNTER_UPDATE对会话行的修改一致）"""
+        if message.role == 'user' and not any(m.role == 'user' for m in self.messages):
+            self.title = title_from_content(message.content)
+        self.messages.append(message)
+        if self.total_message_count is not None:
+            self.total_message_count += 1
+        self.updated_at = message.timestamp
+    
+    def copy(self, include_messages: bool = True) -> 'ChatSession':
+        """浅拷贝会话，消息列表和上下文各自独立，消息对象共享"""
+        clone = copy.copy(self)
+        clone.messages = list(self.messages) if include_messages else []
+        clone.context = dict(self.context)
+        return clone
+    
     def get_context_summary(self, max_messages: int = 10) -> str:
         """获取上下文摘要"""
-        if not self.messages:
-            return ""
-        
-        recent_messages = self.messages[-max_messages:]
-        context_parts = []
-        
-        for msg in recent_messages:
-            role_name = "用户" if msg.role == "user" else "客服"
-            context_parts.append(f"{role_name}: {msg.content}")
-        
-        return "\n".join(context_parts)
+        return format_context(self.messages[-max_messages:])
     
     def to_dict(self):
         return {
@@ -84,7 +124,7 @@ class ChatSession:
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'messages': [msg.to_dict() for msg in self.messages],
-            'message_count': len(self.messages),
+            'message_count': self.total_message_count if self.total_message_count is not None else len(self.messages),
             'context': self.context,
             'ragflow_session_id': self.ragflow_session_id
         }
@@ -104,6 +144,249 @@ class ChatSession:
         return session
 
 
+def format_context(messages: List[ChatMessage]) -> str:
+    """把消息格式化为提示词中的对话历史，每条一行"""
+    context_parts = []
+    for msg in messages:
+        role_name = "用户" if msg.role == "user" else "客服"
+        context_parts.append(f"{role_name}: {msg.content}")
+    return "\n".join(context_parts)
+
+
+def merge_by_seq(*groups: List[ChatMessage]) -> List[ChatMessage]:
+    """
+    合并归档表和热表的消息，按seq升序并去掉重复
+
+    读取两张表之间消息被并发归档时，同一条消息可能在两张表中各读到一次
+    """
+    merged: Dict[int, ChatMessage] = {}
+    for group in groups:
+        for message in group:
+            merged.setdefault(message.seq, message)
+    return [merged[seq] for seq in sorted(merged)]
+
+
+class SessionCache:
+    """
+    ChatSession的LRU缓存（含全部消息），按session_id索引
+
+    - get返回缓存对象的拷贝，调用方修改不会影响缓存
+    - 本进程内的写操作通过update/invalidate同步缓存；其他进程的写入在ttl_seconds后可见
+    - 读取未命中时先begin_load再查库，查库期间该会话发生写入则放弃回填，避免缓存旧数据
+    """
+
+    def __init__(self, max_size: int = None, ttl_seconds: float = None):
+        """
+        初始化会话缓存
+
+        Args:
+            max_size: 最多缓存的会话数，0表示禁用缓存，默认从配置获取
+            ttl_seconds: 缓存条目的有效期（秒），默认从配置获取
+        """
+        self.max_size = max(0, max_size if max_size is not None else Config.SESSION_CACHE_SIZE)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.SESSION_CACHE_TTL
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[ChatSession, float]]" = OrderedDict()  # session_id -> (会话, 载入时间)
+        self._loading: Dict[str, int] = {}  # 正在查库回填的会话 -> 进行中的读取数
+        self._stale_loads = set()  # 查库期间发生过写入的会话
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _lookup(self, session_id: str) -> Optional[ChatSession]:
+        """查找未过期的缓存会话并记录命中统计，调用方需持有锁"""
+        entry = self._entries.get(session_id)
+        if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+            del self._entries[session_id]
+            entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self._hits += 1
+        return entry[0]
+
+    def get(self, session_id: str, include_messages: bool = True) -> Optional[ChatSession]:
+        """获取缓存的会话拷贝，未命中或已过期时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            session = self._lookup(session_id)
+            return session.copy(include_messages) if session is not None else None
+
+    def get_recent(self, session_id: str, n: int) -> Optional[List[ChatMessage]]:
+        """获取缓存会话的最新n条消息，只拷贝这n条的引用；未命中或已过期时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            session = self._lookup(session_id)
+            return session.messages[-n:] if session is not None else None
+
+    def _store(self, session_id: str, session: ChatSession):
+        self._entries[session_id] = (session.copy(), time.monotonic())
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def put(self, session_id: str, session: ChatSession):
+        """缓存一个完整的会话（含全部消息）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(session_id, session)
+
+    def begin_load(self, session_id: str):
+        """标记开始从数据库加载会话，必须与finish_load配对调用"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._loading[session_id] = self._loading.get(session_id, 0) + 1
+
+    def finish_load(self, session_id: str, session: Optional[ChatSession]):
+        """结束加载，加载期间没有发生写入时回填缓存"""
+        if not self.enabled:
+            return
+        with self._lock:
+            remaining = self._loading.get(session_id, 1) - 1
+            stale = session_id in self._stale_loads
+            if remaining > 0:
+                self._loading[session_id] = remaining
+            else:
+                self._loading.pop(session_id, None)
+                self._stale_loads.discard(session_id)
+            if session is not None and not stale:
+                self._store(session_id, session)
+
+    def _mark_written(self, session_id: str):
+        if session_id in self._loading:
+            self._stale_loads.add(session_id)
+
+    def update(self, session_id: str, apply: Callable[[ChatSession], None]):
+        """对已缓存的会话原地应用一次修改，未缓存时只标记进行中的加载失效"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._mark_written(session_id)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                apply(entry[0])
+
+    def contains(self, session_id: str) -> bool:
+        """会话是否已缓存且未过期，不计入命中统计"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds
+
+    def peek_user_id(self, session_id: str) -> Optional[str]:
+        """返回已缓存会话的用户ID，不计入命中统计，未缓存时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry[0].user_id if entry is not None else None
+
+    def invalidate(self, session_id: str):
+        """移除会话的缓存"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._mark_written(session_id)
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for session_id in self._loading:
+                self._stale_loads.add(session_id)
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存状态"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+# 全局会话缓存（SessionManager可能被多处实例化，缓存在进程内共享）
+session_cache = SessionCache()
+
+
+class RecentWrites:
+    """
+    记录最近发生写入的会话和用户，决定读取能否使用只读副本
+
+    写入后pin_seconds内，该会话的消息读取、该用户的会话列表固定走主库，
+    避免副本的复制延迟使刚写入的数据读不到；用户未知的写入会固定所有会话列表。
+    记录只在本进程内有效：多个进程或多台机器部署时，其他进程的写入不会固定本进程的读取，
+    不能容忍复制延迟的读取（如构造提示词的最近消息）应直接读主库
+    """
+
+    def __init__(self, pin_seconds: float = None):
+        """
+        初始化写入记录
+
+        Args:
+            pin_seconds: 写入后读取固定走主库的秒数，默认从配置获取
+        """
+        self.pin_seconds = pin_seconds if pin_seconds is not None else Config.DB_REPLICA_PIN_SECONDS
+        self._lock = threading.Lock()
+        # (类型, ID) -> 过期时间；有效期都相同，按写入先后排列即按过期时间排列
+        self._expires: "OrderedDict[Tuple[str, Optional[str]], float]" = OrderedDict()
+        self._last_expires = 0.0
+
+    def mark(self, session_id: str = None, user_id: str = None):
+        """记录一次写入，user_id为None表示不知道会话所属的用户"""
+        if self.pin_seconds <= 0:
+            return
+        now = time.monotonic()
+        expires = now + self.pin_seconds
+        keys = [('user', user_id)]
+        if session_id is not None:
+            keys.append(('session', session_id))
+        with self._lock:
+            self._last_expires = expires
+            for key in keys:
+                self._expires[key] = expires
+                self._expires.move_to_end(key)
+            while self._expires and next(iter(self._expires.values())) <= now:
+                self._expires.popitem(last=False)
+
+    def _pinned(self, key: Tuple[str, Optional[str]]) -> bool:
+        with self._lock:
+            return self._expires.get(key, 0.0) > time.monotonic()
+
+    def session_pinned(self, session_id: str) -> bool:
+        """该会话最近是否有写入"""
+        return self._pinned(('session', session_id))
+
+    def user_pinned(self, user_id: Optional[str]) -> bool:
+        """该用户的会话列表是否需要走主库，user_id为None（全部会话）时看是否有任何写入"""
+        if user_id is None:
+            with self._lock:
+                return self._last_expires > time.monotonic()
+        return self._pinned(('user', user_id)) or self._pinned(('user', None))
+
+
+# 全局写入记录，与会话缓存一样在进程内共享
+recent_writes = RecentWrites()
+
+
 class SessionManager:
     """会话管理器"""
 
@@ -116,7 +399,7 @@ class SessionManager:
         创建新会话（只创建数据库记录）
         注意：RAGFlow会话的创建由session_agent_manager在第一次对话时自动创建
         """
-        session_id = str(uuid4())
+        session_id = new_id()
         user_id = user_id or "anonymous"
         title = title or f"聊天会话 {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
@@ -126,11 +409,14 @@ class SessionManager:
                 INSERT INTO chat_sessions (session_id, user_id, title, context, ragflow_session_id)
                 VALUES (%s, %s, %s, %s, %s)
             """
-            params = (session_id, user_id, title, json.dumps({}), None)
+            params = (self.db.db_id(session_id), user_id, title, json.dumps({}), None)
             self.db.execute_update(query, params)
             
             # 创建会话对象
             session = ChatSession(session_id=session_id, user_id=user_id, title=title, ragflow_session_id=None)
+            session.total_message_count = 0
+            session_cache.put(session_id, session)
+            recent_writes.mark(session_id, user_id)
             logger.info(f"创建新会话: {session_id}")
             return session
             
@@ -138,125 +424,508 @@ class SessionManager:
             logger.error(f"创建会话失败: {e}")
             raise
 
-    def get_session(self, session_id: str) -> Optional[ChatSession]:
-        """获取会话"""
+    @staticmethod
+    def _session_from_row(row) -> ChatSession:
+        """由SESSION_COLUMNS顺序的查询结果行构造会话对象（不含消息）"""
+        session = ChatSession(
+            session_id=api_id(row[0]),
+            user_id=row[1],
+            title=row[2],
+            ragflow_session_id=row[6] if len(row) > 6 else None
+        )
+        session.created_at = row[3]
+        session.updated_at = row[4]
+        session.context = json.loads(row[5]) if row[5] else {}
+        if len(row) > 7:
+            session.total_message_count = row[7]
+        return session
+
+    @staticmethod
+    def _message_from_row(row) -> ChatMessage:
+        """由MESSAGE_COLUMNS顺序的查询结果行构造消息对象"""
+        return ChatMessage(role=row[1], content=row[2], timestamp=row[3], seq=row[4] if len(row) > 4 else None,
+                           message_id=api_id(row[0]))
+
+    def get_session(self, session_id: str, include_messages: bool = True) -> Optional[ChatSession]:
+        """
+        获取会话，优先从session_cache读取
+
+        含全部消息的读取会回填缓存，始终读主库；不含消息的读取不回填缓存，
+        会话最近没有写入时从只读副本读取
+
+        Args:
+            session_id: 会话ID
+            include_messages: 是否加载全部消息；分页读取消息时传False，再调用get_messages
+        """
+        cached = session_cache.get(session_id, include_messages)
+        if cached is not None:
+            return cached
+        
+        # 只有含全部消息的会话才回填缓存
+        if include_messages:
+            session_cache.begin_load(session_id)
+        session = None
         try:
-            # 查询会话信息
-            session_query = "SELECT * FROM chat_sessions WHERE session_id = %s"
-            session_data = self.db.execute_query(session_query, (session_id,))
-            
-            if not session_data:
-                return None
-            
-            session_row = session_data[0]
-            session = ChatSession(
-                session_id=session_row[0],
-                user_id=session_row[1],
-                title=session_row[2],
-                ragflow_session_id=session_row[6] if len(session_row) > 6 else None
-            )
-            session.created_at = session_row[3]
-            session.updated_at = session_row[4]
-            session.context = json.loads(session_row[5]) if session_row[5] else {}
-            
-            # 查询消息
-            messages_query = """
-                SELECT id, role, content, timestamp 
-                FROM chat_messages 
-                WHERE session_id = %s 
-                ORDER BY timestamp ASC
-            """
-            messages_data = self.db.execute_query(messages_query, (session_id,))
-            
-            for msg_row in messages_data:
-                message = ChatMessage(
-                    role=msg_row[1],
-                    content=msg_row[2],
-                    timestamp=msg_row[3]
-                )
-                message.id = msg_row[0]
-                session.messages.append(message)
-            
+            replica = not include_messages and not recent_writes.session_pinned(session_id)
+            session = self._load_session(session_id, include_messages, replica)
             return session
             
         except Exception as e:
             logger.error(f"获取会话失败: {e}")
             return None
+        finally:
+            if include_messages:
+                session_cache.finish_load(session_id, session)
 
-    def get_user_sessions(self, user_id: str) -> List[ChatSession]:
-        """获取用户的所有会话"""
+    def _load_session(self, session_id: str, include_messages: bool, replica: bool = False) -> Optional[ChatSession]:
+        """从数据库加载会话；replica见execute_query，结果要回填缓存时不应从副本读取"""
+        # 查询会话信息
+        session_query = f"SELECT {SESSION_COLUMNS} FROM chat_sessions s WHERE s.session_id = %s"
+        db_session_id = self.db.db_id(session_id)
+        session_data = self.db.execute_query(session_query, (db_session_id,), replica=replica)
+        
+        if not session_data:
+            return None
+        
+        session = self._session_from_row(session_data[0])
+        if not include_messages:
+            return session
+        
+        # 查询消息
+        messages_query = f"""
+            SELECT {MESSAGE_COLUMNS}
+            FROM chat_messages 
+            WHERE session_id = %s 
+            ORDER BY seq ASC
+        """
+        messages_data = self.db.execute_query(messages_query, (db_session_id,), replica=replica)
+        session.messages = [self._message_from_row(msg_row) for msg_row in messages_data]
+        
+        # 计数多于热表中的消息时说明有已归档的消息，归档消息的seq都小于热表中的消息
+        if self._has_archived_messages(session):
+            archived = self._load_archived_messages([session_id], replica).get(session_id, [])
+            session.messages = merge_by_seq(archived, session.messages)
+        
+        return session
+
+    @staticmethod
+    def _has_archived_messages(session: ChatSession) -> bool:
+        """已加载热表消息的会话是否还有归档的消息（计数多于热表中的消息）"""
+        return session.total_message_count is not None and len(session.messages) < session.total_message_count
+
+    def _load_archived_messages(self, session_ids: List[str], replica: bool = False) -> Dict[str, List[ChatMessage]]:
+        """读取会话的已归档消息（正文已解压），按会话ID分组，组内按seq升序；replica见execute_query"""
+        if not session_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(session_ids))
+        rows = self.db.execute_query(f"""
+            SELECT session_id, {ARCHIVE_COLUMNS}
+            FROM chat_messages_archive
+            WHERE session_id IN ({placeholders})
+            ORDER BY session_id, seq ASC
+        """, tuple(self.db.db_id(session_id) for session_id in session_ids), replica=replica)
+        archived: Dict[str, List[ChatMessage]] = {}
+        for row in decompress_rows(rows, content_index=3):
+            archived.setdefault(api_id(row[0]), []).append(self._message_from_row(row[1:]))
+        return archived
+
+    def get_messages(self, session_id: str, after: int = None, before: int = None,
+                     limit: int = None, replica: bool = None) -> Tuple[List[ChatMessage], bool]:
+        """
+        按seq游标分页读取会话消息（keyset分页，不使用OFFSET）
+
+        - 只传after：返回seq大于after的消息（增量同步），从旧到新取limit条
+        - 只传before：返回seq小于before的消息（向前翻页），取紧挨before的limit条
+        - 都不传：返回最新的limit条消息；limit也不传时返回全部消息
+        - 同时传：返回两者之间的消息，从旧到新取limit条
+
+        会话最近没有写入时可以从只读副本读取
+
+        Args:
+            session_id: 会话ID
+            after: 只返回seq大于该值的消息
+            before: 只返回seq小于该值的消息
+            limit: 最多返回的消息数
+            replica: 是否允许从只读副本读取；为None时按本进程最近是否写入过该会话决定
+
+        Returns:
+            (按seq升序排列的消息列表, 该方向上是否还有更多消息)
+        """
+        conditions = ["session_id = %s"]
+        params = [self.db.db_id(session_id)]
+        if after is not None:
+            conditions.append("seq > %s")
+            params.append(after)
+        if before is not None:
+            conditions.append("seq < %s")
+            params.append(before)
+        
+        # 没有after游标时从最新的消息往前取，取完再翻转为升序
+        newest_first = after is None
+        # 归档表中的消息都比热表中的旧：从新往旧取时先查热表，从旧往新取时先查归档表，
+        # 第一张表已取够时不再查询第二张表
+        tables = ("chat_messages", "chat_messages_archive")
+        if not newest_first:
+            tables = tables[::-1]
+        # 多取一条用于判断是否还有更多
+        wanted = limit + 1 if limit is not None else None
+        if replica is None:
+            replica = not recent_writes.session_pinned(session_id)
+        
+        rows, seen = [], set()
         try:
-            query = """
-                SELECT session_id FROM chat_sessions 
-                WHERE user_id = %s 
-                ORDER BY updated_at DESC
-            """
-            sessions_data = self.db.execute_query(query, (user_id,))
+            for table in tables:
+                query = f"""
+                    SELECT {MESSAGE_COLUMNS}
+                    FROM {table}
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY seq {'DESC' if newest_first else 'ASC'}
+                """
+                table_params = list(params)
+                if wanted is not None:
+                    query += " LIMIT %s"
+                    table_params.append(wanted - len(rows))
+                table_rows = self.db.execute_query(query, tuple(table_params), replica=replica)
+                if table == "chat_messages_archive":
+                    table_rows = decompress_rows(table_rows)
+                # 两次查询之间被归档的消息会在两张表中各读到一次，按seq去重
+                for row in table_rows:
+                    if row[4] not in seen:
+                        seen.add(row[4])
+                        rows.append(row)
+                if wanted is not None and len(rows) >= wanted:
+                    break
+        except Exception as e:
+            logger.error(f"分页获取消息失败: {e}")
+            return [], False
+        
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit] if has_more else rows
+        messages = [self._message_from_row(row) for row in rows]
+        if newest_first:
+            messages.reverse()
+        return messages, has_more
+
+    def get_recent_messages(self, session_id: str, n: int) -> List[ChatMessage]:
+        """
+        获取会话最新的n条消息（按seq升序），用于构造提示词
+
+        缓存命中时取缓存中的末尾n条（含异步写入队列中尚未落库的消息）；未命中时只读取最后n行
+        （idx_session_seq上的ORDER BY seq DESC LIMIT n），不加载整个会话，耗时与会话长度无关。
+        未命中时总是读主库：刚写入的消息可能来自其他进程，本进程的写入记录无法判断副本是否已同步
+
+        Args:
+            session_id: 会话ID
+            n: 最多返回的消息数
+        """
+        if n <= 0:
+            return []
+        cached = session_cache.get_recent(session_id, n)
+        if cached is not None:
+            return cached
+        messages, _ = self.get_messages(session_id, limit=n, replica=False)
+        return messages
+
+    def _load_sessions(self, where: str = "", params: tuple = (), replica: bool = False) -> List[ChatSession]:
+        """
+        批量加载会话及其消息：一次查询会话，一次查询这些会话的全部消息
+
+        Args:
+            where: 作用于chat_sessions（别名s）的WHERE子句，为空时加载全部会话
+            params: WHERE子句的参数
+            replica: 允许从只读副本读取
+
+        Returns:
+            按更新时间倒序排列的会话列表
+        """
+        where_clause = f"WHERE {where}" if where else ""
+        sessions_data = self.db.execute_query(f"""
+            SELECT {SESSION_COLUMNS}
+            FROM chat_sessions s
+            {where_clause}
+            ORDER BY s.updated_at DESC
+        """, params or None, replica=replica)
+        sessions = [self._session_from_row(row) for row in sessions_data]
+        if not sessions:
+            return []
+        
+        by_id = {session.session_id: session for session in sessions}
+        messages_data = self.db.execute_query(f"""
+            SELECT m.session_id, m.id, m.role, m.content, m.timestamp, m.seq
+            FROM chat_messages m
+            JOIN chat_sessions s ON s.session_id = m.session_id
+            {where_clause}
+            ORDER BY m.session_id, m.seq ASC
+        """, params or None, replica=replica)
+        for row in messages_data:
+            session = by_id.get(api_id(row[0]))
+            # 两次查询之间新建的会话不在本次结果中，忽略其消息
+            if session is not None:
+                session.messages.append(self._message_from_row(row[1:]))
+        
+        with_archive = [session.session_id for session in sessions if self._has_archived_messages(session)]
+        for session_id, archived in self._load_archived_messages(with_archive, replica).items():
+            by_id[session_id].messages = merge_by_seq(archived, by_id[session_id].messages)
+        return sessions
+
+    def get_session_summaries(self, user_id: str = None) -> List[Dict]:
+        """
+        获取会话列表摘要（不加载消息正文），用于侧边栏等列表展示
+
+        Args:
+            user_id: 用户ID，为None时返回所有会话
+
+        Returns:
+            按更新时间倒序排列的摘要列表，每项包含标题、时间、消息数和最后一条消息的预览
+        """
+        replica = not recent_writes.user_pinned(user_id)
+        try:
+            where_clause = "WHERE s.user_id = %s" if user_id is not None else ""
+            params = (PREVIEW_LENGTH,) + ((user_id,) if user_id is not None else ())
+            rows = self.db.execute_query(f"""
+                SELECT s.session_id, s.user_id, s.title, s.created_at, s.updated_at, s.ragflow_session_id,
+                       s.message_count, lm.role, LEFT(lm.content, %s), lm.timestamp
+                FROM chat_sessions s
+                LEFT JOIN chat_messages lm ON lm.id = (
+                    SELECT m.id FROM chat_messages m
+                    WHERE m.session_id = s.session_id
+                    ORDER BY m.seq DESC
+                    LIMIT 1
+                )
+                {where_clause}
+                ORDER BY s.updated_at DESC
+            """, params, replica=replica)
             
-            sessions = []
-            for row in sessions_data:
-                session = self.get_session(row[0])
-                if session:
-                    sessions.append(session)
+            summaries = []
+            for row in rows:
+                summaries.append({
+                    'session_id': api_id(row[0]),
+                    'user_id': row[1],
+                    'title': row[2],
+                    'created_at': row[3].isoformat() if row[3] else None,
+                    'updated_at': row[4].isoformat() if row[4] else None,
+                    'ragflow_session_id': row[5],
+                    'message_count': int(row[6] or 0),
+                    'last_message': {
+                        'role': row[7],
+                        'preview': row[8],
+                        'timestamp': row[9].isoformat() if row[9] else None
+                    } if row[7] is not None else None
+                })
             
-            return sessions
+            # 消息已全部归档的会话，最后一条消息从归档表读取
+            archived_ids = [item['session_id'] for item in summaries
+                            if item['last_message'] is None and item['message_count'] > 0]
+            if archived_ids:
+                last_messages = self._archived_last_messages(archived_ids, replica)
+                for item in summaries:
+                    if item['session_id'] in last_messages:
+                        item['last_message'] = last_messages[item['session_id']]
+            return summaries
+            
+        except Exception as e:
+            logger.error(f"获取会话摘要失败: {e}")
+            return []
+
+    def _archived_last_messages(self, session_ids: List[str], replica: bool = False) -> Dict[str, Dict]:
+        """读取会话在归档表中的最后一条消息，返回与get_session_summaries中last_message相同格式的预览"""
+        placeholders = ", ".join(["%s"] * len(session_ids))
+        rows = self.db.execute_query(f"""
+            SELECT a.session_id, a.role, a.content, a.timestamp
+            FROM chat_messages_archive a
+            WHERE a.session_id IN ({placeholders})
+              AND a.seq = (SELECT MAX(seq) FROM chat_messages_archive WHERE session_id = a.session_id)
+        """, tuple(self.db.db_id(session_id) for session_id in session_ids), replica=replica)
+        return {
+            api_id(session_id): {
+                'role': role,
+                'preview': decompress_content(content)[:PREVIEW_LENGTH],
+                'timestamp': timestamp.isoformat() if timestamp else None
+            }
+            for session_id, role, content, timestamp in rows
+        }
+
+    def get_user_sessions(self, user_id: str) -> List[ChatSession]:
+        """获取用户的所有会话（含消息）"""
+        try:
+            return self._load_sessions("s.user_id = %s", (user_id,), replica=not recent_writes.user_pinned(user_id))
             
         except Exception as e:
             logger.error(f"获取用户会话失败: {e}")
             return []
 
     def add_message(self, session_id: str, role: str, content: str) -> Optional[ChatMessage]:
-        """添加消息到会话"""
+        """
+        添加消息到会话
+
+        插入消息和更新会话（消息计数、首条用户消息生成标题、更新时间）在同一个事务中完成，
+        不再统计历史消息数，写入耗时与会话长度无关。
+        开启MESSAGE_WRITE_BEHIND时消息放入异步写入队列后立即返回（seq为None，
+        消息在MESSAGE_FLUSH_INTERVAL内落库）；队列已满时退回同步写入。
+        入队前先确认会话存在（先查缓存再查库），会话不存在时返回None
+        """
         try:
-            message_id = str(uuid4())
-            
-            # 插入消息到数据库
-            query = """
-                INSERT INTO chat_messages (id, session_id, role, content)
-                VALUES (%s, %s, %s, %s)
-            """
-            params = (message_id, session_id, role, content)
-            self.db.execute_update(query, params)
-            
-            # 如果是第一条用户消息，自动更新会话标题
-            if role == 'user':
-                # 检查是否是第一条用户消息
-                count_query = """
-                    SELECT COUNT(*) FROM chat_messages 
-                    WHERE session_id = %s AND role = 'user'
-                """
-                count_result = self.db.execute_query(count_query, (session_id,))
-                if count_result and count_result[0][0] == 1:  # 第一条用户消息
-                    # 生成基于内容的标题（截取前30个字符）
-                    new_title = content[:30] + ('...' if len(content) > 30 else '')
-                    title_update_query = "UPDATE chat_sessions SET title = %s WHERE session_id = %s"
-                    self.db.execute_update(title_update_query, (new_title, session_id))
-            
-            # 更新会话的更新时间
-            update_query = "UPDATE chat_sessions SET updated_at = NOW() WHERE session_id = %s"
-            self.db.execute_update(update_query, (session_id,))
-            
-            # 创建消息对象
             message = ChatMessage(role, content)
-            message.id = message_id
+            message_id, db_session_id = self.db.db_id(message.id), self.db.db_id(session_id)
+            
+            writer = get_message_writer()
+            if writer is not None and not self._session_exists(session_id, db_session_id):
+                logger.warning(f"会话不存在，无法添加消息: {session_id}")
+                return None
+            if writer is not None and writer.enqueue(message_id, db_session_id, role, content, message.timestamp):
+                logger.debug(f"消息已加入写入队列 {session_id}: {role}")
+            else:
+                is_user = 1 if role == 'user' else 0
+                
+                with self.db.transaction() as cursor:
+                    # 插入消息到数据库，seq由数据库自增分配
+                    cursor.execute(MESSAGE_INSERT, (message_id, db_session_id, role, content, message.timestamp))
+                    message.seq = cursor.lastrowid
+                    
+                    # 第一条用户消息时用其内容生成标题
+                    cursor.execute(SESSION_COUNTER_UPDATE,
+                                   (is_user, title_from_content(content), 1, is_user, db_session_id))
+                
+                logger.info(f"添加消息到会话 {session_id}: {role}")
             
-            logger.info(f"添加消息到会话 {session_id}: {role}")
+            session_cache.update(session_id, lambda session: session.apply_stored_message(message))
+            recent_writes.mark(session_id, session_cache.peek_user_id(session_id))
             return message
             
         except Exception as e:
             logger.error(f"添加消息失败: {e}")
             return None
 
+    def _session_exists(self, session_id: str, db_session_id: Any) -> bool:
+        """会话是否存在：缓存命中时不查库，否则查询主库（刚创建的会话可能尚未同步到副本）"""
+        if session_cache.contains(session_id):
+            return True
+        return bool(self.db.execute_query(
+            "SELECT 1 FROM chat_sessions WHERE session_id = %s", (db_session_id,)
+        ))
+
+    def _pending_from_record(self, record: Dict) -> PendingMessage:
+        """把导入记录（与export_messages的输出格式相同）转换为待写入消息（ID为数据库存储形式）"""
+        try:
+            role = record['role']
+            if role not in ('user', 'assistant'):
+                raise ValueError(f"无效的role: {role}")
+            timestamp = record.get('timestamp')
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            return PendingMessage(
+                message_id=self.db.db_id(record.get('id') or new_id()),
+                session_id=self.db.db_id(record['session_id']),
+                role=role,
+                content=record['content'],
+                timestamp=timestamp or datetime.now()
+            )
+        except KeyError as e:
+            raise ValueError(f"缺少字段: {e.args[0]}")
+
+    def _import_batch(self, batch: List[PendingMessage]) -> int:
+        with self.db.transaction() as cursor:
+            write_message_batch(cursor, batch)
+        for session_id in {message.session_id for message in batch}:
+            session_cache.invalidate(api_id(session_id))
+            recent_writes.mark(api_id(session_id))
+        return len(batch)
+
+    def import_messages(self, messages: Iterable[Dict], batch_size: int = None) -> int:
+        """
+        批量导入消息，按batch_size分批，每批一个事务（多行INSERT + 每个会话一条计数更新）
+
+        messages可以是生成器，只在内存中保留一批；会话必须已存在，seq按导入顺序重新分配。
+        某一批失败时该批回滚，之前已提交的批次保留
+
+        Args:
+            messages: 消息记录，每条包含session_id、role、content，可选id、timestamp
+            batch_size: 每批写入的条数，默认从配置获取
+
+        Returns:
+            导入的消息数
+
+        Raises:
+            MessageImportError: 记录格式错误或写入失败
+        """
+        batch_size = max(1, batch_size or Config.IMPORT_BATCH_SIZE)
+        imported = 0
+        batch: List[PendingMessage] = []
+        try:
+            for record in messages:
+                batch.append(self._pending_from_record(record))
+                if len(batch) >= batch_size:
+                    imported += self._import_batch(batch)
+                    batch = []
+            if batch:
+                imported += self._import_batch(batch)
+        except Exception as e:
+            logger.error(f"批量导入消息失败，已导入 {imported} 条: {e}")
+            raise MessageImportError(str(e), imported) from e
+
+        logger.info(f"批量导入消息 {imported} 条")
+        return imported
+
+    def export_messages(self, session_id: str = None, user_id: str = None) -> Iterator[Dict]:
+        """
+        按seq顺序流式导出消息（服务端游标，内存占用与消息总数无关）
+
+        先导出归档表中的消息，再导出热表中的消息，各自按seq排序。输出格式可直接用于import_messages
+
+        Args:
+            session_id: 只导出该会话的消息
+            user_id: 只导出该用户的会话中的消息
+
+        Raises:
+            ValueError: ID以BINARY(16)存储时session_id不是合法的UUID
+            RuntimeError: 数据库不可用
+        """
+        conditions, params = [], []
+        if session_id:
+            conditions.append("m.session_id = %s")
+            params.append(self.db.db_id(session_id))
+        if user_id:
+            conditions.append("s.user_id = %s")
+            params.append(user_id)
+        join = "JOIN chat_sessions s ON s.session_id = m.session_id" if user_id else ""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        for table in ("chat_messages_archive", "chat_messages"):
+            rows = self.db.stream_query(f"""
+                SELECT m.id, m.session_id, m.role, m.content, m.timestamp, m.seq
+                FROM {table} m {join} {where}
+                ORDER BY m.seq
+            """, tuple(params))
+            archived = table == "chat_messages_archive"
+            for message_id, message_session_id, role, content, timestamp, seq in rows:
+                yield {
+                    'id': api_id(message_id),
+                    'session_id': api_id(message_session_id),
+                    'role': role,
+                    'content': decompress_content(content) if archived else content,
+                    'timestamp': timestamp.isoformat() if timestamp else None,
+                    'seq': seq,
+                }
+
     def update_session_title(self, session_id: str, title: str):
         """更新会话标题"""
         try:
             query = "UPDATE chat_sessions SET title = %s, updated_at = NOW() WHERE session_id = %s"
-            self.db.execute_update(query, (title, session_id))
+            self.db.execute_update(query, (title, self.db.db_id(session_id)))
+            session_cache.invalidate(session_id)
+            recent_writes.mark(session_id)
             logger.info(f"更新会话标题: {session_id}")
             
         except Exception as e:
             logger.error(f"更新会话标题失败: {e}")
 
+    def update_ragflow_session_id(self, session_id: str, ragflow_session_id: Optional[str]):
+        """更新会话对应的RAGFlow会话ID"""
+        query = "UPDATE chat_sessions SET ragflow_session_id = %s WHERE session_id = %s"
+        self.db.execute_update(query, (ragflow_session_id, self.db.db_id(session_id)))
+        session_cache.update(session_id, lambda session: setattr(session, 'ragflow_session_id', ragflow_session_id))
+        recent_writes.mark(session_id)
+
     def delete_session(self, session_id: str) -> bool:
         """
         删除会话（只删除数据库记录）
@@ -265,7 +934,9 @@ class SessionManager:
         try:
             # 删除本地会话（由于外键约束，删除会话会自动删除相关消息）
             query = "DELETE FROM chat_sessions WHERE session_id = %s"
-            affected_rows = self.db.execute_update(query, (session_id,))
+            affected_rows = self.db.execute_update(query, (self.db.db_id(session_id),))
+            session_cache.invalidate(session_id)
+            recent_writes.mark(session_id)
             
             if affected_rows > 0:
                 logger.info(f"删除本地会话: {session_id}")
@@ -279,18 +950,9 @@ class SessionManager:
             return False
 
     def get_all_sessions(self) -> List[ChatSession]:
-        """获取所有会话"""
+        """获取所有会话（含消息）"""
         try:
-            query = "SELECT session_id FROM chat_sessions ORDER BY updated_at DESC"
-            sessions_data = self.db.execute_query(query)
-            
-            sessions = []
-            for row in sessions_data:
-                session = self.get_session(row[0])
-                if session:
-                    sessions.append(session)
-            
-            return sessions
+            return self._load_sessions(replica=not recent_writes.user_pinned(None))
             
         except Exception as e:
             logger.error(f"获取所有会话失败: {e}")
@@ -299,22 +961,228 @@ class SessionManager:
     def cleanup_old_sessions(self, days: int = 30):
         """
         清理旧会话
-        注意：这个方法只清理数据库记录，不清理Agent
-        如需清理Agent，请调用session_agent_manager.cleanup_inactive_sessions()
+        注意：这个方法只清理数据库记录，不清理Agent和RAGFlow会话
+        如需清理Agent，请调用session_agent_manager.cleanup_inactive_sessions()；
+        连同RAGFlow会话一起清理请使用sessionPurge中的清理任务
         """
         try:
-            # 先获取要删除的session IDs
-            select_query = "SELECT session_id FROM chat_sessions WHERE updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)"
-            old_sessions = self.db.execute_query(select_query, (days,))
-            
-            if not old_sessions:
+            stats = self.purge_old_sessions(days)
+            if stats['sessions']:
+                logger.info(f"清理了 {stats['sessions']} 个旧会话（数据库记录）")
+            else:
                 logger.info("没有需要清理的旧会话")
-                return
-            
-            # 删除数据库记录
-            delete_query = "DELETE FROM chat_sessions WHERE updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)"
-            affected_rows = self.db.execute_update(delete_query, (days,))
-            logger.info(f"清理了 {affected_rows} 个旧会话（数据库记录）")
-            
+
         except Exception as e:
             logger.error(f"清理旧会话失败: {e}")
+
+    def purge_old_sessions(self, days: int, batch_size: int = None, pause_seconds: float = None,
+                           on_batch: Callable[[List[Tuple[str, Optional[str]]], Dict[str, int]], None] = None
+                           ) -> Dict[str, int]:
+        """
+        分批删除updated_at早于days天前的会话及其消息
+
+        每批删除的会话数加消息数不超过batch_size（单个会话的消息超过batch_size时先按seq分段删除消息），
+        每批单独一个事务，批与批之间暂停pause_seconds，避免长时间持有行锁影响在线请求。
+        截止时间在开始时按数据库时钟确定一次（与updated_at使用同一时钟），清理过程中有新消息的会话不会被删除。
+        消息数包含已归档的消息（删除会话时级联删除）。
+        在任务上下文中执行时每批之前检查取消，取消时抛出JobCancelledError，已删除的批次不回滚
+
+        Args:
+            days: 保留天数
+            batch_size: 每批最多删除的行数（会话+消息），默认从配置获取
+            pause_seconds: 批与批之间的暂停秒数，默认从配置获取
+            on_batch: 每批提交后的回调on_batch(deleted, stats)，deleted为本批实际删除的
+                (会话ID, RAGFlow会话ID)列表，stats为截至目前的累计统计
+
+        Returns:
+            累计统计：sessions（删除的会话数）、messages（删除的消息数）、batches（批次数）
+        """
+        batch_size = max(1, batch_size or Config.PURGE_BATCH_SIZE)
+        pause_seconds = Config.PURGE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        cutoff = self._db_cutoff(days)
+        stats = {'sessions': 0, 'messages': 0, 'batches': 0}
+
+        while True:
+            check_cancelled()
+            rows = self.db.execute_query(
+                "SELECT session_id, ragflow_session_id, message_count FROM chat_sessions "
+                "WHERE updated_at < %s ORDER BY updated_at LIMIT %s",
+                (cutoff, batch_size)
+            )
+            if not rows:
+                break
+
+            # 按消息数凑批，至少包含一个会话
+            batch, message_counts, budget = [], {}, 0
+            for session_id, ragflow_session_id, message_count in rows:
+                message_count = int(message_count or 0)
+                if batch and budget + message_count + 1 > batch_size:
+                    break
+                batch.append((session_id, ragflow_session_id))
+                message_counts[session_id] = message_count
+                budget += message_count + 1
+
+            if budget > batch_size:
+                # 单个会话的消息过多，先分段删除消息，会话行和剩余消息随后一起删除
+                stats['messages'] += self._purge_session_messages(batch[0][0], cutoff, batch_size, pause_seconds)
+                message_counts[batch[0][0]] = self._count_messages(batch[0][0])
+
+            session_ids = [session_id for session_id, _ in batch]
+            placeholders = ", ".join(["%s"] * len(session_ids))
+            with self.db.transaction() as cursor:
+                # 重新带上截止条件，查询之后有新消息的会话保留
+                deleted_count = cursor.execute(
+                    f"DELETE FROM chat_sessions WHERE session_id IN ({placeholders}) AND updated_at < %s",
+                    (*session_ids, cutoff)
+                )
+            for session_id in session_ids:
+                session_cache.invalidate(api_id(session_id))
+
+            if deleted_count < len(batch):
+                survivors = {row[0] for row in self.db.execute_query(
+                    f"SELECT session_id FROM chat_sessions WHERE session_id IN ({placeholders})", tuple(session_ids)
+                )}
+                batch = [item for item in batch if item[0] not in survivors]
+
+            stats['sessions'] += len(batch)
+            stats['messages'] += sum(message_counts[session_id] for session_id, _ in batch)
+            stats['batches'] += 1
+            logger.info(f"清理旧会话第 {stats['batches']} 批: 删除 {len(batch)} 个会话，"
+                        f"累计 {stats['sessions']} 个会话、{stats['messages']} 条消息")
+            if on_batch is not None:
+                on_batch([(api_id(session_id), ragflow_session_id) for session_id, ragflow_session_id in batch],
+                         dict(stats))
+            cancellable_sleep(pause_seconds)
+
+        return stats
+
+    def _db_cutoff(self, days: int):
+        """
+        按数据库时钟计算days天前的时间（与NOW()写入的updated_at比较，不受应用服务器时钟偏差影响）
+
+        Raises:
+            RuntimeError: 数据库不可用
+        """
+        rows = self.db.execute_query("SELECT DATE_SUB(NOW(), INTERVAL %s DAY)", (days,))
+        if not rows:
+            raise RuntimeError("无法从数据库获取当前时间")
+        return rows[0][0]
+
+    def _purge_session_messages(self, session_id: str, cutoff, chunk_size: int, pause_seconds: float) -> int:
+        """
+        按seq从小到大分段删除会话在热表和归档表中的消息，每段最多chunk_size条，剩余不足一段时停止
+
+        Returns:
+            删除的消息数
+        """
+        deleted = 0
+        for table in ("chat_messages", "chat_messages_archive"):
+            while True:
+                check_cancelled()
+                rows = self.db.execute_query(
+                    f"SELECT seq FROM {table} WHERE session_id = %s ORDER BY seq LIMIT 1 OFFSET %s",
+                    (session_id, chunk_size - 1)
+                )
+                if not rows:
+                    break
+                with self.db.transaction() as cursor:
+                    # 会话在清理期间有新消息时不再删除
+                    count = cursor.execute(f"""
+                        DELETE FROM {table}
+                        WHERE session_id = %s AND seq <= %s
+                          AND EXISTS (SELECT 1 FROM chat_sessions WHERE session_id = %s AND updated_at < %s)
+                    """, (session_id, rows[0][0], session_id, cutoff))
+                if not count:
+                    return deleted
+                deleted += count
+                cancellable_sleep(pause_seconds)
+        return deleted
+
+    def _count_messages(self, session_id: str) -> int:
+        """统计会话当前的消息数（热表和归档表）"""
+        rows = self.db.execute_query("""
+            SELECT (SELECT COUNT(*) FROM chat_messages WHERE session_id = %s)
+                 + (SELECT COUNT(*) FROM chat_messages_archive WHERE session_id = %s)
+        """, (session_id, session_id))
+        return int(rows[0][0]) if rows else 0
+
+    def archive_idle_sessions(self, days: int, batch_size: int = None, pause_seconds: float = None,
+                              on_batch: Callable[[Dict[str, int]], None] = None) -> Dict[str, int]:
+        """
+        把updated_at早于days天前的会话的消息从热表移到归档表（正文zlib压缩）
+
+        每批最多batch_size条消息，在一个事务中写入归档表并从热表删除，批与批之间暂停pause_seconds。
+        归档不改变会话的读取结果，读取会话时合并两张表的消息。
+        截止时间按数据库时钟确定；在任务上下文中执行时每个会话之前检查取消
+
+        Args:
+            days: 会话多少天没有更新后归档
+            batch_size: 每批归档的消息数，默认从配置获取
+            pause_seconds: 批与批之间的暂停秒数，默认从配置获取
+            on_batch: 每扫描完一页会话后的回调on_batch(stats)，stats为截至目前的累计统计
+
+        Returns:
+            累计统计：sessions（归档的会话数）、messages（归档的消息数）、
+            raw_bytes / stored_bytes（正文压缩前后的字节数）
+        """
+        batch_size = max(1, batch_size or Config.ARCHIVE_BATCH_SIZE)
+        pause_seconds = Config.PURGE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        cutoff = self._db_cutoff(days)
+        stats = {'sessions': 0, 'messages': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+
+        # 按session_id游标扫描，已归档（热表中没有消息）的会话不会被重复选中
+        last_session_id = ""
+        while True:
+            rows = self.db.execute_query("""
+                SELECT s.session_id FROM chat_sessions s
+                WHERE s.session_id > %s AND s.updated_at < %s
+                  AND EXISTS (SELECT 1 FROM chat_messages m WHERE m.session_id = s.session_id)
+                ORDER BY s.session_id LIMIT %s
+            """, (last_session_id, cutoff, batch_size))
+            if not rows:
+                break
+            last_session_id = rows[-1][0]
+            for (session_id,) in rows:
+                check_cancelled()
+                archived = self._archive_session_messages(session_id, cutoff, batch_size, pause_seconds, stats)
+                if archived:
+                    stats['sessions'] += 1
+            if on_batch is not None:
+                on_batch(dict(stats))
+
+        if stats['messages']:
+            logger.info(f"归档了 {stats['sessions']} 个会话的 {stats['messages']} 条消息，"
+                        f"正文 {stats['raw_bytes']} -> {stats['stored_bytes']} 字节")
+        return stats
+
+    def _archive_session_messages(self, session_id: str, cutoff, batch_size: int,
+                                  pause_seconds: float, stats: Dict[str, int]) -> int:
+        """
+        按seq从小到大分批归档一个会话在热表中的消息，会话在归档期间有新消息时停止
+
+        Returns:
+            归档的消息数
+        """
+        archived = 0
+        while True:
+            rows = self.db.execute_query(f"""
+                SELECT {MESSAGE_COLUMNS} FROM chat_messages
+                WHERE session_id = %s ORDER BY seq LIMIT %s
+            """, (session_id, batch_size))
+            if not rows:
+                return archived
+            params, raw_bytes, stored_bytes = archive_rows(session_id, rows)
+            seqs = [row[4] for row in rows]
+            placeholders = ", ".join(["%s"] * len(seqs))
+            with self.db.transaction() as cursor:
+                cursor.execute("SELECT 1 FROM chat_sessions WHERE session_id = %s AND updated_at < %s",
+                               (session_id, cutoff))
+                if cursor.fetchone() is None:
+                    return archived
+                cursor.executemany(ARCHIVE_INSERT, params)
+                cursor.execute(f"DELETE FROM chat_messages WHERE seq IN ({placeholders})", tuple(seqs))
+            archived += len(rows)
+            stats['messages'] += len(rows)
+            stats['raw_bytes'] += raw_bytes
+            stats['stored_bytes'] += stored_bytes
+            cancellable_sleep(pause_seconds)
@@ -0,0 +1,245 @@
+"""
+旧会话清理和空闲会话消息归档任务
+在独立的后台线程中分批删除超过保留天数的会话及其消息，并批量删除对应的RAGFlow会话；
+或把空闲会话的消息移入归档表。
+两者都以任务（job）的形式运行：进度作为任务事件记录，可通过任务状态接口查询，通过任务取消接口中止
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from ..config import Config
+from .cancellation import JobCancelledError, bind_token, job_cancellation
+from .jobManager import append_event, finish_job
+
+logger = logging.getLogger(__name__)
+
+# 按保留天数自动清理的最小间隔（秒）
+RETENTION_PURGE_INTERVAL = 24 * 3600
+# 空闲会话消息自动归档的最小间隔（秒）
+ARCHIVE_INTERVAL = 3600
+
+
+class PurgeAlreadyRunning(Exception):
+    """已有同类的清理或归档任务在运行"""
+
+    def __init__(self, job_id: str, kind: str = "清理"):
+        super().__init__(f"{kind}任务 {job_id} 正在运行")
+        self.job_id = job_id
+
+
+class _SingleJobRunner:
+    """在独立线程中运行的后台任务，同一进程同一时刻只运行一个"""
+
+    def __init__(self, thread_name: str, kind: str):
+        self._thread_name = thread_name
+        self._kind = kind
+        self._lock = threading.Lock()
+        self._job_id: Optional[str] = None
+
+    @property
+    def current_job_id(self) -> Optional[str]:
+        """运行中的任务ID，没有时返回None"""
+        with self._lock:
+            return self._job_id
+
+    def _launch(self, first_event: str, target, *args) -> str:
+        """
+        创建任务并在独立线程中执行target(job_id, token, *args)，target结束时需调用_finish
+
+        Raises:
+            PurgeAlreadyRunning: 已有任务在运行
+        """
+        with self._lock:
+            if self._job_id is not None:
+                raise PurgeAlreadyRunning(self._job_id, self._kind)
+            job_id = self._job_id = str(uuid4())
+
+        append_event(job_id, first_event)
+        token = job_cancellation.register(job_id)
+        # 使用独立线程而不占用任务执行器的工作线程，执行期间在线请求的处理能力不受影响
+        thread = threading.Thread(target=target, args=(job_id, token, *args), name=self._thread_name, daemon=True)
+        try:
+            thread.start()
+        except Exception:
+            self._finish(job_id)
+            raise
+        return job_id
+
+    def _finish(self, job_id: str):
+        job_cancellation.unregister(job_id)
+        with self._lock:
+            self._job_id = None
+
+
+class SessionPurge(_SingleJobRunner):
+    """旧会话清理任务，同一进程同一时刻只运行一个"""
+
+    def __init__(self):
+        super().__init__("session-purge", "清理")
+        self._last_retention_run: Optional[float] = None
+
+    def start(self, days: int, batch_size: int = None, pause_seconds: float = None,
+              delete_ragflow: bool = True) -> str:
+        """
+        启动清理任务
+
+        Args:
+            days: 保留天数，删除updated_at早于days天前的会话
+            batch_size: 每批最多删除的行数（会话+消息），默认从配置获取
+            pause_seconds: 批与批之间的暂停秒数，默认从配置获取
+            delete_ragflow: 是否同时删除对应的RAGFlow会话
+
+        Returns:
+            清理任务的job_id
+
+        Raises:
+            PurgeAlreadyRunning: 已有清理任务在运行
+        """
+        job_id = self._launch(f"开始清理 {days} 天前的旧会话...", self._run,
+                              days, batch_size, pause_seconds, delete_ragflow)
+        logger.info(f"清理任务 {job_id} 已启动: days={days}")
+        return job_id
+
+    def start_retention_purge(self) -> Optional[str]:
+        """
+        按配置的保留天数自动清理，距上次自动清理不足RETENTION_PURGE_INTERVAL或未配置保留天数时不执行
+
+        Returns:
+            启动的清理任务job_id，未启动时返回None
+        """
+        if Config.SESSION_RETENTION_DAYS <= 0:
+            return None
+        now = time.monotonic()
+        if self._last_retention_run is not None and now - self._last_retention_run < RETENTION_PURGE_INTERVAL:
+            return None
+        try:
+            job_id = self.start(Config.SESSION_RETENTION_DAYS)
+        except PurgeAlreadyRunning:
+            return None
+        self._last_retention_run = now
+        return job_id
+
+    def _run(self, job_id: str, token, days: int, batch_size: Optional[int], pause_seconds: Optional[float],
+             delete_ragflow: bool):
+        """执行清理，结束后记录任务结果"""
+        from .sessionManager import SessionManager
+
+        progress: Dict[str, int] = {'sessions': 0, 'messages': 0, 'batches': 0, 'ragflow_sessions': 0}
+
+        def on_batch(deleted: List[Tuple[str, Optional[str]]], stats: Dict[str, int]):
+            progress.update(stats)
+            if deleted:
+                # 已删除的会话不应继续占用Agent
+                from .session_agent_manager import session_agent_manager
+                session_agent_manager.release_agents([session_id for session_id, _ in deleted])
+            if delete_ragflow and deleted:
+                from .ragflow_session_manager import ragflow_session_manager
+                progress['ragflow_sessions'] += ragflow_session_manager.delete_sessions_bulk(deleted)
+            append_event(job_id, f"第 {stats['batches']} 批完成：累计删除 {stats['sessions']} 个会话、"
+                                 f"{stats['messages']} 条消息、{progress['ragflow_sessions']} 个RAGFlow会话")
+
+        try:
+            with bind_token(token):
+                SessionManager().purge_old_sessions(days, batch_size, pause_seconds, on_batch=on_batch)
+            finish_job(job_id, 'COMPLETE', json.dumps(progress, ensure_ascii=False),
+                       f"清理完成：共删除 {progress['sessions']} 个会话")
+            logger.info(f"清理任务 {job_id} 完成: {progress}")
+
+        except JobCancelledError as e:
+            finish_job(job_id, 'CANCELLED', json.dumps(progress, ensure_ascii=False),
+                       f"清理已取消: {e}（已删除的批次不会恢复）", level='warning')
+            logger.info(f"清理任务 {job_id} 已取消: {progress}")
+
+        except Exception as e:
+            finish_job(job_id, 'ERROR', str(e), f"清理过程中出现错误: {e}", level='error')
+            logger.error(f"清理任务 {job_id} 失败: {e}")
+
+        finally:
+            self._finish(job_id)
+
+
+class MessageArchiver(_SingleJobRunner):
+    """空闲会话消息归档任务，同一进程同一时刻只运行一个"""
+
+    def __init__(self):
+        super().__init__("message-archive", "归档")
+        self._last_scheduled_run: Optional[float] = None
+
+    def start(self, days: int, batch_size: int = None, pause_seconds: float = None) -> str:
+        """
+        启动归档任务
+
+        Args:
+            days: 会话多少天没有更新后归档
+            batch_size: 每批归档的消息数，默认从配置获取
+            pause_seconds: 批与批之间的暂停秒数，默认从配置获取
+
+        Returns:
+            归档任务的job_id
+
+        Raises:
+            PurgeAlreadyRunning: 已有归档任务在运行
+        """
+        job_id = self._launch(f"开始归档 {days} 天未更新会话的消息...", self._run, days, batch_size, pause_seconds)
+        logger.info(f"归档任务 {job_id} 已启动: days={days}")
+        return job_id
+
+    def start_scheduled_archive(self) -> Optional[str]:
+        """
+        按配置的归档天数自动归档，距上次自动归档不足ARCHIVE_INTERVAL、未配置归档天数或上一次仍在运行时不执行
+
+        Returns:
+            启动的归档任务job_id，未启动时返回None
+        """
+        if Config.ARCHIVE_AFTER_DAYS <= 0:
+            return None
+        now = time.monotonic()
+        if self._last_scheduled_run is not None and now - self._last_scheduled_run < ARCHIVE_INTERVAL:
+            return None
+        try:
+            job_id = self.start(Config.ARCHIVE_AFTER_DAYS)
+        except PurgeAlreadyRunning:
+            return None
+        self._last_scheduled_run = now
+        return job_id
+
+    def _run(self, job_id: str, token, days: int, batch_size: Optional[int], pause_seconds: Optional[float]):
+        """执行归档，结束后记录任务结果"""
+        from .sessionManager import SessionManager
+
+        progress: Dict[str, int] = {}
+
+        def on_batch(stats: Dict[str, int]):
+            progress.update(stats)
+            append_event(job_id, f"已归档 {stats['sessions']} 个会话的 {stats['messages']} 条消息")
+
+        try:
+            with bind_token(token):
+                progress.update(SessionManager().archive_idle_sessions(days, batch_size, pause_seconds,
+                                                                       on_batch=on_batch))
+            finish_job(job_id, 'COMPLETE', json.dumps(progress, ensure_ascii=False),
+                       f"归档完成：共归档 {progress['sessions']} 个会话的 {progress['messages']} 条消息")
+            logger.info(f"归档任务 {job_id} 完成: {progress}")
+
+        except JobCancelledError as e:
+            finish_job(job_id, 'CANCELLED', json.dumps(progress, ensure_ascii=False),
+                       f"归档已取消: {e}（已归档的消息保留在归档表中）", level='warning')
+            logger.info(f"归档任务 {job_id} 已取消: {progress}")
+
+        except Exception as e:
+            finish_job(job_id, 'ERROR', str(e), f"归档过程中出现错误: {e}", level='error')
+            logger.error(f"归档任务 {job_id} 失败: {e}")
+
+        finally:
+            self._finish(job_id)
+
+
+# 全局清理任务
+session_purge = SessionPurge()
+# 全局归档任务
+message_archiver = MessageArchiver()
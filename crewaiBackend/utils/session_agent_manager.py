@@ -21,13 +21,14 @@ Session ID映射关系：
 """
 
 import threading
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 
 from crewai import Agent, Crew, Process
 from .myLLM import my_llm
 from .ragflow_session_manager import ragflow_session_manager
+from .cancellation import check_cancelled, job_cancellation
 
 logger = logging.getLogger(__name__)
 
@@ -84,11 +85,14 @@ class SessionAgentManager:
     
     def release_agent(self, session_id: str):
         """
-        释放会话Agent，同时删除对应的RAGFlow会话
+        释放会话Agent，同时取消该会话处理中的任务并删除对应的RAGFlow会话
         
         Args:
             session_id: 会话ID
         """
+        # 排队中的任务可能还没有创建Agent，因此无论Agent是否存在都先取消任务
+        job_cancellation.cancel_session(session_id)
+        
         with self.lock:
             if session_id in self.session_agents:
                 agent = self.session_agents[session_id]
@@ -102,6 +106,28 @@ class SessionAgentManager:
             else:
                 logger.warning(f"尝试释放不存在的会话 {session_id}")
     
+    def release_agents(self, session_ids: List[str]) -> int:
+        """
+        批量释放已删除会话的Agent并取消这些会话处理中的任务（旧会话清理时使用）
+        
+        不逐个删除RAGFlow会话，由调用方批量删除；没有Agent的会话直接跳过
+        
+        Args:
+            session_ids: 会话ID列表
+            
+        Returns:
+            释放的Agent数量
+        """
+        for session_id in session_ids:
+            job_cancellation.cancel_session(session_id)
+        
+        with self.lock:
+            released = [session_id for session_id in session_ids
+                        if self.session_agents.pop(session_id, None) is not None]
+        if released:
+            logger.info(f"释放 {len(released)} 个已删除会话的Agent，当前会话数: {len(self.session_agents)}")
+        return len(released)
+    
     def get_session_status(self) -> Dict:
         """获取所有会话状态"""
         with self.lock:
@@ -154,8 +180,9 @@ class SessionAgent:
         self.last_used = datetime.now()
         
         # 创建一个共享的Crew工具实例（用于复用crew.py中的定义）
+        # job_id在每次kickoff时设置为当前作业，事件记录到该作业中，不再写入一个永不结束的共享作业
         from ..crew import CrewtestprojectCrew
-        self._crew_helper = CrewtestprojectCrew(job_id="temp", llm=self.llm)
+        self._crew_helper = CrewtestprojectCrew(job_id=None, llm=self.llm)
         
         # 创建Agent（只创建一次）
         self.agents = self._create_agents()
@@ -179,19 +206,32 @@ class SessionAgent:
             tasks=[]  # 任务在kickoff时动态创建
         )
     
-    def kickoff(self, inputs):
-        """执行任务"""
+    def kickoff(self, inputs, job_id: str = None):
+        """
+        执行任务
+
+        Args:
+            inputs: 任务输入
+            job_id: 当前作业ID，执行期间的事件记录到该作业中；为None时只写日志
+        """
         # 更新使用时间
         self.update_last_used()
         
-        # 动态创建任务
-        tasks = self._create_tasks(inputs)
-        
-        # 更新Crew的任务
-        self.crew.tasks = tasks
-        
-        # 执行任务
-        return self.crew.kickoff()
+        self._crew_helper.job_id = job_id
+        try:
+            # 动态创建任务
+            tasks = self._create_tasks(inputs)
+            
+            # 更新Crew的任务
+            self.crew.tasks = tasks
+            
+            # 知识检索和LLM调用之间检查任务是否已取消
+            check_cancelled()
+            
+            # 执行任务
+            return self.crew.kickoff()
+        finally:
+            self._crew_helper.job_id = None
     
     def _create_tasks(self, inputs):
         """根据输入动态创建任务（从crew.py复用定义）"""
@@ -213,16 +253,14 @@ class SessionAgent:
                 try:
                     from ..utils.sessionManager import SessionManager
                     session_manager = SessionManager()
-                    session = session_manager.get_session(session_id)
+                    session = session_manager.get_session(session_id, include_messages=False)
                     
                     # 检查数据库中的ragflow_session_id是否与内存中的一致
                     db_ragflow_session_id = session.ragflow_session_id if session else None
                     
                     if db_ragflow_session_id != ragflow_session_id:
                         # 更新数据库记录（无论是新建还是不一致都更新）
-                        from ..utils.database import db_manager
-                        query = "UPDATE chat_sessions SET ragflow_session_id = %s WHERE session_id = %s"
-                        db_manager.execute_update(query, (ragflow_session_id, session_id))
+                        session_manager.update_ragflow_session_id(session_id, ragflow_session_id)
                         logger.info(f"[会话:{session_id[:8]}] 已将RAGFlow session_id更新到数据库: {ragflow_session_id[:8]}")
                     
                     # 将 ragflow_session_id 直接传入 inputs，避免 crew.py 中的导入问题
@@ -0,0 +1,259 @@
+"""
+SQLite数据库后端
+实现与DatabaseManager相同的接口，用于MySQL不可用时降级运行，以及不依赖MySQL服务的本地测试和基准测试。
+上层SQL按MySQL语法编写，执行前转换为SQLite方言（见translate_sql）
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterator
+
+from ..config import Config
+from .baseDatabase import BaseDatabase, IntegrityError
+from .migrations import MIGRATIONS
+from .queryStats import TimedCursor, query_stats
+
+logger = logging.getLogger(__name__)
+
+# 与migrations.py迁移后的MySQL结构等价的SQLite表结构
+# seq作为INTEGER PRIMARY KEY自增（SQLite只有rowid列能自增），id改为唯一键
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL DEFAULT 'anonymous',
+        title TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+        context TEXT,
+        ragflow_session_id TEXT DEFAULT NULL,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        user_message_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_user_updated ON chat_sessions (user_id, updated_at);
+    CREATE INDEX IF NOT EXISTS idx_updated_at ON chat_sessions (updated_at);
+    CREATE INDEX IF NOT EXISTS idx_ragflow_session_id ON chat_sessions (ragflow_session_id);
+
+    -- 对应MySQL的ON UPDATE CURRENT_TIMESTAMP
+    CREATE TRIGGER IF NOT EXISTS trg_chat_sessions_updated_at AFTER UPDATE ON chat_sessions
+    WHEN NEW.updated_at IS OLD.updated_at
+    BEGIN
+        UPDATE chat_sessions SET updated_at = datetime('now', 'localtime') WHERE session_id = NEW.session_id;
+    END;
+
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        session_id TEXT NOT NULL REFERENCES chat_sessions(session_id) ON DELETE CASCADE,
+        role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+        content TEXT NOT NULL,
+        timestamp TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_session_seq ON chat_messages (session_id, seq);
+    CREATE INDEX IF NOT EXISTS idx_timestamp ON chat_messages (timestamp);
+
+    CREATE TABLE IF NOT EXISTS chat_messages_archive (
+        seq INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE,
+        session_id TEXT NOT NULL REFERENCES chat_sessions(session_id) ON DELETE CASCADE,
+        role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+        content BLOB NOT NULL,
+        timestamp TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+        archived_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_archive_session_seq ON chat_messages_archive (session_id, seq);
+
+    CREATE TABLE IF NOT EXISTS crew_jobs (
+        job_id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        result TEXT,
+        created_at TIMESTAMP NOT NULL,
+        finished_at TIMESTAMP DEFAULT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_finished_at ON crew_jobs (finished_at);
+
+    CREATE TABLE IF NOT EXISTS crew_job_events (
+        job_id TEXT NOT NULL REFERENCES crew_jobs(job_id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        level TEXT NOT NULL DEFAULT 'info',
+        data TEXT NOT NULL,
+        PRIMARY KEY (job_id, seq)
+    );
+"""
+
+# MySQL方言 -> SQLite方言（按顺序替换）
+_TRANSLATIONS = (
+    (re.compile(r"DATE_SUB\(\s*NOW\(\)\s*,\s*INTERVAL\s+%s\s+DAY\s*\)", re.I), "datetime(NOW(), '-' || %s || ' days')"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bLEFT\(([^,()]+),\s*", re.I), r"substr(\1, 1, "),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"%%"), "%"),
+)
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql: str) -> str:
+    """把MySQL语法的SQL转换为SQLite语法（%s占位符、INSERT IGNORE、LEFT、DATE_SUB）"""
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _convert_timestamp(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+# 时间按本地时间的ISO格式文本保存，声明为TIMESTAMP的列读出时转换回datetime（与pymysql一致）
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+
+class _SQLiteCursor:
+    """把MySQL语法转换为SQLite后执行的游标，execute返回影响的行数（与pymysql一致）"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, args=None) -> int:
+        self._cursor.execute(translate_sql(sql), tuple(args) if args is not None else ())
+        return max(self._cursor.rowcount, 0)
+
+    def executemany(self, sql: str, args) -> int:
+        self._cursor.executemany(translate_sql(sql), [tuple(row) for row in args])
+        return max(self._cursor.rowcount, 0)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SQLiteDatabase(BaseDatabase):
+    """
+    SQLite数据库后端
+
+    只使用一个连接，所有语句在同一把锁下串行执行（SQLite本身同一时刻也只允许一个写入者），
+    事务期间其他线程等待事务结束
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path: str = None):
+        """
+        初始化SQLite数据库并创建表
+
+        Args:
+            path: 数据库文件路径，:memory:表示只保存在进程内存中，默认从配置获取
+        """
+        self.path = path or Config.SQLITE_PATH
+        self._lock = threading.RLock()
+        # isolation_level=None：自动提交，事务由transaction()显式BEGIN/COMMIT
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                           detect_types=sqlite3.PARSE_DECLTYPES)
+        self._connection.create_function("NOW", 0, _now)
+        self._connection.create_function("IF", 3, lambda condition, then, otherwise: then if condition else otherwise,
+                                         deterministic=True)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        if self.path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(SCHEMA)
+        # 表结构与MySQL迁移到最新版本后等价
+        self.schema_version = MIGRATIONS[-1].version
+        logger.info(f"会话存储使用SQLite后端: {self.path}")
+
+    @property
+    def available(self) -> bool:
+        return self._connection is not None
+
+    def _cursor(self) -> TimedCursor:
+        return TimedCursor(_SQLiteCursor(self._connection.cursor()), query_stats)
+
+    def execute_query(self, query: str, params: tuple = None, replica: bool = False) -> Any:
+        """执行SQL查询（没有只读副本，忽略replica）"""
+        try:
+            with self._lock:
+                cursor = self._cursor()
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"执行查询失败: {e}")
+            return []
+
+    def execute_update(self, query: str, params: tuple = None) -> int:
+        """执行SQL更新操作"""
+        try:
+            with self._lock:
+                return self._cursor().execute(query, params)
+        except Exception as e:
+            logger.error(f"执行更新失败: {e}")
+            return 0
+
+    def stream_query(self, query: str, params: tuple = None, fetch_size: int = None) -> Iterator[tuple]:
+        """
+        逐批读取查询结果，每批读取时才持有锁，批与批之间其他线程可以执行语句
+
+        Args:
+            query: SQL查询
+            params: 查询参数
+            fetch_size: 每批读取的行数，默认从配置获取
+        """
+        fetch_size = max(1, fetch_size or Config.EXPORT_FETCH_SIZE)
+        with self._lock:
+            cursor = self._cursor()
+            cursor.execute(query, params)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        以事务执行一组语句，全部成功后提交，出错时回滚并向上抛出异常
+
+        用法与DatabaseManager.transaction相同
+        """
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                yield self._cursor()
+                self._connection.execute("COMMIT")
+            except Exception as e:
+                self._connection.execute("ROLLBACK")
+                if isinstance(e, sqlite3.IntegrityError):
+                    raise IntegrityError(str(e)) from e
+                raise
+
+    def _check_connection(self) -> bool:
+        try:
+            with self._lock:
+                self._connection.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"SQLite检查失败: {e}")
+            return False
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """SQLite后端没有连接池，只返回后端信息"""
+        return {'available': self.available, 'backend': self.backend, 'path': self.path}
+
+    def close(self):
+        """关闭连接"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                logger.info("SQLite连接已关闭")
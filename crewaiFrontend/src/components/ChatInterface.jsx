@@ -3,6 +3,17 @@ import { Send, LogOut, User, Bot, Mic, MicOff, Image, X, Loader2, MessageSquare,
 import { sessionAPI, crewAPI, errorHandler } from '../utils/api'
 import './ChatInterface.css'
 
+// 打开会话时加载的最新消息条数，更早的消息按需向前翻页
+const MESSAGE_PAGE_SIZE = 50
+
+// 将后端消息转换为界面消息格式
+const formatMessages = (messages) => messages.map(msg => ({
+  id: msg.id,
+  type: msg.role === 'user' ? 'user' : 'bot',
+  content: msg.content,
+  timestamp: new Date(msg.timestamp)
+}))
+
 const ChatInterface = ({ user, onLogout }) => {
   const [messages, setMessages] = useState([
     {
@@ -22,6 +33,8 @@ const ChatInterface = ({ user, onLogout }) => {
   const [currentSessionId, setCurrentSessionId] = useState(null)
   const [sessions, setSessions] = useState([])
   const [showSessionList, setShowSessionList] = useState(false)
+  const [olderCursor, setOlderCursor] = useState(null) // 更早消息的翻页游标，null表示没有更早的消息
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false)
   const mediaRecorderRef = useRef(null)
   const audioChunksRef = useRef([])
   const fileInputRef = useRef(null)
@@ -42,6 +55,7 @@ const ChatInterface = ({ user, onLogout }) => {
       setCurrentSessionId(newSession.session_id)
       
       // 重置消息为新对话
+      setOlderCursor(null)
       setMessages([
         {
           id: 1,
@@ -98,17 +112,11 @@ const ChatInterface = ({ user, onLogout }) => {
 
   const loadSession = async (sessionId) => {
     try {
-      const session = await sessionAPI.get(sessionId)
-      
-      // 转换消息格式
-      const formattedMessages = session.messages.map(msg => ({
-        id: msg.id,
-        type: msg.role === 'user' ? 'user' : 'bot',
-        content: msg.content,
-        timestamp: new Date(msg.timestamp)
-      }))
+      // 只加载最新一页消息，长会话也能快速打开
+      const session = await sessionAPI.get(sessionId, { limit: MESSAGE_PAGE_SIZE })
       
-      setMessages(formattedMessages)
+      setMessages(formatMessages(session.messages))
+      setOlderCursor(session.has_more ? session.before_cursor : null)
       setCurrentSessionId(sessionId)
       setShowSessionList(false)
       
@@ -120,6 +128,22 @@ const ChatInterface = ({ user, onLogout }) => {
     }
   }
 
+  // 向前翻页加载更早的消息
+  const loadOlderMessages = async () => {
+    if (!currentSessionId || olderCursor == null || isLoadingOlder) return
+    setIsLoadingOlder(true)
+    try {
+      const session = await sessionAPI.get(currentSessionId, { limit: MESSAGE_PAGE_SIZE, before: olderCursor })
+      setMessages(prev => [...formatMessages(session.messages), ...prev])
+      setOlderCursor(session.has_more ? session.before_cursor : null)
+    } catch (error) {
+      const errorMsg = errorHandler.handleAPIError(error, '加载更早的消息')
+      errorHandler.showError(errorMsg)
+    } finally {
+      setIsLoadingOlder(false)
+    }
+  }
+
   const saveMessageToSession = async (role, content) => {
     if (!currentSessionId) return
     
@@ -143,6 +167,7 @@ const ChatInterface = ({ user, onLogout }) => {
       // 如果删除的是当前会话，重置为初始状态
       if (sessionId === currentSessionId) {
         setCurrentSessionId(null)
+        setOlderCursor(null)
         setMessages([
           {
             id: 1,
@@ -163,9 +188,11 @@ const ChatInterface = ({ user, onLogout }) => {
     }
   }
 
+  // 只在末尾有新消息时滚动到底部，向前翻页加载更早消息时保持位置
+  const lastMessageId = messages.length ? messages[messages.length - 1].id : null
   useEffect(() => {
     scrollToBottom()
-  }, [messages])
+  }, [lastMessageId])
 
   // 组件卸载时清理定时器
   useEffect(() => {
@@ -200,56 +227,90 @@ const ChatInterface = ({ user, onLogout }) => {
       
       setTimeoutId(timeout)
 
-      const interval = setInterval(async () => {
-        try {
-          const response = await crewAPI.getStatus(currentJobId)
-          const { status, result } = response
-          
-          if (status === 'COMPLETE') {
-            setIsLoading(false)
-            setCurrentJobId(null)
-            clearTimeout(timeout) // 清除超时定时器
-            
-            const botMessage = {
-              id: Date.now(),
-              type: 'bot',
-              content: result,
-              timestamp: new Date()
-            }
-            setMessages(prev => [...prev, botMessage])
-            clearInterval(interval)
-            
-            // 保存机器人回复到会话
-            await saveMessageToSession('assistant', result)
-            
-            // 刷新会话列表以更新消息数量
-            await refreshSessionsList()
-          } else if (status === 'ERROR') {
-            setIsLoading(false)
-            setCurrentJobId(null)
-            clearTimeout(timeout) // 清除超时定时器
-            
-            const errorMessage = {
-              id: Date.now(),
-              type: 'bot',
-              content: '抱歉，处理您的请求时出现错误。请稍后重试。',
-              timestamp: new Date()
-            }
-            setMessages(prev => [...prev, errorMessage])
-            clearInterval(interval)
+      let interval = null
+      let finished = false
+
+      // 处理任务结束（SSE推送和轮询共用）
+      const handleJobFinished = async (status, result) => {
+        if (finished) return
+        finished = true
+        setIsLoading(false)
+        setCurrentJobId(null)
+        clearTimeout(timeout) // 清除超时定时器
+        if (interval) clearInterval(interval)
+
+        if (status === 'COMPLETE') {
+          const botMessage = {
+            id: Date.now(),
+            type: 'bot',
+            content: result,
+            timestamp: new Date()
           }
-        } catch (error) {
-          console.error('Error checking job status:', error)
+          setMessages(prev => [...prev, botMessage])
+
+          // 保存机器人回复到会话
+          await saveMessageToSession('assistant', result)
+
+          // 刷新会话列表以更新消息数量
+          await refreshSessionsList()
+        } else if (status === 'CANCELLED') {
+          // 任务已取消（如会话被删除），无需提示
+        } else {
+          const errorMessage = {
+            id: Date.now(),
+            type: 'bot',
+            content: '抱歉，处理您的请求时出现错误。请稍后重试。',
+            timestamp: new Date()
+          }
+          setMessages(prev => [...prev, errorMessage])
         }
-      }, 2000)
+      }
+
+      // 轮询任务状态（SSE不可用或连接失败时的回退方案）
+      const startPolling = () => {
+        if (finished || interval) return
+        interval = setInterval(async () => {
+          try {
+            const response = await crewAPI.getStatus(currentJobId)
+            const { status, result } = response
+
+            if (status === 'COMPLETE' || status === 'ERROR' || status === 'CANCELLED') {
+              await handleJobFinished(status, result)
+            }
+          } catch (error) {
+            console.error('Error checking job status:', error)
+          }
+        }, 2000)
+      }
+
+      // 优先使用SSE实时接收结果
+      const source = crewAPI.streamStatus(currentJobId, {
+        onResult: ({ status, result }) => handleJobFinished(status, result),
+        onError: () => startPolling()
+      })
+      if (!source) {
+        startPolling()
+      }
 
       return () => {
-        clearInterval(interval)
+        finished = true
+        if (source) source.close()
+        if (interval) clearInterval(interval)
         clearTimeout(timeout)
       }
     }
   }, [currentJobId, isLoading])
 
+  // 离开页面时取消进行中的任务，避免后台继续消耗LLM配额
+  useEffect(() => {
+    if (!currentJobId) return
+    const cancelJob = () => {
+      crewAPI.cancel(currentJobId, { keepalive: true }).catch(() => {})
+    }
+    window.addEventListener('pagehide', cancelJob)
+    return () => window.removeEventListener('pagehide', cancelJob)
+  }, [currentJobId])
+
   const handleSubmit = async (e) => {
     e.preventDefault()
     if ((!inputValue.trim() && !uploadedImage && !recordedAudio) || isLoading) return
@@ -293,6 +354,7 @@ const ChatInterface = ({ user, onLogout }) => {
         formData.append('customer_domain', 'example.com')
         formData.append('project_description', finalInputValue || '多模态输入')
         formData.append('session_id', currentSessionId || '')
+        formData.append('user_id', user?.id || '')
 
         // 添加图片文件
         if (uploadedImage) {
@@ -313,7 +375,8 @@ const ChatInterface = ({ user, onLogout }) => {
           additional_context: '',
           customer_domain: 'example.com',
           project_description: finalInputValue,
-          session_id: currentSessionId || ''
+          session_id: currentSessionId || '',
+          user_id: user?.id || ''
         })
       }
 
@@ -329,7 +392,9 @@ const ChatInterface = ({ user, onLogout }) => {
       const errorMessage = {
         id: Date.now(),
         type: 'bot',
-        content: '抱歉，发送消息时出现错误。请稍后重试。',
+        content: error.status === 429
+          ? `当前请求较多，请${error.retryAfter ? ` ${error.retryAfter} 秒后` : '稍后'}重试。`
+          : '抱歉，发送消息时出现错误。请稍后重试。',
         timestamp: new Date()
       }
       setMessages(prev => [...prev, errorMessage])
@@ -581,6 +646,25 @@ const ChatInterface = ({ user, onLogout }) => {
           flexDirection: 'column',
           padding: '0'
         }}>
+          {olderCursor != null && (
+            <button
+              onClick={loadOlderMessages}
+              disabled={isLoadingOlder}
+              style={{
+                alignSelf: 'center',
+                margin: '12px 0',
+                padding: '6px 12px',
+                fontSize: '13px',
+                color: '#6b7280',
+                background: 'none',
+                border: '1px solid #e5e7eb',
+                borderRadius: '6px',
+                cursor: isLoadingOlder ? 'default' : 'pointer'
+              }}
+            >
+              {isLoadingOlder ? '加载中...' : '加载更早的消息'}
+            </button>
+          )}
           {messages.map((message) => (
             <div key={message.id} style={{
               display: 'flex',
@@ -22,7 +22,11 @@ async function apiRequest(endpoint, options = {}) {
     const response = await fetch(url, config);
     
     if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+      const error = new Error(`HTTP error! status: ${response.status}`);
+      error.status = response.status;
+      // 429时服务端通过Retry-After告知建议的重试等待秒数
+      error.retryAfter = Number(response.headers.get('Retry-After')) || null;
+      throw error;
     }
     
     return await response.json();
@@ -44,9 +48,14 @@ export const sessionAPI = {
     });
   },
 
-  // 获取会话详情
-  get: async (session_id) => {
-    return apiRequest(`/api/sessions/${session_id}`);
+  // 获取会话详情；传limit/before/after时按消息seq游标分页
+  get: async (session_id, { limit, before, after } = {}) => {
+    const params = new URLSearchParams();
+    if (limit != null) params.set('limit', limit);
+    if (before != null) params.set('before', before);
+    if (after != null) params.set('after', after);
+    const query = params.toString();
+    return apiRequest(`/api/sessions/${session_id}${query ? `?${query}` : ''}`);
   },
 
   // 删除会话
@@ -64,9 +73,9 @@ export const sessionAPI = {
     });
   },
 
-  // 获取用户所有会话
+  // 获取用户所有会话（摘要：标题、消息数、最后一条消息预览，不含消息正文）
   getUserSessions: async (user_id) => {
-    return apiRequest(`/api/users/${user_id}/sessions`);
+    return apiRequest(`/api/users/${user_id}/sessions?summary=1`);
   },
 
   // 添加消息到会话
@@ -103,6 +112,38 @@ export const crewAPI = {
   getStatus: async (job_id) => {
     return apiRequest(`/api/crew/${job_id}`);
   },
+
+  // 取消任务；keepalive用于页面关闭时仍能把请求发出去
+  cancel: async (job_id, { keepalive = false } = {}) => {
+    return apiRequest(`/api/crew/${job_id}`, {
+      method: 'DELETE',
+      keepalive,
+    });
+  },
+
+  // 订阅任务事件流（SSE），返回EventSource，调用方负责close()
+  // 浏览器不支持EventSource时返回null，调用方应回退到轮询
+  streamStatus: (job_id, { onEvent, onResult, onError } = {}) => {
+    if (typeof window === 'undefined' || !window.EventSource) {
+      return null;
+    }
+
+    const source = new EventSource(`${API_BASE_URL}/api/crew/${job_id}/stream`);
+
+    source.onmessage = (e) => {
+      onEvent && onEvent(JSON.parse(e.data));
+    };
+    source.addEventListener('result', (e) => {
+      source.close();
+      onResult && onResult(JSON.parse(e.data));
+    });
+    source.onerror = (e) => {
+      source.close();
+      onError && onError(e);
+    };
+
+    return source;
+  },
 };
 
 /**
@@ -28,6 +28,14 @@ with mock.patch.dict('os.environ', {
     from crewaiBackend.utils.session_agent_manager import SessionAgentManager
 
 
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    """每个测试前清空进程内会话缓存，避免测试之间通过缓存互相影响"""
+    from crewaiBackend.utils.sessionManager import session_cache
+    session_cache.clear()
+    yield
+
+
 @pytest.fixture(scope="session")
 def test_app():
     """测试Flask应用"""
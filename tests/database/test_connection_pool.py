@@ -0,0 +1,152 @@
+"""
+MySQL连接池测试
+"""
+import threading
+import pytest
+import pymysql
+from unittest.mock import Mock
+from crewaiBackend.utils.database import ConnectionPool, PoolTimeoutError
+
+
+def make_connection():
+    connection = Mock()
+    connection.open = True
+    return connection
+
+
+class TestConnectionPool:
+    """连接池测试类"""
+
+    def test_prefill_and_reuse(self):
+        """测试预先创建最少连接数，归还后复用同一连接"""
+        connect = Mock(side_effect=make_connection)
+        pool = ConnectionPool(connect, min_size=2, max_size=4, timeout=1, health_check_idle=60)
+        assert connect.call_count == 2
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        assert first is second
+        assert connect.call_count == 2
+        first.ping.assert_not_called()  # 刚归还的连接不做ping检查
+        assert pool.get_stats()['idle'] == 2
+
+    def test_checkout_timeout_when_exhausted(self):
+        """测试连接全部借出时等待超时"""
+        pool = ConnectionPool(make_connection, min_size=0, max_size=1, timeout=0.1, health_check_idle=60)
+        held = pool.acquire()
+
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+        assert pool.get_stats()['timeouts'] == 1
+
+        # 归还后等待中的借用方可以拿到连接
+        threading.Timer(0.05, pool.release, args=(held,)).start()
+        assert pool.acquire(timeout=2) is held
+
+    def test_idle_health_check_discards_dead_connection(self):
+        """测试空闲过久的连接借出前ping失败会被丢弃并重建"""
+        pool = ConnectionPool(make_connection, min_size=1, max_size=2, timeout=1, health_check_idle=0)
+        dead = pool.acquire()
+        pool.release(dead)
+        dead.ping.side_effect = pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+        connection = pool.acquire()
+
+        assert connection is not dead
+        dead.close.assert_called_once()
+        assert pool.get_stats()['discarded'] == 1
+
+    def test_connection_error_discards_connection(self):
+        """测试执行中出现连接错误的连接不会放回池中"""
+        pool = ConnectionPool(make_connection, min_size=1, max_size=1, timeout=1, health_check_idle=60)
+
+        with pytest.raises(pymysql.err.InterfaceError):
+            with pool.connection():
+                raise pymysql.err.InterfaceError("connection lost")
+
+        stats = pool.get_stats()
+        assert stats['size'] == 0
+        assert stats['discarded'] == 1
+
+
+class TestStreamQuery:
+    """服务端游标流式查询测试类"""
+
+    def make_manager(self, rows):
+        from crewaiBackend.utils.database import DatabaseManager
+        manager = DatabaseManager.__new__(DatabaseManager)
+        manager.pool = ConnectionPool(make_connection, min_size=1, max_size=1, timeout=1, health_check_idle=60)
+        connection = manager.pool.acquire()
+        cursor = connection.cursor.return_value
+        batches = [rows[i:i + 2] for i in range(0, len(rows), 2)] + [()]
+        cursor.fetchmany.side_effect = batches
+        manager.pool.release(connection)
+        return manager, connection
+
+    def test_streams_in_fetch_batches(self):
+        """测试按fetch_size分批读取并在读完后归还连接"""
+        manager, connection = self.make_manager([(1,), (2,), (3,)])
+
+        assert list(manager.stream_query("SELECT 1", fetch_size=2)) == [(1,), (2,), (3,)]
+        connection.cursor.assert_called_once_with(pymysql.cursors.SSCursor)
+        connection.cursor.return_value.fetchmany.assert_called_with(2)
+        assert manager.pool.get_stats()['idle'] == 1
+
+    def test_abandoned_stream_discards_connection(self):
+        """测试中途停止迭代时直接丢弃连接，不读完剩余结果"""
+        manager, connection = self.make_manager([(1,), (2,), (3,)])
+
+        rows = manager.stream_query("SELECT 1", fetch_size=2)
+        assert next(rows) == (1,)
+        rows.close()
+
+        connection.close.assert_called_once()
+        assert manager.pool.get_stats()['discarded'] == 1
+
+
+class TestLazyConnect:
+    """启动后才连上数据库的测试类"""
+
+    def test_first_lazy_connect_runs_migrations(self):
+        """测试启动时数据库不可用，之后首次建立连接池时先执行迁移并检测ID存储方式"""
+        from unittest.mock import MagicMock, patch
+        from crewaiBackend.utils.database import DatabaseManager
+
+        reachable = [False]
+
+        def open_connection(host=None, port=None):
+            if not reachable[0]:
+                raise pymysql.err.OperationalError(2003, "Can't connect")
+            connection = MagicMock()
+            connection.open = True
+            return connection
+
+        with patch.object(DatabaseManager, '_open_connection', Mock(side_effect=open_connection)), \
+                patch("crewaiBackend.utils.database.run_migrations", return_value=7) as run_migrations, \
+                patch("crewaiBackend.utils.database.uses_binary_ids", return_value=True):
+            manager = DatabaseManager()
+            assert not manager.available and not manager.binary_ids
+            run_migrations.assert_not_called()
+
+            reachable[0] = True
+            manager.execute_query("SELECT 1")
+
+        run_migrations.assert_called_once()
+        assert manager.available
+        assert manager.schema_version == 7 and manager.binary_ids is True
+        manager.close()
+
+    def test_failed_lazy_migration_keeps_database_unavailable(self):
+        """测试重连时迁移失败不启用连接池，避免按错误的ID格式读写"""
+        from unittest.mock import patch
+        from crewaiBackend.utils.database import DatabaseManager
+
+        manager = DatabaseManager.__new__(DatabaseManager)
+        manager.pool = None
+        manager._pool_lock = threading.Lock()
+        with patch.object(DatabaseManager, '_open_connection', Mock(side_effect=make_connection)), \
+                patch("crewaiBackend.utils.database.run_migrations", side_effect=RuntimeError("boom")):
+            assert manager._ensure_pool() is False
@@ -0,0 +1,94 @@
+"""
+消息异步写入（write-behind）测试
+"""
+import threading
+from unittest.mock import MagicMock
+from crewaiBackend.utils.baseDatabase import IntegrityError
+from crewaiBackend.utils.messageWriter import MessageWriteBehind
+
+
+def make_db():
+    db = MagicMock()
+    cursor = db.transaction.return_value.__enter__.return_value
+    return db, cursor
+
+
+class TestMessageWriteBehind:
+    """消息写入器测试类"""
+
+    def test_batches_messages_and_aggregates_counters(self):
+        """测试同一批消息一次多行INSERT，每个会话一条计数更新"""
+        db, cursor = make_db()
+        writer = MessageWriteBehind(db, max_queue_size=100, batch_size=100, flush_interval=0.2)
+
+        assert writer.enqueue("m1", "s1", "user", "第一个问题")
+        assert writer.enqueue("m2", "s1", "assistant", "回答")
+        assert writer.enqueue("m3", "s2", "assistant", "欢迎")
+        writer.shutdown()
+
+        insert_sql, rows = cursor.executemany.call_args_list[0].args
+        assert "INSERT INTO chat_messages" in insert_sql
+        assert [row[0] for row in rows] == ["m1", "m2", "m3"]
+
+        _, updates = cursor.executemany.call_args_list[1].args
+        assert sorted(updates, key=lambda u: u[-1]) == [
+            (1, "第一个问题", 2, 1, "s1"),
+            (0, "", 1, 0, "s2"),
+        ]
+        stats = writer.get_stats()
+        assert stats['written'] == 3
+        assert stats['batches'] == 1
+        assert stats['queue_depth'] == 0
+
+    def test_full_queue_rejects(self):
+        """测试队列已满或已停止时enqueue返回False，由调用方同步写入"""
+        db, _ = make_db()
+        writer = MessageWriteBehind(db, max_queue_size=1, batch_size=1, flush_interval=0)
+        writer._stop_event.set()  # 先让后台线程退出，队列中的消息不再被消费
+        writer._thread.join()
+
+        assert writer.enqueue("m1", "s1", "user", "a")
+        assert not writer.enqueue("m2", "s1", "user", "b")
+        assert writer.get_stats()['rejected'] == 1
+
+        writer._stopped = True
+        assert not writer.enqueue("m3", "s1", "user", "c")
+
+    def test_integrity_error_falls_back_to_single_rows(self):
+        """测试会话已删除导致外键错误时，逐条写入并只丢弃该会话的消息"""
+        db, cursor = make_db()
+
+        def executemany(sql, rows):
+            if "INSERT" in sql and any(row[1] == "deleted" for row in rows):
+                raise IntegrityError("foreign key constraint fails")
+        cursor.executemany.side_effect = executemany
+
+        writer = MessageWriteBehind(db, max_queue_size=10, batch_size=10, flush_interval=0.2)
+        writer.enqueue("m1", "s1", "user", "a")
+        writer.enqueue("m2", "deleted", "user", "b")
+        writer.shutdown()
+
+        stats = writer.get_stats()
+        assert stats['written'] == 1
+        assert stats['dropped'] == 1
+
+    def test_shutdown_with_full_queue_does_not_block(self):
+        """测试队列已满时shutdown不阻塞，并写完队列中的全部消息"""
+        db, cursor = make_db()
+        release = threading.Event()
+        cursor.executemany.side_effect = lambda sql, rows: release.wait(timeout=5)
+        writer = MessageWriteBehind(db, max_queue_size=2, batch_size=1, flush_interval=0)
+
+        writer.enqueue("m1", "s1", "user", "a")  # 后台线程取走后阻塞在写入
+        while writer._queue.qsize():
+            pass
+        assert writer.enqueue("m2", "s1", "user", "b")
+        assert writer.enqueue("m3", "s1", "user", "c")
+
+        stopper = threading.Thread(target=writer.shutdown)
+        stopper.start()
+        release.set()
+        stopper.join(timeout=5)
+
+        assert not stopper.is_alive()
+        assert writer.get_stats()['written'] == 3
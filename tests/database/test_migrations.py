@@ -0,0 +1,182 @@
+"""
+数据库结构迁移测试
+"""
+import pytest
+from unittest.mock import MagicMock
+from crewaiBackend.utils.migrations import MIGRATIONS, Migration, convert_ids_to_binary, run_migrations
+
+
+class FakeCursor:
+    """记录执行的语句，模拟schema_version表和迁移锁"""
+
+    def __init__(self, applied_version=0, lock_result=1):
+        self.statements = []
+        self.applied_version = applied_version
+        self.lock_result = lock_result
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql.strip())
+        if "GET_LOCK" in sql:
+            self._result = (self.lock_result,)
+        elif "FROM schema_version" in sql:
+            self._result = (self.applied_version,)
+        elif "INSERT INTO schema_version" in sql:
+            self.applied_version = params[0]
+        else:
+            self._result = None
+
+    def fetchone(self):
+        return self._result
+
+
+class IdConversionCursor(FakeCursor):
+    """在FakeCursor基础上模拟各表session_id列类型、临时列、外键和非UUID格式的ID数"""
+
+    TABLES = ("chat_sessions", "chat_messages", "chat_messages_archive")
+
+    def __init__(self, data_type="varchar", invalid=0, fail_on=None):
+        super().__init__()
+        self.types = {table: data_type for table in self.TABLES}
+        self.columns = set()
+        self.foreign_keys = {table: [f"{table}_ibfk_1"] for table in self.TABLES[1:]}
+        self.invalid = invalid
+        self.fail_on = fail_on
+
+    def execute(self, sql, params=None):
+        if self.fail_on and self.fail_on in sql:
+            self.fail_on = None
+            raise RuntimeError("connection lost")
+        super().execute(sql, params)
+        table = sql.split()[2] if sql.strip().startswith("ALTER TABLE") else None
+        if "DATA_TYPE" in sql:
+            self._result = (self.types[params[0]],)
+        elif "information_schema.COLUMNS" in sql:
+            self._result = (int(tuple(params) in self.columns),)
+        elif "KEY_COLUMN_USAGE" in sql:
+            self._rows = [(name,) for name in self.foreign_keys[params[0]]]
+        elif "NOT REGEXP" in sql:
+            self._result = (self.invalid,)
+        elif table:
+            for column in ("id_bin", "session_id_bin"):
+                if f"ADD COLUMN {column}" in sql:
+                    self.columns.add((table, column))
+            for name in list(self.foreign_keys.get(table, [])):
+                if f"DROP FOREIGN KEY {name}" in sql:
+                    self.foreign_keys[table].remove(name)
+            if "CHANGE session_id_bin session_id" in sql:
+                self.types[table] = "binary"
+                self.columns = {(t, c) for t, c in self.columns if t != table}
+            if "ADD FOREIGN KEY" in sql:
+                self.foreign_keys[table].append(f"{table}_ibfk_2")
+
+    def fetchall(self):
+        return self._rows
+
+
+def make_connection(cursor):
+    connection = MagicMock()
+    connection.cursor.return_value = cursor
+    return connection
+
+
+class TestMigrations:
+    """迁移执行器测试类"""
+
+    def test_versions_are_sequential(self):
+        """测试迁移版本号从1开始连续递增"""
+        assert [m.version for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+    def test_runs_only_pending_migrations(self):
+        """测试只执行版本号大于已记录版本的迁移，并逐个记录版本"""
+        applied = []
+        migrations = [Migration(v, f"m{v}", lambda cursor, v=v: applied.append(v)) for v in (1, 2, 3)]
+        cursor = FakeCursor(applied_version=1)
+
+        assert run_migrations(make_connection(cursor), migrations) == 3
+        assert applied == [2, 3]
+        assert sum("INSERT INTO schema_version" in sql for sql in cursor.statements) == 2
+        assert "RELEASE_LOCK" in cursor.statements[-1]
+
+    def test_failed_migration_keeps_previous_version(self):
+        """测试迁移失败时已完成的版本保留，且释放迁移锁"""
+        def fail(cursor):
+            raise RuntimeError("boom")
+        migrations = [Migration(1, "ok", lambda cursor: None), Migration(2, "fail", fail)]
+        cursor = FakeCursor()
+
+        with pytest.raises(RuntimeError):
+            run_migrations(make_connection(cursor), migrations)
+        assert cursor.applied_version == 1
+        assert "RELEASE_LOCK" in cursor.statements[-1]
+
+    def test_lock_timeout(self):
+        """测试等待迁移锁超时时不执行任何迁移"""
+        applied = []
+        cursor = FakeCursor(lock_result=0)
+
+        with pytest.raises(RuntimeError):
+            run_migrations(make_connection(cursor), [Migration(1, "m1", lambda c: applied.append(1))])
+        assert applied == []
+
+
+class TestConvertIdsToBinary:
+    """ID转换为BINARY(16)测试类"""
+
+    def test_converts_and_rebuilds_foreign_keys(self):
+        """测试转换时先删除外键，再重建主键、索引和外键，并释放迁移锁"""
+        cursor = IdConversionCursor()
+
+        assert convert_ids_to_binary(make_connection(cursor)) is True
+        statements = " ".join(cursor.statements)
+        assert "DROP FOREIGN KEY chat_messages_ibfk_1" in statements
+        assert "UNHEX(REPLACE(session_id, '-', ''))" in statements
+        assert statements.count("ADD FOREIGN KEY (session_id) REFERENCES chat_sessions(session_id)") == 2
+        assert "RELEASE_LOCK" in cursor.statements[-1]
+        assert set(cursor.types.values()) == {"binary"}
+        assert all(len(names) == 1 for names in cursor.foreign_keys.values())
+
+    def test_resumes_after_partial_failure(self):
+        """测试转换中途失败后重新执行：已转换的表跳过，已新增的列不再新增，缺少的外键补上"""
+        cursor = IdConversionCursor(fail_on="ALTER TABLE chat_messages_archive\n")
+
+        with pytest.raises(RuntimeError):
+            convert_ids_to_binary(make_connection(cursor))
+        assert cursor.types == {"chat_sessions": "binary", "chat_messages": "binary",
+                                "chat_messages_archive": "varchar"}
+        assert ("chat_messages_archive", "id_bin") in cursor.columns
+
+        cursor.statements = []
+        assert convert_ids_to_binary(make_connection(cursor)) is True
+        statements = " ".join(cursor.statements)
+        assert "ALTER TABLE chat_sessions" not in statements
+        assert "ALTER TABLE chat_messages\n" not in statements
+        assert "ADD COLUMN" not in statements
+        assert "FROM chat_messages WHERE" not in statements
+        # chat_messages在失败前已转换但还没有补外键
+        assert "ALTER TABLE chat_messages ADD FOREIGN KEY" in statements
+        assert set(cursor.types.values()) == {"binary"}
+        assert all(len(names) == 1 for names in cursor.foreign_keys.values())
+        assert convert_ids_to_binary(make_connection(cursor)) is False
+
+    def test_already_binary_is_noop(self):
+        """测试三张表都已是BINARY(16)且外键完整时不执行任何结构变更"""
+        cursor = IdConversionCursor(data_type="binary")
+
+        assert convert_ids_to_binary(make_connection(cursor)) is False
+        assert not any(sql.startswith("ALTER") for sql in cursor.statements)
+
+    def test_invalid_ids_abort_before_changes(self):
+        """测试存在非UUID格式的ID时不做任何修改"""
+        cursor = IdConversionCursor(invalid=3)
+
+        with pytest.raises(ValueError):
+            convert_ids_to_binary(make_connection(cursor))
+        assert not any(sql.startswith("ALTER") for sql in cursor.statements)
+        assert "RELEASE_LOCK" in cursor.statements[-1]
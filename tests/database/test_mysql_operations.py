@@ -32,18 +32,23 @@ class TestMySQLOperations:
     
     @patch('crewaiBackend.utils.sessionManager.db_manager')
     def test_add_message_to_database(self, mock_db):
-        """测试在数据库中添加消息"""
-        # 插入消息与更新会话更新时间
+        """测试添加消息在一个事务中完成插入和会话计数更新，不再统计历史消息"""
         mock_db.execute_update.return_value = 1
-        # 第一次查询统计用户消息数返回1，触发标题更新
-        mock_db.execute_query.side_effect = [ [(1,)] ]
+        cursor = mock_db.transaction.return_value.__enter__.return_value
+        cursor.lastrowid = 42
         
         from crewaiBackend.utils.sessionManager import SessionManager
         sm = SessionManager()
         session = sm.create_session(title="Test Session")
         msg = sm.add_message(session.session_id, "user", "Hello")
         assert msg is not None
-        assert mock_db.execute_update.call_count >= 2
+        assert msg.seq == 42
+        mock_db.transaction.assert_called_once()
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        assert len(statements) == 2
+        assert "INSERT INTO chat_messages" in statements[0]
+        assert "user_message_count = user_message_count + %s" in statements[1]
+        mock_db.execute_query.assert_not_called()
     
     @patch('crewaiBackend.utils.sessionManager.db_manager')
     def test_get_session_from_database(self, mock_db):
@@ -106,3 +111,46 @@ class TestMySQLOperations:
         sm = SessionManager()
         with pytest.raises(Exception):
             sm.create_session(title="Test Session")
+    
+    @patch('crewaiBackend.utils.sessionManager.db_manager')
+    def test_import_messages_in_batches(self, mock_db):
+        """测试批量导入按batch_size分批，每批一次executemany多行插入"""
+        cursor = mock_db.transaction.return_value.__enter__.return_value
+        
+        from crewaiBackend.utils.sessionManager import SessionManager
+        sm = SessionManager()
+        records = ({"session_id": "s1", "role": "user", "content": f"m{i}"} for i in range(5))
+        assert sm.import_messages(records, batch_size=2) == 5
+        assert mock_db.transaction.call_count == 3
+        insert_batches = [call.args[1] for call in cursor.executemany.call_args_list
+                          if "INSERT INTO chat_messages" in call.args[0]]
+        assert [len(rows) for rows in insert_batches] == [2, 2, 1]
+    
+    @patch('crewaiBackend.utils.sessionManager.db_manager')
+    def test_import_messages_reports_progress_on_error(self, mock_db):
+        """测试导入遇到无效记录时报告已提交的条数"""
+        from crewaiBackend.utils.sessionManager import MessageImportError, SessionManager
+        sm = SessionManager()
+        records = [
+            {"session_id": "s1", "role": "user", "content": "a"},
+            {"session_id": "s1", "role": "system", "content": "b"},
+        ]
+        with pytest.raises(MessageImportError) as exc_info:
+            sm.import_messages(records, batch_size=1)
+        assert exc_info.value.imported == 1
+    
+    @patch('crewaiBackend.utils.sessionManager.db_manager')
+    def test_export_messages_streams_rows(self, mock_db):
+        """测试导出通过服务端游标逐行读取，输出格式可直接导入"""
+        now = __import__('datetime').datetime.now()
+        # 先导出归档表（这里为空），再导出热表
+        mock_db.stream_query.side_effect = [iter([]), iter([("m1", "s1", "user", "Hello", now, 7)])]
+        
+        from crewaiBackend.utils.sessionManager import SessionManager
+        sm = SessionManager()
+        exported = list(sm.export_messages(user_id="u1"))
+        assert exported == [{"id": "m1", "session_id": "s1", "role": "user", "content": "Hello",
+                             "timestamp": now.isoformat(), "seq": 7}]
+        query, params = mock_db.stream_query.call_args.args
+        assert "s.user_id = %s" in query
+        assert params == ("u1",)
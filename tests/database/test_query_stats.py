@@ -0,0 +1,83 @@
+"""
+SQL语句耗时统计测试
+"""
+import logging
+import pytest
+from unittest.mock import Mock, patch
+from crewaiBackend.utils.queryStats import OVERFLOW_FINGERPRINT, QueryStats, TimedCursor, fingerprint
+
+
+class TestFingerprint:
+    """语句指纹测试类"""
+
+    def test_literals_and_lists_are_normalized(self):
+        """测试字面量、占位符、IN列表和多行VALUES归一化为同一指纹"""
+        assert fingerprint("SELECT *  FROM t\n WHERE id IN (%s, %s, %s) AND n = 5 AND s = 'x'") == \
+            "SELECT * FROM t WHERE id IN (...) AND n = ? AND s = ?"
+        assert fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)") == \
+            fingerprint("INSERT INTO t (a, b) VALUES (1, 'a')")
+
+
+class TestQueryStats:
+    """语句统计测试类"""
+
+    def test_aggregates_by_fingerprint(self):
+        """测试同一指纹的语句合并统计，并按总耗时排序"""
+        stats = QueryStats(slow_query_ms=0, max_fingerprints=10)
+        stats.record("SELECT * FROM a WHERE id = %s", 2.0, rows=1)
+        stats.record("SELECT * FROM a WHERE id = 7", 40.0, rows=1)
+        stats.record("UPDATE b SET x = %s", 1.0, rows=3)
+
+        result = stats.get_stats()
+        top = result['queries'][0]
+        assert result['total_calls'] == 3
+        assert top['query'] == "SELECT * FROM a WHERE id = ?"
+        assert top['calls'] == 2
+        assert top['rows'] == 2
+        assert top['max_ms'] == 40.0
+        assert top['histogram']['le_5ms'] == 1 and top['histogram']['le_50ms'] == 1
+        assert top['p99_ms'] == 40.0
+        assert stats.get_stats(sort='rows')['queries'][0]['query'] == "UPDATE b SET x = ?"
+
+    def test_slow_query_logs_caller(self, caplog):
+        """测试超过阈值的语句记录日志并带上调用位置"""
+        stats = QueryStats(slow_query_ms=100, max_fingerprints=10)
+        with caplog.at_level(logging.WARNING, logger="crewaiBackend.utils.queryStats"):
+            stats.record("SELECT 1", 5.0)
+            stats.record("SELECT SLEEP(1)", 150.0)
+
+        assert len(caplog.records) == 1
+        assert "test_query_stats.py" in caplog.records[0].getMessage()
+        assert stats.get_stats()['queries'][0]['slow'] == 1
+
+    def test_sqlite_backend_reports_caller(self, caplog):
+        """测试SQLite后端执行的语句同样跳过数据库封装，记录到调用方"""
+        from crewaiBackend.utils.sqliteDatabase import SQLiteDatabase
+
+        db = SQLiteDatabase(":memory:")
+        stats = QueryStats(slow_query_ms=0.000001, max_fingerprints=10)
+        with patch("crewaiBackend.utils.sqliteDatabase.query_stats", stats), \
+                caplog.at_level(logging.WARNING, logger="crewaiBackend.utils.queryStats"):
+            db.execute_query("SELECT 1")
+        db.close()
+
+        slow_logs = [r.getMessage() for r in caplog.records if r.name == "crewaiBackend.utils.queryStats"]
+        assert slow_logs and "test_query_stats.py" in slow_logs[0]
+
+    def test_fingerprint_limit(self):
+        """测试超过指纹上限后新语句计入溢出指纹"""
+        stats = QueryStats(slow_query_ms=0, max_fingerprints=1)
+        stats.record("SELECT a FROM t", 1.0)
+        stats.record("SELECT b FROM t", 1.0)
+
+        assert {q['query'] for q in stats.get_stats()['queries']} == {"SELECT a FROM t", OVERFLOW_FINGERPRINT}
+
+    def test_timed_cursor_records_errors(self):
+        """测试包装游标记录执行失败的语句并继续抛出异常"""
+        stats = QueryStats(slow_query_ms=0, max_fingerprints=10)
+        raw = Mock()
+        raw.execute.side_effect = RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            TimedCursor(raw, stats).execute("DELETE FROM t WHERE id = %s", (1,))
+        assert stats.get_stats()['queries'][0]['errors'] == 1
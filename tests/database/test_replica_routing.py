@@ -0,0 +1,152 @@
+"""
+只读副本读写路由测试
+"""
+import threading
+from unittest.mock import MagicMock, Mock, patch
+
+import pymysql
+import pytest
+from crewaiBackend.config import Config
+from crewaiBackend.utils.database import DatabaseManager, parse_replica_hosts
+from crewaiBackend.utils.sessionManager import RecentWrites, SessionManager
+
+
+def make_connection(host=None, port=None):
+    """查询结果为所连接的主机名的假连接"""
+    connection = Mock()
+    connection.open = True
+    connection.cursor.return_value.fetchall.return_value = [(host or "primary",)]
+    return connection
+
+
+@pytest.fixture
+def manager():
+    """配置两个副本的数据库管理器，不连接真实MySQL"""
+    with patch.object(Config, 'MYSQL_REPLICA_HOSTS', "r1, r2:3310"), \
+            patch.object(DatabaseManager, '_open_connection', Mock(side_effect=make_connection)), \
+            patch.object(DatabaseManager, '_migrate'):
+        manager = DatabaseManager()
+    yield manager
+    manager.close()
+
+
+def query_host(manager, replica=True):
+    return manager.execute_query("SELECT 1", replica=replica)[0][0]
+
+
+class TestReplicaRouting:
+    """副本路由测试类"""
+
+    def test_parse_hosts(self):
+        """测试解析副本地址，端口缺省时使用主库端口"""
+        assert parse_replica_hosts(" a , b:3310,") == [("a", Config.MYSQL_PORT), ("b", 3310)]
+        assert parse_replica_hosts("") == []
+
+    def test_only_marked_reads_use_replicas(self, manager):
+        """测试只有replica=True的读取发往副本，同一线程固定使用一个副本，不同线程分散到各副本"""
+        assert query_host(manager, replica=False) == "primary"
+        first = query_host(manager)
+        assert first in ("r1", "r2")
+        assert query_host(manager) == first
+
+        hosts = []
+        thread = threading.Thread(target=lambda: hosts.append(query_host(manager)))
+        thread.start()
+        thread.join()
+        assert hosts[0] in ("r1", "r2") and hosts[0] != first
+
+        assert manager.execute_update("UPDATE t SET a = 1") is not None
+        assert manager.pool.get_stats()['created'] == manager.pool.min_size  # 写入只使用主库连接
+
+    def test_failed_replica_falls_back_to_primary(self, manager):
+        """测试副本查询失败时本次读取回到主库，并在重试间隔内跳过该副本"""
+        for replica in manager.replicas:
+            replica.pool._connect = Mock(side_effect=pymysql.err.OperationalError(2003, "Can't connect"))
+
+        # 前两次读取分别尝试两个副本，第三次已没有可用副本，不再尝试连接
+        for _ in range(3):
+            assert query_host(manager) == "primary"
+
+        stats = manager.get_pool_stats()
+        assert [replica['healthy'] for replica in stats['replicas']] == [False, False]
+        assert [replica['failures'] for replica in stats['replicas']] == [1, 1]
+        assert stats['replica_fallbacks'] == 3
+
+    def test_statement_error_does_not_mark_replica_failed(self, manager):
+        """测试语句本身出错时本次读取回到主库，但不把副本标记为不可用"""
+        replica = manager._next_replica()
+        connection = replica.pool.acquire()
+        replica.pool.release(connection)
+        connection.cursor.return_value.execute.side_effect = pymysql.err.ProgrammingError(1146, "Table doesn't exist")
+
+        assert query_host(manager) == "primary"
+
+        stats = manager.get_pool_stats()
+        assert all(replica['healthy'] for replica in stats['replicas'])
+        assert [replica['failures'] for replica in stats['replicas']] == [0, 0]
+        assert stats['replica_fallbacks'] == 1
+
+
+class TestRecentWrites:
+    """写入后固定主库读取测试类"""
+
+    def test_pins_written_session_and_user(self):
+        """测试写入后该会话和用户的读取固定走主库，用户未知的写入固定所有会话列表"""
+        writes = RecentWrites(pin_seconds=60)
+        assert not writes.user_pinned(None)
+
+        writes.mark("s1", "u1")
+        assert writes.session_pinned("s1")
+        assert not writes.session_pinned("s2")
+        assert writes.user_pinned("u1") and writes.user_pinned(None)
+        assert not writes.user_pinned("u2")
+
+        writes.mark("s2")
+        assert writes.user_pinned("u2")
+
+    def test_expired_writes_are_dropped(self):
+        """测试固定时间过后恢复使用副本"""
+        writes = RecentWrites(pin_seconds=60)
+        with patch("crewaiBackend.utils.sessionManager.time.monotonic", return_value=1000.0):
+            writes.mark("s1", "u1")
+        with patch("crewaiBackend.utils.sessionManager.time.monotonic", return_value=1061.0):
+            assert not writes.session_pinned("s1")
+            assert not writes.user_pinned(None)
+            writes.mark("s2", "u2")
+        assert list(writes._expires) == [('user', 'u2'), ('session', 's2')]
+
+    def test_session_manager_reads_after_write_use_primary(self):
+        """测试刚添加消息的会话读取历史时不使用副本，其他会话可以使用"""
+        session_manager = SessionManager()
+        session_manager.db = MagicMock()
+        session_manager.db.db_id.side_effect = lambda value: value
+        session_manager.db.execute_query.return_value = []
+        writes = RecentWrites(pin_seconds=60)
+
+        with patch("crewaiBackend.utils.sessionManager.recent_writes", writes), \
+                patch("crewaiBackend.utils.sessionManager.get_message_writer", return_value=None):
+            session_manager.add_message("s1", "user", "hi")
+            session_manager.get_messages("s1", limit=10)
+            assert session_manager.db.execute_query.call_args.kwargs['replica'] is False
+
+            session_manager.get_messages("s2", limit=10)
+            assert session_manager.db.execute_query.call_args.kwargs['replica'] is True
+
+    def test_session_reads_use_replica_unless_cached_or_pinned(self):
+        """测试不含消息的会话读取在未固定主库时走副本；要回填缓存的完整读取始终走主库"""
+        session_manager = SessionManager()
+        session_manager.db = MagicMock()
+        session_manager.db.db_id.side_effect = lambda value: value
+        session_manager.db.execute_query.return_value = []
+        writes = RecentWrites(pin_seconds=60)
+
+        with patch("crewaiBackend.utils.sessionManager.recent_writes", writes):
+            session_manager.get_session("s1", include_messages=False)
+            assert session_manager.db.execute_query.call_args.kwargs['replica'] is True
+
+            session_manager.get_session("s1")
+            assert session_manager.db.execute_query.call_args.kwargs['replica'] is False
+
+            writes.mark("s1")
+            session_manager.get_session("s1", include_messages=False)
+            assert session_manager.db.execute_query.call_args.kwargs['replica'] is False
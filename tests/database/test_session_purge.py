@@ -0,0 +1,188 @@
+"""
+旧会话分批清理测试
+使用进程内SQLite执行真实的删除语句
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from crewaiBackend.config import Config
+from crewaiBackend.utils.cancellation import JobCancelledError
+from crewaiBackend.utils.jobManager import wait_for_job_update
+from crewaiBackend.utils.ragflow_session_manager import RAGFlowSessionManager
+from crewaiBackend.utils.session_agent_manager import SessionAgentManager
+from crewaiBackend.utils.sessionManager import SessionManager
+from crewaiBackend.utils.sessionPurge import MessageArchiver, PurgeAlreadyRunning
+from crewaiBackend.utils.sqliteDatabase import SQLiteDatabase
+
+
+@pytest.fixture
+def sqlite_manager():
+    """使用独立内存SQLite的会话管理器"""
+    db = SQLiteDatabase(":memory:")
+    manager = SessionManager()
+    manager.db = db
+    yield manager
+    db.close()
+
+
+def make_session(manager, messages=0, age_days=0, ragflow_session_id=None):
+    """创建会话并添加消息，把更新时间改为age_days天前"""
+    session = manager.create_session(user_id="u1")
+    for i in range(messages):
+        manager.add_message(session.session_id, "user", f"m{i}")
+    manager.db.execute_update(
+        "UPDATE chat_sessions SET updated_at = %s, ragflow_session_id = %s WHERE session_id = %s",
+        (datetime.now() - timedelta(days=age_days), ragflow_session_id, session.session_id)
+    )
+    return session.session_id
+
+
+def count_rows(manager, table):
+    return manager.db.execute_query(f"SELECT COUNT(*) FROM {table}")[0][0]
+
+
+class TestPurgeOldSessions:
+    """分批清理测试类"""
+
+    def test_purges_in_batches_and_keeps_recent_sessions(self, sqlite_manager):
+        """测试按行数预算分批删除旧会话，每批回调实际删除的会话，近期会话保留"""
+        old_ids = [make_session(sqlite_manager, messages=2, age_days=40, ragflow_session_id=f"rf{i}")
+                   for i in range(4)]
+        recent_id = make_session(sqlite_manager, messages=1, age_days=1)
+        batches = []
+
+        stats = sqlite_manager.purge_old_sessions(
+            30, batch_size=6, pause_seconds=0, on_batch=lambda deleted, _: batches.append(deleted)
+        )
+
+        # 每个会话占3行（会话+2条消息），每批6行即2个会话
+        assert stats == {'sessions': 4, 'messages': 8, 'batches': 2}
+        assert [len(batch) for batch in batches] == [2, 2]
+        assert sorted(sid for batch in batches for sid, _ in batch) == sorted(old_ids)
+        assert {rf for batch in batches for _, rf in batch} == {"rf0", "rf1", "rf2", "rf3"}
+        assert count_rows(sqlite_manager, "chat_sessions") == 1
+        assert count_rows(sqlite_manager, "chat_messages") == 1
+        assert sqlite_manager.db.execute_query("SELECT session_id FROM chat_sessions")[0][0] == recent_id
+
+    def test_large_session_messages_are_deleted_in_chunks(self, sqlite_manager):
+        """测试消息数超过每批行数的会话先分段删除消息"""
+        make_session(sqlite_manager, messages=7, age_days=40)
+        executed = []
+        original_transaction = sqlite_manager.db.transaction
+
+        def recording_transaction():
+            executed.append(1)
+            return original_transaction()
+
+        sqlite_manager.db.transaction = recording_transaction
+        stats = sqlite_manager.purge_old_sessions(30, batch_size=3, pause_seconds=0)
+
+        assert stats == {'sessions': 1, 'messages': 7, 'batches': 1}
+        # 两段各3条消息，最后一个事务删除会话和剩余的1条消息
+        assert len(executed) == 3
+        assert count_rows(sqlite_manager, "chat_messages") == 0
+
+    def test_archived_messages_are_counted_and_deleted(self, sqlite_manager):
+        """测试已归档的消息计入删除数，大会话的归档消息同样分段删除"""
+        make_session(sqlite_manager, messages=2, age_days=40)
+        make_session(sqlite_manager, messages=5, age_days=40)
+        sqlite_manager.archive_idle_sessions(30, pause_seconds=0)
+        assert count_rows(sqlite_manager, "chat_messages_archive") == 7
+
+        stats = sqlite_manager.purge_old_sessions(30, batch_size=3, pause_seconds=0)
+
+        assert stats['sessions'] == 2 and stats['messages'] == 7
+        assert count_rows(sqlite_manager, "chat_messages_archive") == 0
+
+    def test_cutoff_uses_database_clock(self):
+        """测试截止时间由数据库计算，不使用应用服务器的时钟"""
+        manager = SessionManager()
+        manager.db = MagicMock()
+        manager.db.execute_query.side_effect = [[("2024-01-01 00:00:00",)], []]
+
+        manager.purge_old_sessions(30, pause_seconds=0)
+
+        cutoff_query, params = manager.db.execute_query.call_args_list[0].args
+        assert "DATE_SUB(NOW(), INTERVAL %s DAY)" in cutoff_query and params == (30,)
+        assert manager.db.execute_query.call_args_list[1].args[1][0] == "2024-01-01 00:00:00"
+
+
+class TestRAGFlowBulkDelete:
+    """RAGFlow会话批量删除测试类"""
+
+    def test_deletes_in_chunks_and_drops_mappings(self):
+        """测试按chunk_size批量调用删除接口，映射中的ID用于补全缺失的RAGFlow会话ID"""
+        manager = object.__new__(RAGFlowSessionManager)
+        manager.session_mapping = {"a": "rf-a", "b": "rf-b", "keep": "rf-keep"}
+        manager.ragflow_client = MagicMock()
+
+        deleted = manager.delete_sessions_bulk([("a", None), ("b", "rf-b"), ("c", "rf-c")], chunk_size=2)
+
+        assert deleted == 3
+        calls = manager.ragflow_client.delete_sessions.call_args_list
+        assert [call.kwargs['session_ids'] for call in calls] == [["rf-a", "rf-b"], ["rf-c"]]
+        assert manager.session_mapping == {"keep": "rf-keep"}
+
+    def test_cancellation_is_not_swallowed(self):
+        """测试删除过程中所属任务被取消时向上抛出JobCancelledError"""
+        manager = object.__new__(RAGFlowSessionManager)
+        manager.session_mapping = {}
+        manager.ragflow_client = MagicMock()
+        manager.ragflow_client.delete_sessions.side_effect = JobCancelledError("已取消")
+
+        with pytest.raises(JobCancelledError):
+            manager.delete_sessions_bulk([("a", "rf-a")])
+
+
+class TestReleaseAgents:
+    """已删除会话的Agent释放测试类"""
+
+    def test_releases_only_existing_agents_without_ragflow_calls(self):
+        """测试只释放存在的Agent，不逐个删除RAGFlow会话"""
+        manager = object.__new__(SessionAgentManager)
+        manager.lock = threading.Lock()
+        agent = MagicMock()
+        manager.session_agents = {"a": agent, "keep": MagicMock()}
+
+        assert manager.release_agents(["a", "missing"]) == 1
+        assert list(manager.session_agents) == ["keep"]
+        agent.cleanup.assert_not_called()
+
+
+class TestMessageArchiver:
+    """后台归档任务测试类"""
+
+    def test_scheduled_archive_runs_in_background_without_overlap(self):
+        """测试定时归档在后台线程中以任务运行，立即返回，运行期间不会重复启动"""
+        release = threading.Event()
+
+        def archive(manager, days, batch_size, pause_seconds, on_batch=None):
+            release.wait(timeout=5)
+            stats = {'sessions': 1, 'messages': 4, 'raw_bytes': 40, 'stored_bytes': 20}
+            on_batch(dict(stats))
+            return stats
+
+        archiver = MessageArchiver()
+        with patch.object(Config, 'ARCHIVE_AFTER_DAYS', 30), \
+                patch.object(SessionManager, 'archive_idle_sessions', archive):
+            job_id = archiver.start_scheduled_archive()
+            assert job_id is not None and archiver.current_job_id == job_id
+            # 间隔未到时不再启动；手动启动时报告正在运行的任务
+            assert archiver.start_scheduled_archive() is None
+            with pytest.raises(PurgeAlreadyRunning) as error:
+                archiver.start(30)
+            assert error.value.job_id == job_id
+
+            release.set()
+            _, status, result = wait_for_job_update(job_id, since=2, timeout=5)
+
+        assert status == 'COMPLETE'
+        assert '"messages": 4' in result
+        # 记录结果之后才释放运行标记
+        deadline = time.monotonic() + 5
+        while archiver.current_job_id is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert archiver.current_job_id is None
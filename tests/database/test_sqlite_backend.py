@@ -0,0 +1,181 @@
+"""
+SQLite后端测试
+使用进程内SQLite执行SessionManager的真实SQL，覆盖MySQL方言转换
+"""
+from unittest.mock import patch
+
+import pytest
+from crewaiBackend.utils.baseDatabase import IntegrityError
+from crewaiBackend.utils.messageWriter import MessageWriteBehind
+from crewaiBackend.utils.sessionManager import SessionManager
+from crewaiBackend.utils.sqliteDatabase import SQLiteDatabase, translate_sql
+
+
+@pytest.fixture
+def sqlite_manager():
+    """使用独立内存SQLite的会话管理器"""
+    db = SQLiteDatabase(":memory:")
+    manager = SessionManager()
+    manager.db = db
+    yield manager
+    db.close()
+
+
+class TestTranslateSQL:
+    """SQL方言转换测试类"""
+
+    def test_mysql_syntax_is_translated(self):
+        """测试占位符、INSERT IGNORE、LEFT和DATE_SUB转换为SQLite语法"""
+        assert translate_sql("INSERT IGNORE INTO t VALUES (%s)") == "INSERT OR IGNORE INTO t VALUES (?)"
+        assert translate_sql("SELECT LEFT(m.content, %s) FROM m") == "SELECT substr(m.content, 1, ?) FROM m"
+        assert translate_sql("WHERE updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)") == \
+            "WHERE updated_at < datetime(NOW(), '-' || ? || ' days')"
+
+
+class TestSQLiteSessionStorage:
+    """SQLite会话存储测试类"""
+
+    def test_session_and_message_roundtrip(self, sqlite_manager):
+        """测试创建会话、添加消息后能读回消息、计数和首条用户消息生成的标题"""
+        session = sqlite_manager.create_session(user_id="u1", title="新会话")
+        first = sqlite_manager.add_message(session.session_id, "assistant", "欢迎")
+        second = sqlite_manager.add_message(session.session_id, "user", "这款手机多少钱")
+
+        assert second.seq > first.seq
+        loaded = SessionManager._load_session(sqlite_manager, session.session_id, True)
+        assert [m.content for m in loaded.messages] == ["欢迎", "这款手机多少钱"]
+        assert loaded.title == "这款手机多少钱"
+        assert loaded.to_dict()['message_count'] == 2
+
+        summaries = sqlite_manager.get_session_summaries("u1")
+        assert summaries[0]['last_message']['preview'] == "这款手机多少钱"
+
+    def test_message_paging(self, sqlite_manager):
+        """测试按seq游标分页"""
+        session = sqlite_manager.create_session(user_id="u1")
+        seqs = [sqlite_manager.add_message(session.session_id, "user", f"m{i}").seq for i in range(5)]
+
+        latest, has_more = sqlite_manager.get_messages(session.session_id, limit=2)
+        assert [m.seq for m in latest] == seqs[-2:]
+        assert has_more is True
+        newer, _ = sqlite_manager.get_messages(session.session_id, after=seqs[2])
+        assert [m.content for m in newer] == ["m3", "m4"]
+
+    def test_delete_cascades_and_import_export(self, sqlite_manager):
+        """测试导出的消息可以导入到另一个会话，删除会话时消息一并删除"""
+        source = sqlite_manager.create_session(user_id="u1")
+        target = sqlite_manager.create_session(user_id="u2")
+        sqlite_manager.add_message(source.session_id, "user", "问题")
+        sqlite_manager.add_message(source.session_id, "assistant", "回答")
+
+        records = [dict(r, id=None, session_id=target.session_id)
+                   for r in sqlite_manager.export_messages(session_id=source.session_id)]
+        assert sqlite_manager.import_messages(records) == 2
+        assert [s['message_count'] for s in sqlite_manager.get_session_summaries("u2")] == [2]
+
+        assert sqlite_manager.delete_session(source.session_id) is True
+        assert list(sqlite_manager.export_messages(session_id=source.session_id)) == []
+        assert len(list(sqlite_manager.export_messages())) == 2
+
+    def test_transaction_rolls_back(self, sqlite_manager):
+        """测试事务中出错时回滚已执行的语句"""
+        session = sqlite_manager.create_session(user_id="u1")
+        with pytest.raises(IntegrityError):
+            with sqlite_manager.db.transaction() as cursor:
+                cursor.execute("UPDATE chat_sessions SET title = %s WHERE session_id = %s",
+                               ("改名", session.session_id))
+                cursor.execute("INSERT INTO chat_messages (id, session_id, role, content) VALUES (%s, %s, %s, %s)",
+                               ("m1", "不存在的会话", "user", "x"))
+
+        rows = sqlite_manager.db.execute_query("SELECT title FROM chat_sessions WHERE session_id = %s",
+                                               (session.session_id,))
+        assert rows[0][0] != "改名"
+
+    def test_write_behind_skips_missing_sessions(self, sqlite_manager):
+        """测试write-behind模式下会话不存在时add_message返回None，已删除会话的消息被逐条跳过"""
+        session = sqlite_manager.create_session(user_id="u1")
+        deleted = sqlite_manager.create_session(user_id="u1")
+        writer = MessageWriteBehind(sqlite_manager.db, max_queue_size=10, batch_size=10, flush_interval=0.2)
+
+        with patch("crewaiBackend.utils.sessionManager.get_message_writer", return_value=writer):
+            assert sqlite_manager.add_message("不存在的会话", "user", "x") is None
+            assert sqlite_manager.add_message(session.session_id, "user", "a") is not None
+            assert sqlite_manager.add_message(deleted.session_id, "user", "b") is not None
+        sqlite_manager.db.execute_update("DELETE FROM chat_sessions WHERE session_id = %s", (deleted.session_id,))
+        writer.shutdown()
+
+        stats = writer.get_stats()
+        assert stats['written'] == 1 and stats['dropped'] == 1
+        assert [m['content'] for m in sqlite_manager.export_messages()] == ["a"]
+
+
+class TestMessageArchive:
+    """消息归档测试类"""
+
+    def _make_idle_session(self, manager, count):
+        """创建有count条消息、40天前更新的会话"""
+        from datetime import datetime, timedelta
+        session = manager.create_session(user_id="u1")
+        for i in range(count):
+            manager.add_message(session.session_id, "user" if i % 2 else "assistant", f"消息{i} " * 20)
+        manager.db.execute_update("UPDATE chat_sessions SET updated_at = %s WHERE session_id = %s",
+                                  (datetime.now() - timedelta(days=40), session.session_id))
+        return session.session_id
+
+    def test_archive_moves_messages_and_reads_stay_transparent(self, sqlite_manager):
+        """测试归档后热表为空，读取会话、分页、预览和导出的结果与归档前相同"""
+        session_id = self._make_idle_session(sqlite_manager, 5)
+        before = SessionManager._load_session(sqlite_manager, session_id, True).to_dict()['messages']
+
+        stats = sqlite_manager.archive_idle_sessions(30, batch_size=2, pause_seconds=0)
+
+        assert stats['sessions'] == 1 and stats['messages'] == 5
+        assert stats['stored_bytes'] < stats['raw_bytes']
+        assert sqlite_manager.db.execute_query("SELECT COUNT(*) FROM chat_messages")[0][0] == 0
+        assert SessionManager._load_session(sqlite_manager, session_id, True).to_dict()['messages'] == before
+
+        page, has_more = sqlite_manager.get_messages(session_id, limit=2)
+        assert [m.content for m in page] == [m['content'] for m in before[-2:]] and has_more
+        summary = sqlite_manager.get_session_summaries("u1")[0]
+        assert summary['last_message']['preview'] == before[-1]['content'][:100]
+        assert [m['content'] for m in sqlite_manager.export_messages(session_id=session_id)] == \
+            [m['content'] for m in before]
+
+    def test_new_messages_merge_with_archived(self, sqlite_manager):
+        """测试归档后的新消息写入热表，读取时排在归档消息之后；删除会话时归档消息一起删除"""
+        session_id = self._make_idle_session(sqlite_manager, 3)
+        sqlite_manager.archive_idle_sessions(30, pause_seconds=0)
+        sqlite_manager.add_message(session_id, "user", "新消息")
+
+        loaded = SessionManager._load_session(sqlite_manager, session_id, True)
+        assert len(loaded.messages) == 4 and loaded.messages[-1].content == "新消息"
+        older, has_more = sqlite_manager.get_messages(session_id, before=loaded.messages[-1].seq, limit=10)
+        assert len(older) == 3 and not has_more
+        # 会话刚有更新，不再归档
+        assert sqlite_manager.archive_idle_sessions(30, pause_seconds=0)['messages'] == 0
+
+        assert sqlite_manager.delete_session(session_id)
+        assert sqlite_manager.db.execute_query("SELECT COUNT(*) FROM chat_messages_archive")[0][0] == 0
+
+
+class TestBinaryIds:
+    """BINARY(16)存储ID测试类（SQLite列类型宽松，可直接保存16字节的ID）"""
+
+    def test_ids_are_stored_as_bytes_and_returned_as_strings(self, sqlite_manager):
+        """测试开启binary_ids后数据库中保存16字节ID，读出的会话、消息、摘要和导出仍是字符串ID"""
+        sqlite_manager.db.binary_ids = True
+        session = sqlite_manager.create_session(user_id="u1")
+        message = sqlite_manager.add_message(session.session_id, "user", "你好")
+
+        stored = sqlite_manager.db.execute_query("SELECT session_id FROM chat_messages")[0][0]
+        assert isinstance(stored, bytes) and len(stored) == 16
+
+        loaded = SessionManager._load_session(sqlite_manager, session.session_id, True)
+        assert loaded.session_id == session.session_id
+        assert [m.id for m in loaded.messages] == [message.id]
+        assert sqlite_manager.get_session_summaries("u1")[0]['session_id'] == session.session_id
+        exported = list(sqlite_manager.export_messages(session_id=session.session_id))
+        assert (exported[0]['id'], exported[0]['session_id']) == (message.id, session.session_id)
+
+        assert sqlite_manager.get_session("不是UUID") is None
+        assert sqlite_manager.delete_session(session.session_id)
@@ -0,0 +1,84 @@
+"""
+任务准入控制单元测试
+"""
+import pytest
+from crewaiBackend.utils.admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController:
+    """准入控制器测试类"""
+
+    def test_per_user_limit(self):
+        """测试单个用户超过上限时被拒绝，其他用户不受影响"""
+        controller = AdmissionController(max_in_flight=10, max_per_user=2, concurrency=1)
+        controller.acquire("alice")
+        controller.acquire("alice")
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            controller.acquire("alice")
+        assert exc_info.value.retry_after >= 1
+
+        controller.acquire("bob")
+        stats = controller.get_stats()
+        assert stats['in_flight'] == 3
+        assert stats['active_users'] == 2
+        assert stats['rejected_user'] == 1
+
+    def test_global_limit_and_release(self):
+        """测试进程上限以及归还名额后可以再次申请"""
+        controller = AdmissionController(max_in_flight=2, max_per_user=5, concurrency=1)
+        controller.acquire("a")
+        controller.acquire("b")
+
+        with pytest.raises(AdmissionRejected):
+            controller.acquire("c")
+        assert controller.get_stats()['rejected_global'] == 1
+
+        controller.release("a", duration=1.0)
+        controller.acquire("c")
+        assert controller.get_stats()['in_flight'] == 2
+
+    def test_retry_after_follows_job_duration(self):
+        """测试重试时间随实际任务耗时调整"""
+        controller = AdmissionController(max_in_flight=1, max_per_user=1, concurrency=1,
+                                         initial_job_seconds=10.0)
+        for _ in range(30):
+            controller.acquire("a")
+            controller.release("a", duration=2.5)
+
+        assert controller.estimate_retry_after() == 3
+        assert controller.get_stats()['active_users'] == 0
+
+    def test_global_retry_after_follows_queue_depth(self):
+        """测试进程繁忙时的重试时间按执行器排队任务数和并行度估算"""
+        depth = [0]
+        controller = AdmissionController(max_in_flight=1, max_per_user=5, concurrency=2,
+                                         initial_job_seconds=10.0, queue_depth=lambda: depth[0])
+        controller.acquire("a")
+
+        retries = []
+        for depth[0] in (0, 5):
+            with pytest.raises(AdmissionRejected) as exc_info:
+                controller.acquire("b")
+            retries.append(exc_info.value.retry_after)
+
+        # (排队数 + 1) / 并行度 × 平均耗时
+        assert retries == [5, 30]
+        assert controller.estimate_retry_after() == 30
+
+    def test_batch_quota_is_separate_from_interactive(self):
+        """测试批量任务单独计数：批量名额用满不影响交互请求，进程上限两者共用"""
+        controller = AdmissionController(max_in_flight=3, max_per_user=1, concurrency=1, max_batch_per_user=2)
+        controller.acquire("a", batch=True)
+        controller.acquire("a", batch=True)
+
+        with pytest.raises(AdmissionRejected):
+            controller.acquire("a", batch=True)
+        controller.acquire("a")
+        assert controller.get_stats()['in_flight'] == 3
+
+        controller.release("a", duration=1.0, batch=True)
+        controller.acquire("a", batch=True)
+        with pytest.raises(AdmissionRejected):
+            controller.acquire("b")
+        assert controller.get_stats()['rejected_global'] == 1
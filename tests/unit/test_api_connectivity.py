@@ -78,4 +78,14 @@ class TestAPIConnectivity:
         
         # 测试会话列表端点
         response = client.get('/api/users/test_user/sessions')
-        assert response.status_code == 200
\ No newline at end of file
+        assert response.status_code == 200    
+    def test_export_invalid_session_id_returns_404(self, client):
+        """测试ID以BINARY(16)存储时，非UUID格式的session_id导出返回404而不是500"""
+        from crewaiBackend.main import session_manager
+        from crewaiBackend.utils.sqliteDatabase import SQLiteDatabase
+        
+        db = SQLiteDatabase(":memory:")
+        db.binary_ids = True
+        with patch.object(session_manager, 'db', db):
+            response = client.get('/api/messages/export?session_id=not-a-uuid')
+        assert response.status_code == 404
@@ -161,13 +161,15 @@ class TestBasicFunctionality:
     
     def test_concurrent_access_functionality(self):
         """测试并发访问功能"""
-        from crewaiBackend.utils.jobManager import jobs_lock
+        from crewaiBackend.utils.jobManager import append_event, jobs
         
-        # 测试锁机制存在
-        assert jobs_lock is not None
+        # 测试每个任务都有自己的锁
+        append_event("test_lock_job", "test data")
+        job = jobs["test_lock_job"]
+        assert job.lock is not None
         
         # 测试锁可以被获取和释放
-        with jobs_lock:
+        with job.lock:
             # 在锁内执行一些操作
             assert True
         
@@ -0,0 +1,72 @@
+"""
+任务取消单元测试
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from crewaiBackend.utils.cancellation import (
+    CancellationRegistry, JobCancelledError, bind_token, cancellable_sleep, check_cancelled
+)
+from crewaiBackend.utils.ragflow_client import RAGFlowClient
+
+
+class TestCancellation:
+    """取消令牌与登记表测试类"""
+
+    def test_cancel_session_cancels_only_its_jobs(self):
+        """测试按会话取消只影响该会话的任务"""
+        registry = CancellationRegistry()
+        job_a = registry.register("job-a", "session-1")
+        job_b = registry.register("job-b", "session-1")
+        job_c = registry.register("job-c", "session-2")
+
+        cancelled = registry.cancel_session("session-1")
+
+        assert sorted(cancelled) == ["job-a", "job-b"]
+        assert job_a.cancelled and job_b.cancelled
+        assert not job_c.cancelled
+        assert registry.get_stats() == {'tracked_jobs': 3, 'cancelling_jobs': 2}
+
+        registry.unregister("job-a")
+        registry.unregister("job-b")
+        assert registry.cancel_session("session-1") == []
+        assert registry.cancel("job-a") is False
+
+    def test_check_cancelled_uses_bound_token(self):
+        """测试check_cancelled只在绑定了已取消令牌的上下文中抛出异常"""
+        registry = CancellationRegistry()
+        token = registry.register("job-1")
+        check_cancelled()  # 未绑定令牌时不做任何事
+
+        with bind_token(token):
+            check_cancelled()
+            registry.cancel("job-1", "用户取消")
+            with pytest.raises(JobCancelledError, match="用户取消"):
+                check_cancelled()
+
+        check_cancelled()
+
+    def test_cancel_interrupts_sleep(self):
+        """测试取消会打断重试退避等待"""
+        registry = CancellationRegistry()
+        token = registry.register("job-1")
+        threading.Timer(0.1, registry.cancel, args=("job-1",)).start()
+
+        start = time.monotonic()
+        with bind_token(token), pytest.raises(JobCancelledError):
+            cancellable_sleep(5)
+        assert time.monotonic() - start < 2
+
+    def test_ragflow_request_not_sent_after_cancel(self):
+        """测试任务取消后RAGFlow客户端不再发起请求"""
+        registry = CancellationRegistry()
+        token = registry.register("job-1")
+        token.cancel()
+        client = RAGFlowClient(base_url="http://ragflow.test", api_key="test-key")
+
+        with patch("crewaiBackend.utils.ragflow_client.requests.post") as mock_post:
+            with bind_token(token), pytest.raises(JobCancelledError):
+                client.converse(chat_id="chat", question="hi", session_id="s1")
+            mock_post.assert_not_called()
@@ -0,0 +1,70 @@
+"""
+批量提交接口测试
+"""
+from unittest.mock import MagicMock, patch
+
+from crewaiBackend.main import app, run_admitted_job
+from crewaiBackend.utils.admission import AdmissionController
+
+
+class TestCrewBatch:
+    """批量提交测试类"""
+
+    def test_batch_items_are_submitted_individually(self):
+        """测试批量请求的每一项单独提交到执行器，超出批量名额的项逐项拒绝"""
+        controller = AdmissionController(max_in_flight=10, max_per_user=1, concurrency=4, max_batch_per_user=2)
+        executor = MagicMock()
+
+        with patch("crewaiBackend.main.admission_controller", controller), \
+                patch("crewaiBackend.main.job_executor", executor), \
+                app.test_client() as client:
+            response = client.post("/api/crew/batch", json={
+                "user_id": "u1",
+                "inputs": [{"customer_input": f"q{i}"} for i in range(5)] + [{"other": 1}],
+            })
+
+        body = response.get_json()
+        assert response.status_code == 202
+        assert body["accepted"] == 2 and body["rejected"] == 4
+        assert [item.get("job_id") is not None for item in body["jobs"]] == [True] * 2 + [False] * 4
+        assert all(item["retry_after"] >= 1 for item in body["jobs"][2:5])
+        assert "retry_after" not in body["jobs"][5]
+
+        # 每一项作为独立任务提交，可由不同工作线程并行执行
+        assert executor.submit.call_count == 2
+        for call, item in zip(executor.submit.call_args_list, body["jobs"]):
+            assert call.args[0] is run_admitted_job
+            assert call.args[2] == item["job_id"]
+            assert call.args[-1] is True
+
+        # 批量任务不占用交互请求的名额
+        controller.acquire("u1")
+        assert controller.get_stats()["in_flight"] == 3
+
+    def test_batch_rejected_when_batch_quota_is_full(self):
+        """测试用户的批量名额已满时返回429，并给出每一项的拒绝原因"""
+        controller = AdmissionController(max_in_flight=10, max_per_user=1, concurrency=1, max_batch_per_user=1)
+        controller.acquire("u1", batch=True)
+
+        with patch("crewaiBackend.main.admission_controller", controller), \
+                patch("crewaiBackend.main.job_executor", MagicMock()), \
+                app.test_client() as client:
+            response = client.post("/api/crew/batch", json={"user_id": "u1", "inputs": [{"customer_input": "q"}] * 2})
+
+        body = response.get_json()
+        assert response.status_code == 429
+        assert response.headers["Retry-After"]
+        assert body["accepted"] == 0 and body["rejected"] == 2
+        assert all("retry_after" in item for item in body["jobs"])
+
+    def test_batch_slot_released_after_job(self):
+        """测试批量任务结束后归还批量名额"""
+        controller = AdmissionController(max_in_flight=10, max_per_user=1, concurrency=1, max_batch_per_user=1)
+        controller.acquire("u1", batch=True)
+
+        with patch("crewaiBackend.main.admission_controller", controller), \
+                patch("crewaiBackend.main.kickoff_crew"):
+            run_admitted_job("u1", "job-1", {"customer_input": "q"}, batch=True)
+
+        controller.acquire("u1", batch=True)
+        assert controller.get_stats()["in_flight"] == 1
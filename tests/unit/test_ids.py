@@ -0,0 +1,36 @@
+"""
+会话/消息ID生成与转换测试
+"""
+import uuid
+from unittest.mock import patch
+
+from crewaiBackend.utils.ids import api_id, id_to_bytes, new_id, uuid7
+
+
+class TestIds:
+    """ID测试类"""
+
+    def test_uuid7_is_time_ordered(self):
+        """测试UUIDv7版本号正确，且连续生成的ID（字符串和字节形式）严格递增"""
+        ids = [uuid7() for _ in range(5000)]
+
+        assert all(uuid.UUID(value).version == 7 for value in ids[:10])
+        assert ids == sorted(ids) and len(set(ids)) == len(ids)
+        binary = [id_to_bytes(value) for value in ids]
+        assert binary == sorted(binary)
+
+    def test_new_id_follows_config(self):
+        """测试new_id按ID_SCHEME生成UUID4或UUIDv7"""
+        with patch('crewaiBackend.utils.ids.Config.ID_SCHEME', 'uuid7'):
+            assert uuid.UUID(new_id()).version == 7
+        with patch('crewaiBackend.utils.ids.Config.ID_SCHEME', 'uuid4'):
+            assert uuid.UUID(new_id()).version == 4
+
+    def test_binary_roundtrip(self):
+        """测试字符串ID与BINARY(16)之间的转换，非字节值原样返回"""
+        value = uuid7()
+
+        assert len(id_to_bytes(value)) == 16
+        assert api_id(id_to_bytes(value)) == value
+        assert api_id(value) == value
+        assert api_id(None) is None
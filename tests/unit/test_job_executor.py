@@ -0,0 +1,81 @@
+"""
+任务执行器单元测试
+"""
+import threading
+import pytest
+from crewaiBackend.utils.jobExecutor import JobExecutor, JobQueueFullError
+
+
+class TestJobExecutor:
+    """任务执行器测试类"""
+
+    @pytest.fixture
+    def executor(self):
+        """单线程、队列上限为1的执行器夹具"""
+        executor = JobExecutor(max_workers=1, max_queue_size=1, name="test-worker")
+        yield executor
+        executor.shutdown(wait=True)
+
+    def test_submit_runs_task(self, executor):
+        """测试提交的任务会被执行"""
+        done = threading.Event()
+        executor.submit(done.set)
+        assert done.wait(timeout=5)
+
+    def test_queue_full_rejects(self, executor):
+        """测试队列满时拒绝新任务"""
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_task():
+            started.set()
+            release.wait(timeout=5)
+
+        executor.submit(blocking_task)   # 占用唯一的工作线程
+        assert started.wait(timeout=5)
+        executor.submit(blocking_task)   # 占满队列
+
+        with pytest.raises(JobQueueFullError):
+            executor.submit(blocking_task)
+
+        stats = executor.get_stats()
+        assert stats['active_workers'] == 1
+        assert stats['queue_depth'] == 1
+        assert stats['rejected'] == 1
+        release.set()
+
+    def test_failed_task_keeps_worker_alive(self):
+        """测试任务异常不会导致工作线程退出"""
+        executor = JobExecutor(max_workers=1, max_queue_size=2, name="test-worker")
+
+        def failing_task():
+            raise RuntimeError("boom")
+
+        done = threading.Event()
+        executor.submit(failing_task)
+        executor.submit(done.set)
+        assert done.wait(timeout=5)
+        executor.shutdown(wait=True)
+        assert executor.get_stats()['failed'] == 1
+
+    def test_shutdown_with_full_queue_does_not_block(self):
+        """测试队列已满时关闭不会阻塞，已入队的任务仍会执行完"""
+        executor = JobExecutor(max_workers=1, max_queue_size=1, name="test-worker")
+        release = threading.Event()
+        started = threading.Event()
+        done = threading.Event()
+
+        def blocking_task():
+            started.set()
+            release.wait(timeout=5)
+
+        executor.submit(blocking_task)
+        assert started.wait(timeout=5)
+        executor.submit(done.set)   # 占满队列
+
+        executor.shutdown(wait=False)   # 旧实现在这里阻塞
+        release.set()
+        assert done.wait(timeout=5)
+        for worker in executor._workers:
+            worker.join(timeout=5)
+            assert not worker.is_alive()
@@ -0,0 +1,230 @@
+"""
+作业管理单元测试
+"""
+from datetime import datetime, timedelta
+from crewaiBackend.utils.jobManager import MemoryJobStore, Job
+
+
+def make_job(status="STARTED", finished_at=None):
+    return Job(status=status, events=[], result="", finished_at=finished_at)
+
+
+class TestJobStore:
+    """作业存储测试类"""
+
+    def test_lru_eviction_prefers_finished_jobs(self):
+        """测试超过上限时优先淘汰最久未访问的已结束作业"""
+        store = MemoryJobStore(ttl_seconds=3600, max_jobs=2, shards=1)
+        store["running"] = make_job()
+        store["done"] = make_job(status="COMPLETE", finished_at=datetime.now())
+        store["new"] = make_job()
+
+        assert "running" in store
+        assert "done" not in store
+        assert store.get_stats()['evicted_lru'] == 1
+
+    def test_lru_respects_access_order(self):
+        """测试访问作业会刷新其LRU位置"""
+        store = MemoryJobStore(ttl_seconds=3600, max_jobs=2, shards=1)
+        store["a"] = make_job()
+        store["b"] = make_job()
+        store.get("a")
+        store["c"] = make_job()
+
+        assert "a" in store
+        assert "b" not in store
+
+    def test_evict_expired(self):
+        """测试TTL过期清理只影响已结束的作业"""
+        store = MemoryJobStore(ttl_seconds=60, max_jobs=10, shards=1)
+        old = datetime.now() - timedelta(seconds=120)
+        store["expired"] = make_job(status="COMPLETE", finished_at=old)
+        store["fresh"] = make_job(status="ERROR", finished_at=datetime.now())
+        store["running"] = make_job()
+
+        assert store.evict_expired() == 1
+        assert "expired" not in store
+        assert len(store) == 2
+        assert store.get_stats()['evicted_expired'] == 1
+
+    def test_get_summaries(self):
+        """测试批量获取作业概要，不存在的作业对应None"""
+        store = MemoryJobStore(ttl_seconds=3600, max_jobs=10, shards=4)
+        store.append_event("a", "开始")
+        store.append_event("b", "开始")
+        store.finish_job("b", "COMPLETE", "done", "完成")
+
+        summaries = store.get_summaries(["a", "b", "missing"])
+
+        assert summaries == {"a": ("STARTED", "", 1), "b": ("COMPLETE", "done", 2), "missing": None}
+
+    def test_version_and_status_cache_invalidation(self):
+        """测试作业版本随事件和状态变化递增，并使缓存的状态响应失效"""
+        store = MemoryJobStore(ttl_seconds=3600, max_jobs=10, shards=1)
+        store.append_event("a", "开始")
+        job = store.get("a")
+        assert job.version == 1
+
+        job.status_cache = (job.version, b"{}")
+        store.append_event("a", "进行中")
+        assert job.version == 2
+        assert job.status_cache is None
+
+        job.status_cache = (job.version, b"{}")
+        store.finish_job("a", "COMPLETE", "done")
+        assert job.version == 3
+        assert job.status_cache is None
+
+
+class TestJobNotification:
+    """作业通知测试类"""
+
+    def test_wait_for_job_update_wakes_on_event(self):
+        """测试追加事件会唤醒等待者"""
+        import threading
+        from crewaiBackend.utils.jobManager import append_event, wait_for_job_update
+
+        job_id = "test_notify_job"
+        append_event(job_id, "first")
+        timer = threading.Timer(0.1, append_event, args=(job_id, "second"))
+        timer.start()
+
+        events, status, _ = wait_for_job_update(job_id, since=1, timeout=5)
+        assert [event.data for event in events] == ["second"]
+        assert status == "STARTED"
+
+    def test_wait_for_job_update_returns_on_finish(self):
+        """测试作业结束时立即返回结果"""
+        from crewaiBackend.utils.jobManager import append_event, finish_job, wait_for_job_update
+
+        job_id = "test_finish_job"
+        append_event(job_id, "first")
+        finish_job(job_id, "COMPLETE", "done")
+
+        events, status, result = wait_for_job_update(job_id, since=1, timeout=5)
+        assert events == []
+        assert status == "COMPLETE"
+        assert result == "done"
+
+    def test_wait_for_unknown_job(self):
+        """测试等待不存在的作业返回None"""
+        from crewaiBackend.utils.jobManager import wait_for_job_update
+        assert wait_for_job_update("missing_job", timeout=0) is None
+
+
+class TestEventTruncation:
+    """事件截断测试类"""
+
+    def test_long_event_is_truncated(self):
+        """测试超长事件内容被截断并保留级别"""
+        from crewaiBackend.utils.jobManager import append_event, jobs
+
+        job_id = "test_truncate_job"
+        append_event(job_id, "x" * 50000, level="debug")
+        event = jobs[job_id].events[-1]
+        assert len(event.data) < 50000
+        assert "已截断" in event.data
+        assert event.level == "debug"
+
+    def test_short_event_is_kept(self):
+        """测试短事件内容保持不变"""
+        from crewaiBackend.utils.jobManager import truncate_event_data
+        assert truncate_event_data("hello", max_length=10) == "hello"
+
+
+class TestJobStoreBackends:
+    """作业存储后端选择测试类"""
+
+    def test_unknown_backend_falls_back_to_memory(self):
+        """测试未知后端回退为进程内存储"""
+        from crewaiBackend.utils.jobManager import create_job_store
+        assert isinstance(create_job_store("redis"), MemoryJobStore)
+
+    def test_mysql_backend_falls_back_when_db_unavailable(self):
+        """测试MySQL不可用时回退为进程内存储"""
+        from unittest.mock import patch
+        from crewaiBackend.utils.jobManager import create_job_store
+        with patch('crewaiBackend.utils.database.db_manager') as mock_db:
+            mock_db.backend = 'mysql'
+            mock_db.available = False
+            assert isinstance(create_job_store("mysql"), MemoryJobStore)
+
+            # 回退为SQLite时同样不使用MySQL作业存储
+            mock_db.backend = 'sqlite'
+            mock_db.available = True
+            assert isinstance(create_job_store("mysql"), MemoryJobStore)
+
+    def test_mysql_store_allocates_sequence_in_database(self):
+        """测试MySQL存储在事务中锁住作业行后按数据库中的最大序号分配事件序号"""
+        from unittest.mock import MagicMock
+        from crewaiBackend.utils.mysqlJobStore import MySQLJobStore
+
+        db = MagicMock()
+        cursor = db.transaction.return_value.__enter__.return_value
+        cursor.execute.return_value = 1
+        # 另一个进程已写入了序号0~4
+        cursor.fetchone.return_value = (5,)
+        store = MySQLJobStore(db)
+
+        store.append_event("job_1", "first")
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        assert "FOR UPDATE" in statements[1]
+        assert "MAX(seq)" in statements[2]
+        insert_params = cursor.execute.call_args_list[3].args[1]
+        assert insert_params[1] == 5 and insert_params[4] == "first"
+        db.execute_update.assert_not_called()  # 不再在启动时建表
+
+    def test_mysql_store_finishes_job_in_one_transaction(self):
+        """测试结束作业时最后一条事件和状态更新在同一个事务中写入，作业已被淘汰时不写入"""
+        from unittest.mock import MagicMock
+        from crewaiBackend.utils.mysqlJobStore import MySQLJobStore
+
+        db = MagicMock()
+        cursor = db.transaction.return_value.__enter__.return_value
+        cursor.execute.return_value = 0
+        cursor.fetchone.side_effect = [(1,), (3,)]
+        store = MySQLJobStore(db)
+
+        assert store.finish_job("job_1", "COMPLETE", "done", "完成") is True
+
+        db.transaction.assert_called_once()
+        db.execute_update.assert_not_called()
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        assert "FOR UPDATE" in statements[0]
+        assert "INSERT INTO crew_job_events" in statements[-2]
+        assert statements[-1].startswith("UPDATE crew_jobs SET status")
+
+        cursor.reset_mock()
+        cursor.fetchone.side_effect = [None]
+        assert store.finish_job("evicted", "COMPLETE", "done", "完成") is False
+        assert len(cursor.execute.call_args_list) == 1
+
+    def test_mysql_store_logs_failed_event(self):
+        """测试事件写入失败时记录日志而不是抛出异常"""
+        from unittest.mock import MagicMock
+        from crewaiBackend.utils.mysqlJobStore import MySQLJobStore
+
+        db = MagicMock()
+        db.transaction.return_value.__enter__.side_effect = RuntimeError("数据库连接不可用")
+        store = MySQLJobStore(db)
+
+        store.append_event("job_1", "lost")
+
+
+class TestCrewEvents:
+    """Crew事件记录测试类"""
+
+    def test_events_without_job_are_not_stored(self):
+        """测试没有关联作业的Crew不会把事件写入共享的作业"""
+        from unittest.mock import patch
+        from crewaiBackend.crew import CrewtestprojectCrew
+
+        crew = CrewtestprojectCrew(job_id=None, llm=None)
+        with patch("crewaiBackend.crew.append_event") as append:
+            crew._log_event("初始化")
+            append.assert_not_called()
+
+            crew.job_id = "job-1"
+            crew._log_event("开始", level='warning')
+            append.assert_called_once_with("job-1", "开始", 'warning')
@@ -3,7 +3,7 @@
 """
 import pytest
 from unittest.mock import Mock, patch
-from crewaiBackend.utils.sessionManager import SessionManager, ChatSession, ChatMessage
+from crewaiBackend.utils.sessionManager import SessionManager, SessionCache, ChatSession, ChatMessage, session_cache
 
 
 class TestChatMessage:
@@ -17,6 +17,14 @@ class TestChatMessage:
         assert message.id is not None  # 使用 id 而不是 message_id
         assert message.timestamp is not None
     
+    def test_existing_id_is_not_regenerated(self):
+        """测试传入已有ID时沿用该ID，不再生成新ID"""
+        with patch('crewaiBackend.utils.sessionManager.new_id') as new_id:
+            message = ChatMessage("user", "Hello", message_id="m1")
+            restored = ChatMessage.from_dict(message.to_dict())
+        new_id.assert_not_called()
+        assert message.id == restored.id == "m1"
+
     def test_message_to_dict(self):
         """测试消息转字典"""
         message = ChatMessage("user", "Hello")
@@ -61,6 +69,8 @@ class TestSessionManager:
         with patch('crewaiBackend.utils.sessionManager.db_manager') as mock_db:
             mock_db.execute_update.return_value = 1
             mock_db.execute_query.return_value = []
+            # 按VARCHAR(36)存储ID，原样传给数据库
+            mock_db.db_id.side_effect = lambda value: value
             return SessionManager()
     
     def test_session_manager_creation(self, session_manager):
@@ -101,20 +111,134 @@ class TestSessionManager:
         assert message.content == "Hello"
     
     def test_get_all_sessions(self, session_manager):
-        """测试获取所有会话"""
-        # Mock 数据库查询结果 - 只返回会话ID列表
-        session_manager.db.execute_query.return_value = [("session1",), ("session2",)]
+        """测试批量获取所有会话只执行两次查询（会话一次、消息一次）"""
+        now = __import__('datetime').datetime.now()
+        session_rows = [
+            ("session1", "user_1", "Session 1", now, now, "{}", None),
+            ("session2", "user_1", "Session 2", now, now, "{}", None),
+        ]
+        message_rows = [
+            ("session1", "m1", "user", "Hello", now),
+            ("session1", "m2", "assistant", "Hi", now),
+            ("session2", "m3", "user", "Bye", now),
+        ]
+        session_manager.db.execute_query.side_effect = [session_rows, message_rows]
         
-        # Mock get_session 方法
         with patch.object(session_manager, 'get_session') as mock_get_session:
-            mock_session1 = Mock()
-            mock_session2 = Mock()
-            mock_get_session.side_effect = [mock_session1, mock_session2]
-            
             sessions = session_manager.get_all_sessions()
-            assert len(sessions) == 2
-            assert mock_get_session.call_count == 2
+            mock_get_session.assert_not_called()
+        
+        assert session_manager.db.execute_query.call_count == 2
+        assert [s.session_id for s in sessions] == ["session1", "session2"]
+        assert [m.id for m in sessions[0].messages] == ["m1", "m2"]
+        assert [m.content for m in sessions[1].messages] == ["Bye"]
+    
+    def test_get_session_summaries(self, session_manager):
+        """测试会话摘要只查询一次且不包含消息正文"""
+        now = __import__('datetime').datetime.now()
+        session_manager.db.execute_query.return_value = [
+            ("session1", "user_1", "Session 1", now, now, None, 2, "assistant", "Hi", now),
+            ("session2", "user_1", "Session 2", now, now, None, 0, None, None, None),
+        ]
+        
+        summaries = session_manager.get_session_summaries("user_1")
+        
+        assert session_manager.db.execute_query.call_count == 1
+        assert summaries[0]["message_count"] == 2
+        assert summaries[0]["last_message"]["preview"] == "Hi"
+        assert summaries[1]["last_message"] is None
+        assert "messages" not in summaries[0]
+    
+    def test_get_messages_latest_page(self, session_manager):
+        """测试不带游标时按seq倒序取最新一页并翻转为升序"""
+        now = __import__('datetime').datetime.now()
+        # 数据库按seq倒序返回limit+1条
+        session_manager.db.execute_query.return_value = [
+            ("m5", "assistant", "5", now, 5),
+            ("m4", "user", "4", now, 4),
+            ("m3", "assistant", "3", now, 3),
+        ]
+        
+        messages, has_more = session_manager.get_messages("session1", limit=2)
+        
+        query, params = session_manager.db.execute_query.call_args.args
+        assert "ORDER BY seq DESC" in query
+        assert params == ("session1", 3)
+        assert [m.seq for m in messages] == [4, 5]
+        assert has_more is True
+    
+    def test_get_messages_after_cursor(self, session_manager):
+        """测试after游标只返回更新的消息且按seq升序（先查归档表，未取够时再查热表）"""
+        now = __import__('datetime').datetime.now()
+        session_manager.db.execute_query.side_effect = [[], [("m6", "user", "6", now, 6)]]
+        
+        messages, has_more = session_manager.get_messages("session1", after=5, limit=10)
+        
+        archive_query = session_manager.db.execute_query.call_args_list[0].args[0]
+        assert "FROM chat_messages_archive" in archive_query
+        query, params = session_manager.db.execute_query.call_args.args
+        assert "FROM chat_messages\n" in query
+        assert "seq > %s" in query and "ORDER BY seq ASC" in query
+        assert params == ("session1", 5, 11)
+        assert [m.seq for m in messages] == [6]
+        assert has_more is False
     
+    def test_get_recent_messages_reads_tail_only(self, session_manager):
+        """测试缓存未命中时只从主库按seq倒序读取最后n条，不加载会话和全部消息"""
+        now = __import__('datetime').datetime.now()
+        # 热表已返回n+1条，不再查询归档表
+        session_manager.db.execute_query.return_value = [
+            ("m9", "assistant", "9", now, 9),
+            ("m8", "user", "8", now, 8),
+            ("m7", "assistant", "7", now, 7),
+        ]
+
+        messages = session_manager.get_recent_messages("session1", 2)
+
+        session_manager.db.execute_query.assert_called_once()
+        query, params = session_manager.db.execute_query.call_args.args
+        assert "FROM chat_messages\n" in query and "ORDER BY seq DESC" in query
+        assert params == ("session1", 3)
+        # 最近写入可能来自其他进程，提示词所用的消息总是读主库
+        assert session_manager.db.execute_query.call_args.kwargs["replica"] is False
+        assert [m.seq for m in messages] == [8, 9]
+
+    def test_get_recent_messages_from_cache(self, session_manager):
+        """测试缓存命中时直接取缓存会话的末尾n条，不查询数据库"""
+        cache = SessionCache(max_size=10, ttl_seconds=60)
+        session = ChatSession(session_id="session1")
+        for i in range(8):
+            session.add_message("user", f"m{i}")
+        cache.put("session1", session)
+
+        with patch('crewaiBackend.utils.sessionManager.session_cache', cache):
+            messages = session_manager.get_recent_messages("session1", 3)
+
+        assert [m.content for m in messages] == ["m5", "m6", "m7"]
+        session_manager.db.execute_query.assert_not_called()
+        assert session_manager.get_recent_messages("session1", 0) == []
+
+    def test_concurrently_archived_messages_are_deduplicated(self, session_manager):
+        """测试读取热表和归档表之间消息被归档时，同一条消息只返回一次"""
+        from crewaiBackend.utils.messageArchive import compress_content
+        now = __import__('datetime').datetime.now()
+        session_row = ("session1", "user_1", "Session", now, now, "{}", None, 3)
+        hot_rows = [("m2", "user", "2", now, 2), ("m3", "assistant", "3", now, 3)]
+        # 读取热表之后m2被归档
+        archive_rows = [("session1", "m1", "user", compress_content("1"), now, 1),
+                        ("session1", "m2", "user", compress_content("2"), now, 2)]
+        session_manager.db.execute_query.side_effect = [[session_row], hot_rows, archive_rows]
+
+        session = session_manager._load_session("session1", True)
+        assert [m.seq for m in session.messages] == [1, 2, 3]
+
+        session_manager.db.execute_query.side_effect = [
+            hot_rows[::-1], [row[1:] for row in archive_rows[::-1]]
+        ]
+        messages, has_more = session_manager.get_messages("session1", limit=5)
+        assert [m.seq for m in messages] == [1, 2, 3]
+        assert has_more is False
+
     def test_delete_session(self, session_manager):
         """测试删除会话"""
         # Mock 数据库查询结果
@@ -127,3 +251,71 @@ class TestSessionManager:
         
         result = session_manager.delete_session("test_session_123")
         assert result is True
+    
+    def test_get_session_served_from_cache(self, session_manager):
+        """测试同一会话第二次读取命中缓存，不再查询数据库"""
+        now = __import__('datetime').datetime.now()
+        session_row = ("cached_session", "user_1", "Cached", now, now, "{}", None, 1)
+        message_rows = [("m1", "assistant", "欢迎", now, 1)]
+        session_manager.db.execute_query.side_effect = [[session_row], message_rows]
+        
+        first = session_manager.get_session("cached_session")
+        first.messages.append(ChatMessage("user", "调用方的修改不影响缓存"))
+        second = session_manager.get_session("cached_session")
+        
+        assert session_manager.db.execute_query.call_count == 2
+        assert [m.id for m in second.messages] == ["m1"]
+        assert session_cache.get_stats()['hits'] == 1
+    
+    def test_add_message_updates_cached_session(self, session_manager):
+        """测试添加消息同步更新缓存中的消息、计数和标题"""
+        session = session_manager.create_session(title="新会话")
+        cursor = session_manager.db.transaction.return_value.__enter__.return_value
+        cursor.lastrowid = 7
+        
+        session_manager.add_message(session.session_id, "user", "第一个问题")
+        cached = session_manager.get_session(session.session_id)
+        
+        assert [m.seq for m in cached.messages] == [7]
+        assert cached.title == "第一个问题"
+        assert cached.to_dict()['message_count'] == 1
+        session_manager.db.execute_query.assert_not_called()
+    
+    def test_delete_session_invalidates_cache(self, session_manager):
+        """测试删除会话后缓存失效"""
+        session = session_manager.create_session(title="待删除")
+        session_manager.delete_session(session.session_id)
+        
+        assert session_cache.get(session.session_id) is None
+
+
+class TestSessionCache:
+    """会话缓存测试类"""
+    
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的会话"""
+        cache = SessionCache(max_size=2, ttl_seconds=60)
+        for session_id in ("a", "b"):
+            cache.put(session_id, ChatSession(session_id=session_id))
+        cache.get("a")
+        cache.put("c", ChatSession(session_id="c"))
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get_stats()['evictions'] == 1
+    
+    def test_write_during_load_skips_backfill(self):
+        """测试查库期间发生写入时不回填可能过期的数据"""
+        cache = SessionCache(max_size=2, ttl_seconds=60)
+        cache.begin_load("a")
+        cache.invalidate("a")
+        cache.finish_load("a", ChatSession(session_id="a"))
+        
+        assert cache.get("a") is None
+    
+    def test_expired_entry_is_a_miss(self):
+        """测试超过有效期的缓存条目视为未命中"""
+        cache = SessionCache(max_size=2, ttl_seconds=0)
+        cache.put("a", ChatSession(session_id="a"))
+        
+        assert cache.get("a") is None